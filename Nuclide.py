@@ -8,8 +8,35 @@
    NuBase2003 ascii file or xml documents
 """
 
-import xml.dom.minidom
+import xml.etree.ElementTree as ElementTree
+import os
 import re
+from array import array
+
+import datacache
+import decaychain
+import energies
+import nuclidequery
+from collections import namedtuple
+from functools import lru_cache
+
+# Nubase2012 table in xml format shipped with this module
+DEFAULT_DATAFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'nubase12.xml')
+
+# Mass unit in keV as adopted by Nubase2012
+U_TO_KEV = 931494.061
+# Mass excesses (keV) of the neutron and of the hydrogen atom (AME2012)
+NEUTRON_MASS_EXCESS = 8071.31713
+HYDROGEN_MASS_EXCESS = 7288.97061
+
+# Whole-library columns returned by NuclideLibrary, aligned with its rows.
+# value and uncertainty are array('d') (nan if unknown), the masks are
+# array('B') of 0/1
+HalfLifeColumns = namedtuple('HalfLifeColumns',
+                             'seconds uncertainty stable unknown extrapolated')
+MassColumns = namedtuple('MassColumns',
+                         'value uncertainty unknown extrapolated')
 
 class ParameterError(Exception):
     """Error class for all kinds of wrong parameters passed to 
@@ -25,6 +52,9 @@ class Nuclide(object):
        Base class for subclasses for specific format
        (like nubase, nuc. wallet cards, xml etc."""
 
+    __slots__ = ('_Z', '_A', '_mass_defect', '_half_life', '_gs_spin',
+                 '_decay_modes', 'isomers', 'comment')
+
     # Time units as used by NuBase evaluators
     # It is interesting that half-life can be as short as 1e-24 and at the same
     # time some nuclides are 'proton unstable'
@@ -132,6 +162,23 @@ class Nuclide(object):
     def __str__(self):
         return "{}{}".format(self.A, self.element)
 
+    @classmethod
+    def from_record(cls, record):
+        """Builds nuclide from a tuple made by to_record(). The data was
+        validated when the record was made, so the setters are bypassed"""
+        nuclide = cls.__new__(cls)
+        (nuclide._Z, nuclide._A, nuclide._mass_defect, nuclide._half_life,
+         nuclide._gs_spin, nuclide._decay_modes, nuclide.isomers,
+         nuclide.comment) = record
+        return nuclide
+
+    def to_record(self):
+        """Returns all data as a tuple of plain python objects
+        (Z, A, mass_defect, half_life, gs_spin, decay_modes, isomers, comment)
+        """
+        return (self.Z, self.A, self.mass_defect, self.half_life,
+                self.gs_spin, self.decay_modes, self.isomers, self.comment)
+
     @property
     def element(self):
         """Returns chemical element name (read-only)"""
@@ -225,15 +272,25 @@ class Nuclide(object):
             else:
                 return (0, 0)
 
-        u = self.half_life['unit']
-        if u in self._short_time_units:
-            factor = self._short_time_units.get(u)
-            return (t * factor, dt * factor)
-        elif u in self._long_time_units:
-            factor = self._long_to_short * self._long_time_units.get(u)
-            return (t * factor, dt * factor)
-        else:
+        factor = self.time_unit_factor(self.half_life['unit'])
+        if factor is None:
             return (0, 0)
+        return (t * factor, dt * factor)
+
+    @classmethod
+    def time_unit_factor(cls, unit):
+        """Returns length of time unit in seconds or None if unit is
+        not a time unit. NuclideNb03 stores units of '<' and '>' limits
+        as a factor ('1e-09' for ns), these are accepted too."""
+        factor = cls._short_time_units.get(unit)
+        if isinstance(factor, float):
+            return factor
+        elif unit in cls._long_time_units:
+            return cls._long_to_short * cls._long_time_units[unit]
+        try:
+            return float(unit)
+        except (ValueError, TypeError):
+            return None
 
     @property
     def half_life(self):
@@ -405,6 +462,11 @@ class Nuclide(object):
 class NuclideNb03(Nuclide):
     """Nuclide class for reading data from Nubase2003 format"""
 
+    # Extra information in [] brackets of the decay modes (an unclosed
+    # bracket runs to the end), and the relation of a decay mode
+    _BRACKETS_RE = re.compile(r'\[[^\]]*(?:\]|$)')
+    _RELATION_RE = re.compile('(=|~|>|<|\u2264|\u2265)')
+
     def __init__(self, Z, A, mass_defect, half_life,
                  gs_spin, decay_modes, comment = ""):
         """Constructor for Nubase03 version.
@@ -436,14 +498,11 @@ class NuclideNb03(Nuclide):
         """Returns dict {value, uncertainity, extrapolated}
         parsed from format used by nubase2003"""
         result = {}
-        mass_defect = mass_defect.strip()
-        result['extrapolated'] = True if mass_defect.count('#') > 0 else False
+        result['extrapolated'] = '#' in mass_defect
         if result['extrapolated']:
             mass_defect = mass_defect.replace('#', ' ')
         try:
             mass_defect = mass_defect.split()
-            for it in mass_defect:
-                it = it.strip()
             if len(mass_defect) == 2:
                 result['value'] = float(mass_defect[0])
                 result['uncertainity'] = float(mass_defect[1])
@@ -468,15 +527,11 @@ class NuclideNb03(Nuclide):
            returns dict {half life, unit, uncertainity, extrapolated}
         """
         result = {}
-        half_life = half_life.strip()
-        result['extrapolated'] = True if half_life.count('#') > 0 else False
+        result['extrapolated'] = '#' in half_life
         if result['extrapolated']:
             half_life = half_life.replace('#', ' ')
-        
-        items = half_life.split()
-        for it in items:
-            it = it.strip()
 
+        items = half_life.split()
         if len(items) == 0:
             result['value'] = '?'
             result['uncertainity'] = '?'
@@ -533,7 +588,7 @@ class NuclideNb03(Nuclide):
         returns dictionary {value, extrapolated} """
         result = {}
         gs_spin = gs_spin.strip()
-        result['extrapolated'] = True if gs_spin.count('#') > 0 else False
+        result['extrapolated'] = '#' in gs_spin
         if result['extrapolated']:
             gs_spin = gs_spin.replace('#', ' ')
         result['value'] = gs_spin
@@ -549,17 +604,10 @@ class NuclideNb03(Nuclide):
         # We replace them with proper unicode signs 
         decay_modes = decay_modes.replace('le', '\u2264')
         decay_modes = decay_modes.replace('ge', '\u2265')
-            
+
         # Remove whatever is in [] bracket (some extra info)
-        while True:
-            begin = decay_modes.find('[')
-            end = decay_modes.find(']')
-            if begin < 0:
-                break
-            if end > -1:
-                decay_modes = decay_modes[:begin] + decay_modes[end+1:]
-            else:
-                decay_modes = decay_modes[:begin]
+        if '[' in decay_modes:
+            decay_modes = self._BRACKETS_RE.sub('', decay_modes)
 
         decay_list = [] 
         if len(decay_modes.strip()) == 0:
@@ -573,10 +621,8 @@ class NuclideNb03(Nuclide):
                 # but sometimes it is "mode=?"
                 # or "mode= ?"
                 # we fix this so it always has '=' sign
-                question = re.search(r" \?", item)
-                if question is not None:
-                    if item.count('=') == 0:
-                        item = re.sub(r" \?", "=?", item)
+                if ' ?' in item and '=' not in item:
+                    item = item.replace(' ?', '=?')
 
                 # '...' is used in the nubtab12, whatever it means (?!)
                 # it can't be unpacked in the next line, since there is
@@ -584,8 +630,7 @@ class NuclideNb03(Nuclide):
                 if item == "...":
                     continue
 
-                mode, relation, value = re.split('(=|~|>|<|\u2264|\u2265)',
-                                                 item)
+                mode, relation, value = self._RELATION_RE.split(item)
                 error = '0'
                 value = value.split()
                 if len(value) > 1:
@@ -663,6 +708,13 @@ class NuclideNb03(Nuclide):
 class NuclideNwc11(Nuclide):
     """Nuclide class for reading data from Nuclear Wallet Cards 2011 format"""
 
+    # Half-life units of level widths, hbar ln2 in as * eV
+    _WIDTH_UNITS = {'ev': 'as', 'kev': 'zs', 'mev': 'ys'}
+    _HBAR_LN2 = 456.2
+    _OPPOSITE_LIMITS = {'lt': 'gt', 'le': 'ge', 'gt': 'lt', 'ge': 'le'}
+    # Long time units after lower(), none is a short unit too
+    _LOWER_LONG_UNITS = {unit.lower(): unit for unit in Nuclide._long_time_units}
+
     def __init__(self, Z, A, mass_defect, half_life, gs_spin,
                  decay_modes, comment = None):
         """ Constructor for Nuclear Wallet Cards 2011 version."""
@@ -687,8 +739,6 @@ class NuclideNwc11(Nuclide):
         result['extrapolated'] = False
 
         items = half_life.split()
-        for it in items:
-            it = it.strip()
         if len(items) == 2:
             items.append('?')
 
@@ -705,22 +755,19 @@ class NuclideNwc11(Nuclide):
             if len(items) > 1:
                 result['uncertainity'] = items[1]
         elif len(items) == 3:
-            if items[1] in ['ev', 'kev', 'mev']:
-                if items[1] == 'ev':
-                    items[1] = 'as'
-                elif items[1] == 'kev':
-                    items[1] = 'zs'
-                elif items[1] == 'mev':
-                    items[1] = 'ys'
-
-                try:
-                    items[0] = '{0:.5f}'.format(items[0] * 0.04562)
-                except TypeError:
-                    pass
+            if items[1] in self._WIDTH_UNITS:
+                # Width G is given, T1/2 = hbar ln2 / G, that is 456.2 / G
+                # in as for G in eV (zs for keV, ys for MeV); a limit of
+                # the width is the opposite limit of the half-life
+                items[1] = self._WIDTH_UNITS[items[1]]
                 try:
-                    items[2] = '{0:.5f}'.format(items[2] * 0.04562)
-                except TypeError:
-                    pass
+                    width = float(items[0])
+                    items[0] = '{0:.5g}'.format(self._HBAR_LN2 / width)
+                    items[2] = '{0:.5g}'.format(
+                            float(items[0]) * float(items[2]) / width)
+                except (ValueError, ZeroDivisionError):
+                    items[2] = self._OPPOSITE_LIMITS.get(items[2], items[2])
+            items[1] = self._LOWER_LONG_UNITS.get(items[1], items[1])
 
             if ( self._short_time_units.get(items[1]) is None and
                  self._long_time_units.get(items[1]) is None ):
@@ -751,6 +798,13 @@ class NuclideNwc11(Nuclide):
 class NuclideXml(Nuclide):
     """Nuclide class for reading and writing data to xml document"""
 
+    # Attributes of the xml tags, as written by add_to_xml_table
+    _md_attrs = ('value', 'uncertainity', 'extrapolated')
+    _hl_attrs = ('value', 'unit', 'uncertainity', 'relation', 'extrapolated')
+    _spin_attrs = ('value', 'extrapolated')
+    _decay_attrs = ('mode', 'value', 'relation', 'uncertainity')
+    _isomer_attrs = ('energy', 'extrapolated', 'uncertainity')
+
     def __init__(self, Z, A, xml_nuclide_entry = None):
         """ Constructor
         xml_nuclide_entry should be an dom element with tag name 'nuclide'
@@ -759,9 +813,16 @@ class NuclideXml(Nuclide):
         dom = xml.dom.minidom.parse(datafile)
         for xml_nuclide_entry in dom.getElementsByTagName("nuclide"):
             isotope = NuclideXml(A, Z, xml_nuclide_entry)
+
+        an xml.etree.ElementTree element (e.g. from iterparse) is
+        accepted as well
         """
         super().__init__(Z, A)
-        if xml_nuclide_entry is not None:
+        if xml_nuclide_entry is None:
+            pass
+        elif isinstance(xml_nuclide_entry, ElementTree.Element):
+            self.parse_xml_element(xml_nuclide_entry)
+        else:
             self.parse_xml_entry(xml_nuclide_entry)
 
     def parse_xml_entry(self, xml_nuclide_entry):
@@ -777,35 +838,31 @@ class NuclideXml(Nuclide):
         self.Z = nuclide.getAttribute('Z')
 
         mass_defect = nuclide.getElementsByTagName('mass_defect')[0]
-        md_attrs = ['value', 'uncertainity', 'extrapolated']
         md_data = {}
-        for attr in md_attrs:
+        for attr in self._md_attrs:
             value = mass_defect.getAttribute(attr)
             md_data[attr] = value
         self.mass_defect = md_data
 
         half_life = nuclide.getElementsByTagName('half_life')[0]
-        hl_attr = ['value', 'unit', 'uncertainity', 'relation', 'extrapolated']
         hl_data = {}
-        for attr in hl_attr:
+        for attr in self._hl_attrs:
             value = half_life.getAttribute(attr)
             hl_data[attr] = value
         self.half_life = hl_data
 
         spin = nuclide.getElementsByTagName('spin')[0]
-        s_attrs = ['value', 'extrapolated']
         s_data = {}
-        for attr in s_attrs:
+        for attr in self._spin_attrs:
             value = spin.getAttribute(attr)
             s_data[attr] = value
         self.gs_spin = s_data
 
         decay_modes = nuclide.getElementsByTagName("decay_modes")[0]
-        decay_attr = ["mode", "value", "relation", "uncertainity"]
         dm_data = []
         for decay in decay_modes.getElementsByTagName("decay"):
             mode_data = {}
-            for attr in decay_attr:
+            for attr in self._decay_attrs:
                 value = decay.getAttribute(attr)
                 mode_data[attr] = value
             dm_data.append(mode_data)
@@ -815,60 +872,951 @@ class NuclideXml(Nuclide):
         if len(isomers) > 0:
             for isomer in isomers[0].getElementsByTagName("isomer"):
                 i_data = {}
-                i_attrs = ['energy', 'extrapolated', 'uncertainity']
-                for attr in i_attrs:
+                for attr in self._isomer_attrs:
                     value = isomer.getAttribute(attr)
                     i_data[attr] = value
 
                 half_life = isomer.getElementsByTagName('half_life')[0]
                 hl_data = {}
-                for attr in hl_attr:
+                for attr in self._hl_attrs:
                     value = half_life.getAttribute(attr)
                     hl_data[attr] = value
                 i_data['half_life'] = hl_data
 
-                decay_modes = nuclide.getElementsByTagName("decay_modes")[0]
+                decay_modes = isomer.getElementsByTagName("decay_modes")[0]
                 dm_data = []
                 for decay in decay_modes.getElementsByTagName("decay"):
                     mode_data = {}
-                    for attr in decay_attr:
+                    for attr in self._decay_attrs:
                         value = decay.getAttribute(attr)
                         mode_data[attr] = value
                     dm_data.append(mode_data)
                 i_data['decay_modes'] = dm_data
                 self.add_isomer(i_data)
 
-        comment = nuclide.getElementsByTagName("comment")
-        self.comment = comment[0].firstChild
+        # Only the direct child holds the nuclide comment, the isomers
+        # have their own. The text is copied, so the dom can be freed.
+        self.comment = ""
+        for child in nuclide.childNodes:
+            if (child.nodeType == child.ELEMENT_NODE and
+                    child.tagName == "comment" and child.firstChild):
+                self.comment = child.firstChild.nodeValue
+
+    def parse_xml_element(self, xml_nuclide_element):
+        """ Same as parse_xml_entry, but for xml.etree.ElementTree element
+        (as produced by ElementTree.iterparse). Only direct children are
+        searched, so isomer data does not leak into ground state data.
+        """
+        nuclide = xml_nuclide_element
+
+        self.A = nuclide.get('A')
+        self.Z = nuclide.get('Z')
+
+        self.mass_defect = self._attributes(nuclide.find('mass_defect'),
+                                            self._md_attrs)
+        self.half_life = self._attributes(nuclide.find('half_life'),
+                                          self._hl_attrs)
+        self.gs_spin = self._attributes(nuclide.find('spin'),
+                                        self._spin_attrs)
+        self.decay_modes = [self._attributes(decay, self._decay_attrs)
+                            for decay in nuclide.iterfind('decay_modes/decay')]
+
+        for isomer in nuclide.iterfind('isomers/isomer'):
+            i_data = self._attributes(isomer, self._isomer_attrs)
+            i_data['half_life'] = self._attributes(isomer.find('half_life'),
+                                                   self._hl_attrs)
+            i_data['decay_modes'] = [
+                    self._attributes(decay, self._decay_attrs)
+                    for decay in isomer.iterfind('decay_modes/decay')]
+            i_data['comment'] = isomer.findtext('comment') or ""
+            self.add_isomer(i_data)
+
+        self.comment = nuclide.findtext('comment') or ""
+
+    @staticmethod
+    def _attributes(element, keys):
+        """Returns dict of selected attributes of ElementTree element,
+        missing attributes are empty strings (as in minidom)"""
+        if element is None:
+            raise LookupError("Missing tag in xml nuclide entry")
+        return {key: element.get(key, '') for key in keys}
+
+class _StringPool(object):
+    """Strings of a NuclideTable stored in one str with an array of offsets.
+
+    While the table is built, equal strings share one id. freeze() joins
+    the strings added so far into the blob and drops the build-time
+    dictionary; strings added later are kept in a list until the next
+    freeze().
+    """
+
+    def __init__(self):
+        self._blob = ''
+        self._offsets = array('I', [0])
+        self._tail = []
+        self._ids = {}
+
+    def __len__(self):
+        return len(self._offsets) - 1 + len(self._tail)
+
+    def add(self, text):
+        """Returns id of text (converted to str), adding it if necessary"""
+        text = str(text)
+        if self._ids is not None:
+            string_id = self._ids.get(text)
+            if string_id is not None:
+                return string_id
+        string_id = len(self)
+        self._tail.append(text)
+        if self._ids is not None:
+            self._ids[text] = string_id
+        return string_id
+
+    def get(self, string_id):
+        """Returns string of string_id"""
+        frozen = len(self._offsets) - 1
+        if string_id < frozen:
+            offsets = self._offsets
+            return self._blob[offsets[string_id]:offsets[string_id + 1]]
+        return self._tail[string_id - frozen]
+
+    def freeze(self):
+        """Moves strings added so far into the blob"""
+        if len(self._tail) > 0:
+            offset = self._offsets[-1]
+            for text in self._tail:
+                offset += len(text)
+                self._offsets.append(offset)
+            self._blob += ''.join(self._tail)
+            self._tail = []
+        self._ids = None
+
+    def __getstate__(self):
+        self.freeze()
+        return self.__dict__
+
+
+class NuclideTable(object):
+    """Columnar storage of nuclides.
+
+    Each nuclide is a row. Numbers are parsed once into typed arrays,
+    the original strings (needed to give back the very same dicts as
+    the xml table) are kept as ids into a _StringPool. Decay modes and
+    isomers of all nuclides are stored in flat arrays, a nuclide row
+    holds the start and count of its entries there (isomers point the
+    same way to their own decay modes).
+
+    Rows are accessed through NuclideRecord views, e.g. table[i].
+
+    A lazy table is filled by append_pending() with only the data needed
+    for the chart; the rest of a row is decoded from the source xml file
+    on first access (see load_row).
+    """
+
+    # Bits of the flags column
+    HAS_MASS_DEFECT = 0x01
+    HAS_HALF_LIFE = 0x02
+    HAS_SPIN = 0x04
+    MASS_EXTRAPOLATED = 0x08
+    HALF_LIFE_EXTRAPOLATED = 0x10
+    SPIN_EXTRAPOLATED = 0x20
+    # Row of lazy table not decoded yet, see load_row()
+    PENDING = 0x40
+
+    # (column, dict key) pairs of the string columns
+    _MASS_DEFECT = (('md_value', 'value'), ('md_unc', 'uncertainity'),
+                    ('md_extrap', 'extrapolated'))
+    _HALF_LIFE = (('hl_value', 'value'), ('hl_unit', 'unit'),
+                  ('hl_unc', 'uncertainity'), ('hl_relation', 'relation'),
+                  ('hl_extrap', 'extrapolated'))
+    _SPIN = (('spin_value', 'value'), ('spin_extrap', 'extrapolated'))
+    _DECAY = (('dm_mode', 'mode'), ('dm_value', 'value'),
+              ('dm_relation', 'relation'), ('dm_unc', 'uncertainity'))
+    _ISOMER = (('iso_energy', 'energy'), ('iso_extrap', 'extrapolated'),
+               ('iso_unc', 'uncertainity'))
+    _ISOMER_HALF_LIFE = (('iso_hl_value', 'value'), ('iso_hl_unit', 'unit'),
+                         ('iso_hl_unc', 'uncertainity'),
+                         ('iso_hl_relation', 'relation'),
+                         ('iso_hl_extrap', 'extrapolated'))
+
+    # Columns and their array typecodes, grouped by the entity of a row
+    _NUCLIDE_COLUMNS = (
+        dict(Z='H', A='H', flags='B', comment='I',
+             md_value_num='d', md_unc_num='d',
+             hl_value_num='d', hl_unc_num='d',
+             dm_start='I', dm_count='H', iso_start='I', iso_count='H',
+             src_offset='Q', src_length='I'),
+        dict.fromkeys([c for c, _ in _MASS_DEFECT + _HALF_LIFE + _SPIN], 'I'))
+    # Values of an empty row, string id 0 is always ''
+    _row_defaults = tuple(
+            (column, float('nan') if typecode == 'd' else 0)
+            for group in _NUCLIDE_COLUMNS for column, typecode in group.items())
+    _DECAY_COLUMNS = (
+        dict(dm_value_num='d'),
+        dict.fromkeys([c for c, _ in _DECAY], 'I'))
+    _ISOMER_COLUMNS = (
+        dict(iso_energy_num='d', iso_comment='I',
+             iso_dm_start='I', iso_dm_count='H'),
+        dict.fromkeys([c for c, _ in _ISOMER + _ISOMER_HALF_LIFE], 'I'))
+
+    def __init__(self, source=None):
+        # xml table of pending rows (lazy tables)
+        self.source = source
+        self.strings = _StringPool()
+        self.strings.add('')
+        for group in (self._NUCLIDE_COLUMNS + self._DECAY_COLUMNS +
+                      self._ISOMER_COLUMNS):
+            for column, typecode in group.items():
+                setattr(self, column, array(typecode))
+
+    def __len__(self):
+        return len(self.Z)
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("NuclideTable row {} out of range".format(row))
+        return NuclideRecord(self, row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield NuclideRecord(self, row)
+
+    def freeze(self):
+        """Compacts strings, should be called after loading"""
+        self.strings.freeze()
+
+    @staticmethod
+    def _number(value):
+        """Returns value as float, nan if it is not a number"""
+        try:
+            return float(value)
+        except (ValueError, TypeError):
+            return float('nan')
+
+    @staticmethod
+    def _is_true(value):
+        return value is True or value == 'True'
+
+    def _add_strings(self, data, spec):
+        """Appends values of dict data to the string columns in spec"""
+        add = self.strings.add
+        for column, key in spec:
+            getattr(self, column).append(add(data.get(key, '')))
+
+    def _add_decay_modes(self, decay_modes):
+        """Appends decay modes, returns their start index"""
+        start = len(self.dm_mode)
+        for mode in decay_modes:
+            self._add_strings(mode, self._DECAY)
+            self.dm_value_num.append(self._number(mode.get('value')))
+        return start
+
+    def _new_row(self, Z, A):
+        """Appends row of nuclide Z, A without data, returns its row"""
+        row = len(self)
+        for column, default in self._row_defaults:
+            getattr(self, column).append(default)
+        self.Z[row] = Z
+        self.A[row] = A
+        return row
+
+    def _set_strings(self, index, data, spec):
+        """Sets values of dict data in the string columns in spec"""
+        add = self.strings.add
+        for column, key in spec:
+            getattr(self, column)[index] = add(data.get(key, ''))
+
+    def _fill(self, row, record, decay_modes=True):
+        """Sets data of row from record, the decay modes are skipped
+        if decay_modes is False (they were already set)"""
+        (Z, A, mass_defect, half_life, gs_spin,
+         modes, isomers, comment) = record
+        flags = 0
+        if mass_defect:
+            flags |= self.HAS_MASS_DEFECT
+            if self._is_true(mass_defect.get('extrapolated')):
+                flags |= self.MASS_EXTRAPOLATED
+        if half_life:
+            flags |= self.HAS_HALF_LIFE
+            if self._is_true(half_life.get('extrapolated')):
+                flags |= self.HALF_LIFE_EXTRAPOLATED
+        if gs_spin:
+            flags |= self.HAS_SPIN
+            if self._is_true(gs_spin.get('extrapolated')):
+                flags |= self.SPIN_EXTRAPOLATED
+
+        self.comment[row] = self.strings.add(comment or '')
+        self._set_strings(row, mass_defect, self._MASS_DEFECT)
+        self.md_value_num[row] = self._number(mass_defect.get('value'))
+        self.md_unc_num[row] = self._number(mass_defect.get('uncertainity'))
+        self._set_strings(row, half_life, self._HALF_LIFE)
+        self.hl_value_num[row] = self._number(half_life.get('value'))
+        self.hl_unc_num[row] = self._number(half_life.get('uncertainity'))
+        self._set_strings(row, gs_spin, self._SPIN)
+
+        if decay_modes:
+            self.dm_start[row] = self._add_decay_modes(modes)
+            self.dm_count[row] = len(modes)
+
+        self.iso_start[row] = len(self.iso_energy)
+        self.iso_count[row] = len(isomers)
+        for isomer in isomers:
+            self._add_strings(isomer, self._ISOMER)
+            self._add_strings(isomer['half_life'], self._ISOMER_HALF_LIFE)
+            self.iso_energy_num.append(self._number(isomer.get('energy')))
+            self.iso_comment.append(
+                    self.strings.add(isomer.get('comment', '')))
+            self.iso_dm_start.append(
+                    self._add_decay_modes(isomer['decay_modes']))
+            self.iso_dm_count.append(len(isomer['decay_modes']))
+        # Set last, this also clears the PENDING bit
+        self.flags[row] = flags
+
+    def append(self, record):
+        """Appends nuclide given as record (see Nuclide.to_record),
+        returns its row"""
+        row = self._new_row(record[0], record[1])
+        self._fill(row, record)
+        return row
+
+    def append_pending(self, Z, A, decay_modes, offset, length):
+        """Appends nuclide of lazy table: only Z, A and decay modes are
+        known, the rest is decoded by load_row() from the entry at
+        offset (in bytes, entry is length bytes long) in self.source.
+        Returns its row"""
+        row = self._new_row(Z, A)
+        self.dm_start[row] = self._add_decay_modes(decay_modes)
+        self.dm_count[row] = len(decay_modes)
+        self.src_offset[row] = offset
+        self.src_length[row] = length
+        self.flags[row] = self.PENDING
+        return row
+
+    def is_pending(self, row):
+        """True if data of row was not decoded yet (lazy tables)"""
+        return bool(self.flags[row] & self.PENDING)
+
+    def load_row(self, row, source=None):
+        """Decodes data of pending row from the xml table and memoizes it
+        in the table, does nothing for rows already loaded. source may be
+        an already open (binary) file of the table."""
+        if not self.flags[row] & self.PENDING:
+            return
+        if source is None:
+            with open(self.source, 'rb') as fh:
+                self.load_row(row, fh)
+            return
+        source.seek(self.src_offset[row])
+        entry = ElementTree.fromstring(source.read(self.src_length[row]))
+        record = NuclideXml(self.Z[row], self.A[row], entry).to_record()
+        self._fill(row, record, decay_modes=False)
+
+    def load_all(self):
+        """Decodes all pending rows"""
+        rows = [row for row in range(len(self)) if self.is_pending(row)]
+        if len(rows) > 0:
+            with open(self.source, 'rb') as fh:
+                for row in rows:
+                    self.load_row(row, fh)
+
+    def subset(self, rows):
+        """Returns new table made of given rows"""
+        table = NuclideTable()
+        for row in rows:
+            table.append(self.record(row))
+        table.freeze()
+        return table
+
+    def _strings_of(self, index, spec):
+        get = self.strings.get
+        return {key: get(getattr(self, column)[index]) for column, key in spec}
+
+    def _decay_modes_of(self, start, count):
+        return [self._strings_of(i, self._DECAY)
+                for i in range(start, start + count)]
+
+    def mass_defect(self, row):
+        self.load_row(row)
+        if not self.flags[row] & self.HAS_MASS_DEFECT:
+            return {}
+        return self._strings_of(row, self._MASS_DEFECT)
+
+    def half_life(self, row):
+        self.load_row(row)
+        if not self.flags[row] & self.HAS_HALF_LIFE:
+            return {}
+        return self._strings_of(row, self._HALF_LIFE)
+
+    def gs_spin(self, row):
+        self.load_row(row)
+        if not self.flags[row] & self.HAS_SPIN:
+            return {}
+        return self._strings_of(row, self._SPIN)
+
+    def decay_modes(self, row):
+        return self._decay_modes_of(self.dm_start[row], self.dm_count[row])
+
+    def isomers(self, row):
+        self.load_row(row)
+        isomers = []
+        start = self.iso_start[row]
+        for i in range(start, start + self.iso_count[row]):
+            isomer = self._strings_of(i, self._ISOMER)
+            isomer['half_life'] = self._strings_of(i, self._ISOMER_HALF_LIFE)
+            isomer['decay_modes'] = self._decay_modes_of(
+                    self.iso_dm_start[i], self.iso_dm_count[i])
+            isomer['comment'] = self.strings.get(self.iso_comment[i])
+            isomers.append(isomer)
+        return isomers
+
+    def comment_of(self, row):
+        self.load_row(row)
+        return self.strings.get(self.comment[row])
+
+    def record(self, row):
+        """Returns row as a record (see Nuclide.to_record)"""
+        self.load_row(row)
+        return (self.Z[row], self.A[row], self.mass_defect(row),
+                self.half_life(row), self.gs_spin(row),
+                self.decay_modes(row), self.isomers(row),
+                self.comment_of(row))
+
+
+class NuclideRecord(Nuclide):
+    """Read-only view of a NuclideTable row with the same properties as
+    other Nuclide classes. The dicts and lists are built from the table
+    on each access, changing them does not change the table."""
+
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    def __eq__(self, other):
+        return (isinstance(other, NuclideRecord) and
+                self._table is other._table and self._row == other._row)
+
+    def __hash__(self):
+        return hash((id(self._table), self._row))
+
+    @property
+    def row(self):
+        """Row of the nuclide in its NuclideTable"""
+        return self._row
+
+    @property
+    def Z(self):
+        """Returns atomic number Z"""
+        return self._table.Z[self._row]
+
+    @property
+    def A(self):
+        """Returns mass number A"""
+        return self._table.A[self._row]
+
+    @property
+    def N(self):
+        """Number of neutrons (read only)"""
+        return self._table.A[self._row] - self._table.Z[self._row]
+
+    @property
+    def mass_defect(self):
+        """Returns mass defect data in format:
+           dict {value, uncertainity, extrapolated}"""
+        return self._table.mass_defect(self._row)
+
+    @property
+    def half_life(self):
+        """Half-life is returned as a dictionary {value, unit, uncertainity, extrapolated, relation}"""
+        return self._table.half_life(self._row)
+
+    @property
+    def gs_spin(self):
+        """Ground state spin a dict of {value, extrapolated}"""
+        return self._table.gs_spin(self._row)
+
+    @property
+    def decay_modes(self):
+        """A list of decay modes and branching ratios
+        [ {'mode': , 'relation': , 'value' : , 'uncertainity': }, {}, ...]"""
+        return self._table.decay_modes(self._row)
+
+    @property
+    def isomers(self):
+        """A list of isomer dicts, see Nuclide.add_isomer"""
+        return self._table.isomers(self._row)
+
+    @property
+    def comment(self):
+        return self._table.comment_of(self._row)
+
+    def experimental_mass(self):
+        """Returns experimental mass of the nuclide in MeV"""
+        table, row = self._table, self._row
+        table.load_row(row)
+        if (not table.flags[row] & table.HAS_MASS_DEFECT or
+                table.flags[row] & table.MASS_EXTRAPOLATED):
+            return (None, None)
+        value = table.md_value_num[row]
+        error = table.md_unc_num[row]
+        if value != value or error != error:
+            return (None, None)
+        return (table.A[row] * 931.494 + value / 1000, error / 1000)
+
+
+# Chemical element names (lower case) in order of atomic number Z, as
+# Nuclide._element
+ELEMENT_NAMES = (
+    'neutron', 'hydrogen', 'helium', 'lithium', 'beryllium', 'boron',
+    'carbon', 'nitrogen', 'oxygen', 'fluorine', 'neon', 'sodium',
+    'magnesium', 'aluminium', 'silicon', 'phosphorus', 'sulfur', 'chlorine',
+    'argon', 'potassium', 'calcium', 'scandium', 'titanium', 'vanadium',
+    'chromium', 'manganese', 'iron', 'cobalt', 'nickel', 'copper', 'zinc',
+    'gallium', 'germanium', 'arsenic', 'selenium', 'bromine', 'krypton',
+    'rubidium', 'strontium', 'yttrium', 'zirconium', 'niobium',
+    'molybdenum', 'technetium', 'ruthenium', 'rhodium', 'palladium',
+    'silver', 'cadmium', 'indium', 'tin', 'antimony', 'tellurium', 'iodine',
+    'xenon', 'cesium', 'barium', 'lanthanum', 'cerium', 'praseodymium',
+    'neodymium', 'promethium', 'samarium', 'europium', 'gadolinium',
+    'terbium', 'dysprosium', 'holmium', 'erbium', 'thulium', 'ytterbium',
+    'lutetium', 'hafnium', 'tantalum', 'tungsten', 'rhenium', 'osmium',
+    'iridium', 'platinum', 'gold', 'mercury', 'thallium', 'lead', 'bismuth',
+    'polonium', 'astatine', 'radon', 'francium', 'radium', 'actinium',
+    'thorium', 'protactinium', 'uranium', 'neptunium', 'plutonium',
+    'americium', 'curium', 'berkelium', 'californium', 'einsteinium',
+    'fermium', 'mendelevium', 'nobelium', 'lawrencium', 'rutherfordium',
+    'dubnium', 'seaborgium', 'bohrium', 'hassium', 'meitnerium',
+    'darmstadtium', 'roentgenium', 'copernicium', 'nihonium', 'flerovium',
+    'moscovium', 'livermorium', 'tennessine', 'oganesson', 'ununennium',
+    'unbinilium')
+
+# Atomic number of lower cased element symbol or name, the symbols of
+# Nubase2012 and the names adopted since then are both known
+_Z_OF_NAME = {symbol.lower(): Z for Z, symbol in enumerate(Nuclide._element)}
+_Z_OF_NAME.update({name: Z for Z, name in enumerate(ELEMENT_NAMES)})
+_Z_OF_NAME.update({'nh': 113, 'mc': 115, 'ts': 117, 'og': 118,
+                   'aluminum': 13, 'caesium': 55, 'sulphur': 16,
+                   'ununtrium': 113, 'ununpentium': 115,
+                   'ununseptium': 117, 'ununoctium': 118})
+# Isomer marks, e.g. 'm', 'm2', 'n' (second isomer as in Nubase)
+_ISOMER_MARKS = {'m': 1, 'n': 2, 'p': 3, 'q': 4, 'r': 5}
+
+# Nuclide id with the mass number first ('235U', '242mAm', '235Um') or
+# last ('U-235', 'U235', 'uranium-235', 'U-235m2'), lower cased
+_MASS_FIRST_RE = re.compile(r'(\d+)-?([a-z]+\d?)$')
+_MASS_LAST_RE = re.compile(r'([a-z]+)-?(\d+)-?([a-z]\d?)?$')
+
+# Ids of the neutron, lower case 'n' is nitrogen otherwise
+_NEUTRON_IDS = frozenset(['1n', 'n-1', 'n1', 'neutron', 'neutron-1'])
+
+# Result of parse_nuclide_id, isomer is 0 for the ground state
+NuclideId = namedtuple('NuclideId', 'Z A isomer')
+
+
+def _isomer_of(mark):
+    """Returns isomer number of mark ('m', 'm2', 'n', ...) or None"""
+    if not mark:
+        return 0
+    state = _ISOMER_MARKS.get(mark[0])
+    if state is None or len(mark) > 2:
+        return None
+    if len(mark) == 2:
+        if mark[0] != 'm' or not mark[1].isdigit():
+            return None
+        state = int(mark[1])
+    return state
+
+
+def _element_and_isomer(letters, A):
+    """Returns (Z, isomer) of element letters with an optional isomer
+    mark before or after the symbol, e.g. 'u', 'mam', 'um2'. Readings
+    with Z > A are skipped, '12mc' is carbon and not Mc."""
+    Z = _Z_OF_NAME.get(letters)
+    if Z is not None and Z <= A:
+        return Z, 0
+    for size in (1, 2):
+        # 标记在元素符号之前 (242mAm) 或之后 (235Um)
+        for mark, symbol in ((letters[:size], letters[size:]),
+                             (letters[-size:], letters[:-size])):
+            Z = _Z_OF_NAME.get(symbol)
+            isomer = _isomer_of(mark)
+            if Z is not None and isomer and Z <= A:
+                return Z, isomer
+    return None, None
+
+
+@lru_cache(maxsize=4096)
+def parse_nuclide_id(text):
+    """Returns NuclideId(Z, A, isomer) of nuclide id text or None.
+
+    The common spellings are accepted, case and spaces do not matter:
+    '235U', 'U-235', 'U235', 'uranium-235', and isomers like '242mAm',
+    '235Um', 'Am-242m' or 'U-235m2'. Results are cached, so the function
+    is cheap to call for every keystroke or row of a script."""
+    text = text.replace(' ', '')
+    # 'n' 小写时与氮 (N) 相同, 中子单独处理
+    if text in _NEUTRON_IDS:
+        return NuclideId(0, 1, 0)
+    text = text.lower()
+    match = _MASS_FIRST_RE.match(text)
+    if match is not None:
+        A = int(match.group(1))
+        Z, isomer = _element_and_isomer(match.group(2), A)
+    else:
+        match = _MASS_LAST_RE.match(text)
+        if match is None:
+            return None
+        A = int(match.group(2))
+        Z = _Z_OF_NAME.get(match.group(1))
+        isomer = _isomer_of(match.group(3))
+    if Z is None or isomer is None or A < max(Z, 1):
+        return None
+    return NuclideId(Z, A, isomer)
+
+
+# Fixed-width columns (slices) of the Nubase ASCII tables. Nubase2003,
+# 2012 and 2016 share the 'nubase' layout; Nubase2020 (nubase_4.mas20)
+# has wider numbers and a '#' header. isomer is the excitation energy,
+# its uncertainty and origin, comment the ENSDF and discovery years.
+NUBASE_COLUMNS = {
+    'nubase': dict(A=slice(0, 3), Z=slice(4, 7), state=slice(7, 8),
+                   mass=slice(18, 38), isomer=slice(38, 60),
+                   half_life=slice(60, 78), spin=slice(79, 93),
+                   comment=slice(93, 109), decay=slice(110, None)),
+    'nubase2020': dict(A=slice(0, 3), Z=slice(4, 7), state=slice(7, 8),
+                       mass=slice(18, 42), isomer=slice(42, 67),
+                       half_life=slice(69, 88), spin=slice(88, 102),
+                       comment=slice(102, 118), decay=slice(119, None)),
+}
+# Columns of the ASCII Nuclear Wallet Cards, one line per level and
+# decay mode; energy (keV) is blank for the ground state, the mass excess
+# in MeV, half_life is "value unit uncertainty" (see NuclideNwc11)
+NWC_COLUMNS = dict(A=slice(0, 3), element=slice(4, 6), Z=slice(7, 10),
+                   energy=slice(15, 25), spin=slice(26, 44),
+                   mass=slice(45, 55), mass_unc=slice(56, 62),
+                   half_life=slice(63, 82), abundance=slice(83, 93),
+                   mode=slice(94, 100), relation=slice(101, 103),
+                   branch=slice(104, 114))
+# Relations of the wallet cards
+_NWC_RELATIONS = {'': '=', '=': '=', 'ap': '~', 'lt': '<', 'gt': '>',
+                  'le': '\u2264', 'ge': '\u2265'}
+_NUBASE_LINE_RE = re.compile(r'\d{3} \d{4}')
+
+
+def datafile_format(datafile):
+    """Returns format of nuclear table datafile: 'xml', 'nubase'
+    (Nubase2003 - 2016 ASCII), 'nubase2020' or 'nwc' (ASCII wallet
+    cards), None if it can not be read. Only the first lines are read."""
+    header = False
+    try:
+        with open(datafile, encoding='latin-1') as fh:
+            for line in fh:
+                if line.lstrip().startswith('<'):
+                    return 'xml'
+                if line.startswith('#'):
+                    header = True
+                elif line.strip():
+                    if _NUBASE_LINE_RE.match(line):
+                        return 'nubase2020' if header else 'nubase'
+                    return 'nwc'
+    except EnvironmentError as err:
+        print("{0}: import error: {1}".format(datafile, err))
+    return None
+
 
 class NuclideLibrary(object):
     """A NuclideLibrary holds a set of Nuclide objects.
 
-    The nuclides are held in an order based on Z.
-    The library should be made through this class's load() method.
+    The nuclides are stored in a NuclideTable (self.nuclides) in the
+    order of loading, the library yields NuclideRecord views of its rows.
+    The datafile is loaded on the first access, the module does not need
+    Qt so it can be used by scripts and batch jobs.
     """
 
-    def __init__(self, parent=None):
-        self.nuclides = []
+    # Version of the compiled cache of the xml table
+    CACHE_VERSION = 3
+
+    # Nuclide entries, attributes and decay tags of the xml table,
+    # used by the first pass of lazy loading
+    _XML_NUCLIDE_RE = re.compile(rb'<nuclide\s([^>]*)>')
+    _XML_ATTR_RE = re.compile(rb'(\w+)="([^"]*)"')
+    _XML_DECAY_RE = re.compile(rb'<decay\s([^>]*)>')
+
+    def __init__(self, datafile=None, parent=None, lazy=False, cache=True):
+        """datafile is the xml table (default DEFAULT_DATAFILE). It is not
+        read here but on the first access to the nuclides.
+        If lazy is True and there is no valid compiled cache, only the
+        data needed for the chart is read at start (see
+        load_lazy_nuclear_table). With cache False the compiled cache is
+        neither read nor written, e.g. for files picked by the user which
+        may lie in a read-only or shared directory."""
+        self.datafile = DEFAULT_DATAFILE if datafile is None else datafile
+        self.lazy = lazy
+        self.cache = cache
+        self._loaded = False
+        self._table = NuclideTable()
+        # Index of rows on (N, Z) grid, kept in sync by add_nuclide()
+        self._grid = array('i')
+        # Cache of whole-library columns, cleared when nuclides are added
+        self._columns = {}
+        # Earlier evaluation (NuclideLibrary) the library is compared with,
+        # e.g. by the 'changed' chart colors, see evaluations
+        self.baseline = None
+        self._grid_n = 0
+        self._grid_z = 0
         self.z_range = [0, 120]
         self.n_range = [0, 180]
         self.z_limits = [None, None]
         self.n_limits = [None, None]
 
-        self.load_xml_nuclear_table('nubase12.xml', self.n_range, self.z_range,
-                                    self.n_limits, self.z_limits)
+    def _load(self):
+        """Loads datafile on first call"""
+        if self._loaded:
+            return
+        self._loaded = True
+        self.load_cached_nuclear_table(self.datafile, self.n_range,
+                                       self.z_range, self.n_limits,
+                                       self.z_limits)
+
+    @property
+    def nuclides(self):
+        """NuclideTable of the library, the datafile is loaded on first use"""
+        self._load()
+        return self._table
+
+    @nuclides.setter
+    def nuclides(self, table):
+        self._loaded = True
+        self._table = table
 
     # 特殊方法：循环迭代时用到
     def __iter__(self):
         return iter(self.nuclides)
 
-    # 加载XML函数
-    def load_xml_nuclear_table(self, datafile, n_range, z_range,
-                               n_limits = [None, None], z_limits = [None, None]):
+    def __len__(self):
+        return len(self.nuclides)
+
+    def add_nuclide(self, nuclide):
+        """Adds nuclide (any Nuclide object) to the library table and to
+        the lookup index. Returns the NuclideRecord view of the new row."""
+        row = self.nuclides.append(nuclide.to_record())
+        self._index_row(row)
+        return self.nuclides[row]
+
+    def _index_row(self, row):
+        """Puts row of the table on the (N, Z) grid, grid is enlarged
+        (doubled) if necessary"""
+        self._columns.clear()
+        Z = self.nuclides.Z[row]
+        N = self.nuclides.A[row] - Z
+        if N < 0:
+            return
+        if N >= self._grid_n or Z >= self._grid_z:
+            grid_n = max(self._grid_n, 1)
+            while grid_n <= N:
+                grid_n *= 2
+            grid_z = max(self._grid_z, 1)
+            while grid_z <= Z:
+                grid_z *= 2
+            grid = array('i', [-1]) * (grid_n * grid_z)
+            for z in range(self._grid_z):
+                old = z * self._grid_n
+                grid[z * grid_n:z * grid_n + self._grid_n] = \
+                        self._grid[old:old + self._grid_n]
+            self._grid, self._grid_n, self._grid_z = grid, grid_n, grid_z
+        self._grid[Z * self._grid_n + N] = row
+
+    def _reindex(self):
+        """Builds the (N, Z) grid of the whole table"""
+        self._columns.clear()
+        self._grid = array('i')
+        self._grid_n = self._grid_z = 0
+        if len(self.nuclides) > 0:
+            Z, A = self.nuclides.Z, self.nuclides.A
+            self._grid_n = max(a - z for a, z in zip(A, Z)) + 1
+            self._grid_z = max(Z) + 1
+            self._grid = array('i', [-1]) * (self._grid_n * self._grid_z)
+        for row in range(len(self.nuclides)):
+            self._index_row(row)
+
+    def _row(self, N, Z):
+        """Returns table row of (N, Z) or -1"""
+        self._load()
+        if 0 <= N < self._grid_n and 0 <= Z < self._grid_z:
+            return self._grid[Z * self._grid_n + N]
+        return -1
+
+    def begin_load(self):
+        """The library will be filled by extend() (e.g. with batches made
+        by iter_table_batches in a loader thread), it does not read the
+        datafile on first access any more"""
+        self._loaded = True
+        self._init_limits(self.n_range, self.z_range, self.n_limits,
+                          self.z_limits)
+
+    def iter_table_batches(self, batch_size=500):
         """
-        Loads data from nuclear taboe in xml format.
-        Revised from ChartDrawer.py function with same name!
+        Generator of NuclideTable batches with the nuclides of datafile
+        within n_range and z_range, to be added to the library by extend().
+        A valid compiled cache is given as one batch, otherwise the xml
+        table is parsed and given in batches of batch_size nuclides (and
+        the cache, if used, is written at the end).
+
+        It does not change the library, so it can run in another thread
+        than the one using the library; the batches must not be used
+        after they were handed over.
+        """
+        n_limits, z_limits = [None, None], [None, None]
+        self._init_limits(self.n_range, self.z_range, n_limits, z_limits)
+
+        table = (datacache.load(self.datafile, self.CACHE_VERSION)
+                 if self.cache else None)
+        if table is not None:
+            rows = [row for row in range(len(table))
+                    if self._accept(table.A[row] - table.Z[row],
+                                    table.Z[row], self.n_range, self.z_range,
+                                    n_limits, z_limits)]
+            yield table if len(rows) == len(table) else table.subset(rows)
+            return
+
+        state = datacache.stamp(self.datafile) if self.cache else None
+        full = NuclideTable()
+        batch = NuclideTable()
+        for isotope in self.iter_nuclear_table(self.datafile, [0, 1000],
+                                               [0, 1000]):
+            record = isotope.to_record()
+            full.append(record)
+            if self._accept(isotope.N, isotope.Z, self.n_range, self.z_range,
+                            n_limits, z_limits):
+                batch.append(record)
+            if len(batch) >= batch_size:
+                batch.freeze()
+                yield batch
+                batch = NuclideTable()
+        if len(batch) > 0:
+            batch.freeze()
+            yield batch
+        full.freeze()
+        if len(full) > 0 and self.cache:
+            datacache.write(self.datafile, self.CACHE_VERSION, full, state)
+
+    def extend(self, table):
+        """Adds all nuclides of NuclideTable to the library. The table
+        itself becomes the library table if the library is empty."""
+        if len(self._table) == 0:
+            self._table = table
+            self._reindex()
+        else:
+            for row in range(len(table)):
+                self._table.append(table.record(row))
+                self._index_row(len(self._table) - 1)
+        for row in range(len(table)):
+            Z = table.Z[row]
+            self._accept(table.A[row] - Z, Z, self.n_range, self.z_range,
+                         self.n_limits, self.z_limits)
+
+    def load_cached_nuclear_table(self, datafile, n_range, z_range,
+                                  n_limits = [None, None],
+                                  z_limits = [None, None]):
         """
+        Loads nuclear table from the compiled cache of the datafile
+        (see datacache). If the cache is missing or stale the whole
+        table (xml or ASCII, see datafile_format) is parsed and the cache
+        is written again.
+        """
+        table = (datacache.load(datafile, self.CACHE_VERSION)
+                 if self.cache else None)
+        if table is None and self.lazy and datafile_format(datafile) == 'xml':
+            self.load_lazy_nuclear_table(datafile, n_range, z_range,
+                                         n_limits, z_limits)
+            return
+        if table is None:
+            state = datacache.stamp(datafile) if self.cache else None
+            table = NuclideTable()
+            for isotope in self.iter_nuclear_table(datafile, [0, 1000],
+                                                   [0, 1000]):
+                table.append(isotope.to_record())
+            table.freeze()
+            if len(table) > 0 and self.cache:
+                datacache.write(datafile, self.CACHE_VERSION, table, state)
+
+        self._init_limits(n_range, z_range, n_limits, z_limits)
+        rows = [row for row in range(len(table))
+                if self._accept(table.A[row] - table.Z[row], table.Z[row],
+                                n_range, z_range, n_limits, z_limits)]
+        if len(self.nuclides) == 0 and len(rows) == len(table):
+            self.nuclides = table
+            self._reindex()
+        else:
+            for row in rows:
+                self.nuclides.append(table.record(row))
+                self._index_row(len(self.nuclides) - 1)
+            self.nuclides.freeze()
+
+    @staticmethod
+    def _unescape(value):
+        """Replaces xml entities in attribute value"""
+        for entity, char in (('&lt;', '<'), ('&gt;', '>'), ('&quot;', '"'),
+                             ('&apos;', "'"), ('&amp;', '&')):
+            value = value.replace(entity, char)
+        return value
+
+    def load_lazy_nuclear_table(self, datafile, n_range, z_range,
+                                n_limits = [None, None],
+                                z_limits = [None, None]):
+        """
+        First pass of lazy loading of nuclear table in xml format.
+        Only Z, A and ground state decay modes (all the chart needs) are
+        read together with the byte offset of each nuclide entry. The rest
+        (mass, half-life, spin, isomers, comment) is decoded from the file
+        and memoized the first time it is accessed (NuclideTable.load_row).
+        """
+        try:
+            with open(datafile, 'rb') as fh:
+                data = fh.read()
+        except EnvironmentError as err:
+            print("{0}: import error: {1}".format(datafile, err))
+            return None
+
+        self.nuclides.source = os.path.abspath(datafile)
+        self._init_limits(n_range, z_range, n_limits, z_limits)
+        for entry in self._XML_NUCLIDE_RE.finditer(data):
+            start = entry.start()
+            end = data.find(b'</nuclide>', start) + len(b'</nuclide>')
+            try:
+                attrs = dict(self._XML_ATTR_RE.findall(entry.group(1)))
+                A = int(attrs[b'A'])
+                Z = int(attrs[b'Z'])
+                if not self._accept(A - Z, Z, n_range, z_range,
+                                    n_limits, z_limits):
+                    continue
+
+                # First decay_modes tag belongs to the ground state
+                decay_end = data.find(b'</decay_modes>', entry.end(), end)
+                decay_modes = []
+                for decay in self._XML_DECAY_RE.finditer(data, entry.end(),
+                                                         decay_end):
+                    mode = {}
+                    for key, value in self._XML_ATTR_RE.findall(decay.group(1)):
+                        value = value.decode('utf-8')
+                        if '&' in value:
+                            value = self._unescape(value)
+                        mode[key.decode()] = value
+                    decay_modes.append(mode)
+            except (ValueError, LookupError) as err:
+                print("{0}: import error: {1}".format(datafile, err))
+                continue
+            row = self.nuclides.append_pending(Z, A, decay_modes,
+                                               start, end - start)
+            self._index_row(row)
+        self.nuclides.freeze()
+
+    @staticmethod
+    def _init_limits(n_range, z_range, n_limits, z_limits):
+        """Sets limits for _accept()"""
         # Make high and low limit oposite
         # Later each point is checked against:
         # n_limits[0] = N if N < n_limits[0]
@@ -882,43 +1830,420 @@ class NuclideLibrary(object):
         z_limits[0] = z_range[1]
         z_limits[1] = z_range[0]
 
+    @staticmethod
+    def _accept(N, Z, n_range, z_range, n_limits, z_limits):
+        """Returns True if nuclide is within n_range and z_range,
+        the n_limits and z_limits are extended to include it"""
+        if not(n_range[0] <= N <= n_range[1] and
+               z_range[0] <= Z <= z_range[1]):
+            return False
+
+        if N < n_limits[0]:
+            n_limits[0] = N
+        if N > n_limits[1]:
+            n_limits[1] = N
+        if Z < z_limits[0]:
+            z_limits[0] = Z
+        if Z > z_limits[1]:
+            z_limits[1] = Z
+        return True
+
+    # 加载XML函数
+    def load_xml_nuclear_table(self, datafile, n_range, z_range,
+                               n_limits = [None, None], z_limits = [None, None]):
+        """
+        Loads data from nuclear taboe in xml format.
+        Revised from ChartDrawer.py function with same name!
+        """
+        for isotope in self.iter_xml_nuclear_table(datafile, n_range, z_range,
+                                                   n_limits, z_limits):
+            self.add_nuclide(isotope)
+
+    def iter_xml_nuclear_table(self, datafile, n_range, z_range,
+                               n_limits = [None, None], z_limits = [None, None]):
+        """
+        Generator yielding NuclideXml objects from nuclear table in xml
+        format. The file is streamed with iterparse, each nuclide is
+        built when its </nuclide> tag is closed and the subtree is
+        freed afterwards, so the whole document is never held in memory.
+        """
+        self._init_limits(n_range, z_range, n_limits, z_limits)
+
         try:
-            dom = xml.dom.minidom.parse(datafile)
-        except (EnvironmentError, xml.parsers.expat.ExpatError) as err:
+            context = ElementTree.iterparse(datafile, events=('start', 'end'))
+            _, root = next(context)
+
+            # Parse the XML file
+            for event, nuclide in context:
+                if event != 'end' or nuclide.tag != 'nuclide':
+                    continue
+                try:
+                    A = int(nuclide.get('A'))
+                    Z = int(nuclide.get('Z'))
+                    if not self._accept(A - Z, Z, n_range, z_range,
+                                        n_limits, z_limits):
+                        continue
+
+                    isotope = NuclideXml(Z, A, nuclide)
+
+                except (ValueError, LookupError) as err:
+                    print("{0}: import error: {1}".format(datafile, err))
+                    continue
+                finally:
+                    # Free the parsed subtree
+                    nuclide.clear()
+                    root.clear()
+
+                yield isotope
+
+        except (EnvironmentError, StopIteration, ElementTree.ParseError) as err:
             print("{0}: import error: {1}".format(datafile, err))
             return None
 
-        # Parse the XML file
-        for nuclide in dom.getElementsByTagName('nuclide'):
-            try:
-                A = int(nuclide.getAttribute('A'))
-                Z = int(nuclide.getAttribute('Z'))
-                N = A - Z
+    def iter_nuclear_table(self, datafile, n_range, z_range,
+                           n_limits = [None, None], z_limits = [None, None]):
+        """
+        Generator yielding nuclides of nuclear table datafile in any
+        format of datafile_format (xml, Nubase ASCII, wallet cards)
+        """
+        data_format = datafile_format(datafile)
+        if data_format == 'nwc':
+            return self.iter_nwc_nuclear_table(datafile, n_range, z_range,
+                                               n_limits, z_limits)
+        if data_format in NUBASE_COLUMNS:
+            return self.iter_nubase_nuclear_table(datafile, n_range, z_range,
+                                                  n_limits, z_limits,
+                                                  data_format)
+        return self.iter_xml_nuclear_table(datafile, n_range, z_range,
+                                           n_limits, z_limits)
+
+    @staticmethod
+    def _data_lines(datafile):
+        """Generator of the lines of ASCII datafile without the blank and
+        '#' comment lines"""
+        try:
+            with open(datafile, encoding='latin-1') as fh:
+                for line in fh:
+                    if line.startswith('#') or not line.strip():
+                        continue
+                    yield line.rstrip('\r\n')
+        except EnvironmentError as err:
+            print("{0}: import error: {1}".format(datafile, err))
 
-                if not(n_range[0] <= N <= n_range[1] and
-                       z_range[0] <= Z <= z_range[1]):
+    # 加载 Nubase ASCII 函数
+    def load_nubase_nuclear_table(self, datafile, n_range, z_range,
+                                  n_limits = [None, None],
+                                  z_limits = [None, None], layout=None):
+        """
+        Loads data from Nubase ASCII table, see iter_nubase_nuclear_table
+        """
+        for isotope in self.iter_nubase_nuclear_table(datafile, n_range,
+                                                      z_range, n_limits,
+                                                      z_limits, layout):
+            self.add_nuclide(isotope)
+
+    def iter_nubase_nuclear_table(self, datafile, n_range, z_range,
+                                  n_limits = [None, None],
+                                  z_limits = [None, None], layout=None):
+        """
+        Generator yielding NuclideNb03 objects from Nubase ASCII table
+        (layout is a key of NUBASE_COLUMNS, found by datafile_format if
+        None). The file is read line by line and the fields are sliced
+        from their columns; the excited states (isomers, levels and IAS)
+        follow their ground state and are added to it.
+        """
+        if layout is None:
+            layout = datafile_format(datafile)
+        columns = NUBASE_COLUMNS.get(layout)
+        if columns is None:
+            print("{0}: import error: not a Nubase table".format(datafile))
+            return
+        A_, Z_, state_ = columns['A'], columns['Z'], columns['state']
+        mass_, isomer_ = columns['mass'], columns['isomer']
+        half_life_, spin_ = columns['half_life'], columns['spin']
+        comment_, decay_ = columns['comment'], columns['decay']
+        self._init_limits(n_range, z_range, n_limits, z_limits)
+
+        isotope = None
+        for line in self._data_lines(datafile):
+            try:
+                A = int(line[A_])
+                Z = int(line[Z_])
+                # 衰变模式小写, 与 xml 表相同
+                decay_modes = line[decay_].lower()
+                comment = line[comment_].strip()
+                if line[state_] != '0':
+                    if isotope is not None and (isotope.Z, isotope.A) == (Z, A):
+                        isotope.nb_add_isomer(line[isomer_], line[half_life_],
+                                              decay_modes, comment)
                     continue
-                elif N > n_range[1] and Z > z_range[1]:
-                    break
-
-                if N < n_limits[0]:
-                    n_limits[0] = N
-                if N > n_limits[1]:
-                    n_limits[1] = N
-                if Z < z_limits[0]:
-                    z_limits[0] = Z
-                if Z > z_limits[1]:
-                    z_limits[1] = Z
+                if isotope is not None:
+                    yield isotope
+                isotope = None
+                if not self._accept(A - Z, Z, n_range, z_range,
+                                    n_limits, z_limits):
+                    continue
+                isotope = NuclideNb03(Z, A, line[mass_], line[half_life_],
+                                      line[spin_], decay_modes, comment)
+            except (ValueError, ParameterError) as err:
+                print("{0}: import error: {1}".format(datafile, err))
+        if isotope is not None:
+            yield isotope
 
-                isotope = NuclideXml(Z, A, nuclide)
-                self.nuclides.append(isotope)
+    # 加载 Nuclear Wallet Cards 函数
+    def load_nwc_nuclear_table(self, datafile, n_range, z_range,
+                               n_limits = [None, None],
+                               z_limits = [None, None]):
+        """
+        Loads data from ASCII Nuclear Wallet Cards, see
+        iter_nwc_nuclear_table
+        """
+        for isotope in self.iter_nwc_nuclear_table(datafile, n_range,
+                                                   z_range, n_limits,
+                                                   z_limits):
+            self.add_nuclide(isotope)
+
+    @staticmethod
+    def _nwc_mass_defect(line):
+        """Returns mass defect dict (keV) of wallet cards line"""
+        mass = line[NWC_COLUMNS['mass']]
+        error = line[NWC_COLUMNS['mass_unc']]
+        extrapolated = '#' in mass or '#' in error
+        mass = mass.replace('#', '').strip()
+        error = error.replace('#', '').strip()
+        if not mass:
+            return {'value': '?', 'uncertainity': '?',
+                    'extrapolated': extrapolated}
+        # MeV -> keV
+        return {'value': '{:.10g}'.format(float(mass) * 1000),
+                'uncertainity': ('{:.10g}'.format(float(error) * 1000)
+                                 if error else '?'),
+                'extrapolated': extrapolated}
+
+    @staticmethod
+    def _nwc_decay_mode(line):
+        """Returns decay mode dict of wallet cards line, None if there is
+        no decay mode"""
+        mode = line[NWC_COLUMNS['mode']].strip().lower()
+        if not mode:
+            return None
+        relation = line[NWC_COLUMNS['relation']].strip().lower()
+        value = line[NWC_COLUMNS['branch']].strip()
+        return {'mode': mode, 'relation': _NWC_RELATIONS.get(relation, '='),
+                'value': value or '?', 'uncertainity': '0'}
+
+    def iter_nwc_nuclear_table(self, datafile, n_range, z_range,
+                               n_limits = [None, None],
+                               z_limits = [None, None]):
+        """
+        Generator yielding NuclideNwc11 objects from ASCII Nuclear Wallet
+        Cards (columns of NWC_COLUMNS). The lines of a level (one per
+        decay mode) are joined, the excited levels are added as isomers
+        of their ground state; the abundance is given as 'is' decay mode.
+        """
+        self._init_limits(n_range, z_range, n_limits, z_limits)
+        columns = NWC_COLUMNS
 
-            except (ValueError, LookupError) as err:
+        isotope = None
+        level = None        # 当前能级 (Z, A, energy) 与其数据
+        for line in self._data_lines(datafile):
+            try:
+                A = int(line[columns['A']])
+                Z = int(line[columns['Z']])
+                energy = line[columns['energy']].strip()
+                key = (Z, A, energy)
+                if level is None or level[0] != key:
+                    if not energy:
+                        if isotope is not None:
+                            yield isotope
+                        isotope = None
+                        if not self._accept(A - Z, Z, n_range, z_range,
+                                            n_limits, z_limits):
+                            level = (key, None)
+                            continue
+                        spin = line[columns['spin']].strip()
+                        isotope = NuclideNwc11(
+                                Z, A, self._nwc_mass_defect(line),
+                                line[columns['half_life']],
+                                {'value': spin, 'extrapolated': '#' in spin},
+                                [])
+                        level = (key, isotope.decay_modes)
+                    elif isotope is not None and (isotope.Z, isotope.A) == (Z, A):
+                        isomer = {'energy': energy, 'uncertainity': '',
+                                  'extrapolated': False,
+                                  'half_life': isotope.nwc_parse_half_life(
+                                          line[columns['half_life']]),
+                                  'decay_modes': [], 'comment': ''}
+                        isotope.add_isomer(isomer)
+                        level = (key, isomer['decay_modes'])
+                    else:
+                        level = (key, None)
+                    abundance = line[columns['abundance']].strip()
+                    if abundance and level[1] is not None:
+                        level[1].append({'mode': 'is', 'relation': '=',
+                                         'value': abundance,
+                                         'uncertainity': '0'})
+                mode = self._nwc_decay_mode(line)
+                if mode is not None and level[1] is not None:
+                    level[1].append(mode)
+            except (ValueError, ParameterError) as err:
                 print("{0}: import error: {1}".format(datafile, err))
+        if isotope is not None:
+            yield isotope
+
+    def _column(self, name, build):
+        """Returns cached column name, build() makes it on first use"""
+        column = self._columns.get(name)
+        if column is None:
+            self.nuclides.load_all()
+            column = self._columns[name] = build()
+        return column
+
+    @staticmethod
+    def _rows_of(selection):
+        """Returns list of rows of selection (rows or NuclideRecord views)"""
+        return [item.row if isinstance(item, NuclideRecord) else item
+                for item in selection]
+
+    @classmethod
+    def _select(cls, columns, selection):
+        """Returns columns (namedtuple of arrays) restricted to selection"""
+        if selection is None:
+            return columns
+        rows = cls._rows_of(selection)
+        return type(columns)(*[array(column.typecode,
+                                     [column[row] for row in rows])
+                               for column in columns])
+
+    def half_lives(self, selection=None):
+        """Returns HalfLifeColumns of the library or of selection (list of
+        rows or nuclides). Half-lives are in seconds, inf for stable and
+        nan for unknown nuclides (also flagged by the masks)."""
+        return self._select(self._column('half_life', self._build_half_lives),
+                            selection)
+
+    def _build_half_lives(self):
+        table = self.nuclides
+        nan, inf = float('nan'), float('inf')
+        # One unit conversion per distinct unit string
+        factors = {}
+        for unit in set(table.hl_unit):
+            factor = Nuclide.time_unit_factor(table.strings.get(unit))
+            factors[unit] = nan if factor is None else factor
+        stable_id = set(i for i in set(table.hl_value)
+                        if table.strings.get(i) == 'stable')
+
+        factor = [factors[unit] for unit in table.hl_unit]
+        stable = array('B', [value in stable_id for value in table.hl_value])
+        seconds = array('d', [inf if s else value * f for value, f, s in
+                              zip(table.hl_value_num, factor, stable)])
+        uncertainty = array('d', [nan if s else error * f for error, f, s in
+                                  zip(table.hl_unc_num, factor, stable)])
+        unknown = array('B', [t != t for t in seconds])
+        extrapolated = array('B', [
+                bool(flags & table.HALF_LIFE_EXTRAPOLATED)
+                for flags in table.flags])
+        return HalfLifeColumns(seconds, uncertainty, stable, unknown,
+                               extrapolated)
+
+    def mass_excesses(self, selection=None):
+        """Returns MassColumns of mass excess (keV) of the library or of
+        selection (list of rows or nuclides)"""
+        return self._select(self._column('mass_excess',
+                                         self._build_mass_excesses),
+                            selection)
+
+    def _build_mass_excesses(self):
+        table = self.nuclides
+        value = array('d', table.md_value_num)
+        uncertainty = array('d', table.md_unc_num)
+        unknown = array('B', [v != v for v in value])
+        extrapolated = array('B', [bool(flags & table.MASS_EXTRAPOLATED)
+                                   for flags in table.flags])
+        return MassColumns(value, uncertainty, unknown, extrapolated)
+
+    def atomic_masses(self, selection=None):
+        """Returns MassColumns of atomic mass (u) of the library or of
+        selection (list of rows or nuclides)"""
+        return self._select(self._column('atomic_mass',
+                                         self._build_atomic_masses),
+                            selection)
+
+    def _build_atomic_masses(self):
+        excess = self.mass_excesses()
+        value = array('d', [A + v / U_TO_KEV for A, v in
+                            zip(self.nuclides.A, excess.value)])
+        uncertainty = array('d', [v / U_TO_KEV for v in excess.uncertainty])
+        return MassColumns(value, uncertainty, excess.unknown,
+                           excess.extrapolated)
+
+    def index(self):
+        """Returns NuclideIndex of the library, see nuclidequery"""
+        return self._column('index',
+                            lambda: nuclidequery.NuclideIndex(self))
+
+    def energies(self):
+        """Returns NuclideEnergies (binding, separation and Q-values) of
+        the library, see energies"""
+        return self._column('energies', lambda: energies.NuclideEnergies(self))
+
+    def decay_graph(self):
+        """Returns DecayGraph of the library, see decaychain"""
+        return self._column('decay_graph',
+                            lambda: decaychain.DecayGraph(self))
+
+    def query(self, predicate, result='nuclides'):
+        """Returns nuclides matching predicate (see nuclidequery), e.g.
+            query(ZRange(50, 82) & HalfLifeRange(1e-3, 1) & DecayMode('b-'))
+        result selects what is returned: 'nuclides', 'rows', 'ids'
+        (e.g. '235U') or 'count'
+        """
+        bits = predicate.bits(self.index())
+        if result == 'count':
+            return nuclidequery.count_bits(bits)
+        rows = nuclidequery.bits_to_rows(bits)
+        if result == 'rows':
+            return rows
+        elif result == 'ids':
+            table = self.nuclides
+            return ["{}{}".format(table.A[row], Nuclide._element[table.Z[row]])
+                    for row in rows]
+        elif result == 'nuclides':
+            return [self.nuclides[row] for row in rows]
+        raise ParameterError("Unknown query result '{}'".format(result))
 
     def getNuclide(self, N, Z):
-        for nuclide in self.nuclides:
-            if N == nuclide.N and Z == nuclide.Z:
-                return nuclide
-        return None
-
+        """Returns nuclide with N neutrons and Z protons or None"""
+        row = self._row(N, Z)
+        return self.nuclides[row] if row >= 0 else None
+
+    def getNuclideByZA(self, Z, A):
+        """Returns nuclide with atomic number Z and mass number A or None"""
+        return self.getNuclide(A - Z, Z)
+
+    def getNuclideById(self, nuclide_id):
+        """Returns nuclide by its id or None. Any spelling known to
+        parse_nuclide_id() is accepted ('235U', 'U-235', 'uranium-235'),
+        for an isomer id the nuclide holding the isomer is returned."""
+        parsed = parse_nuclide_id(nuclide_id)
+        if parsed is None:
+            return None
+        return self.getNuclideByZA(parsed.Z, parsed.A)
+
+    def isotopes(self, Z):
+        """Returns list of nuclides with atomic number Z (isotopes)"""
+        self._load()
+        if not 0 <= Z < self._grid_z:
+            return []
+        rows = self._grid[Z * self._grid_n:(Z + 1) * self._grid_n]
+        return [self.nuclides[row] for row in rows if row >= 0]
+
+    def isotopesByZ(self):
+        """Returns isotopes of the whole library grouped as dict {Z: [nuclides]}"""
+        self._load()
+        groups = {}
+        for Z in range(self._grid_z):
+            isotopes = self.isotopes(Z)
+            if len(isotopes) > 0:
+                groups[Z] = isotopes
+        return groups
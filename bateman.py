@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018-01 Jimin Ma. All rights reserved.
+
+'''
+Time evolution of nuclide mixtures (Bateman equations)
+
+The amounts of a mixture decaying along the decay graph (see decaychain)
+follow dN/dt = A N, A made of the decay constants and branching fractions
+of the library. For one starting nuclide (the root) the solution is a sum
+of exponentials of the decay constants of its chain,
+
+    N_j(t) = sum_i C_ji exp(-lambda_i t),
+
+and the coefficients C (the decomposition of the chain) are found once,
+parents before daughters, and kept per root. A mixture is the sum of its
+roots scaled by their amounts. The terms of all roots are added up per
+nuclide and decay constant first, so a batch of time points needs one
+exponential per decay constant and time and one pass per term:
+
+    solver = BatemanSolver(library)
+    inventory = solver.evolve({'238U': 1e20, '226Ra': 1e12},
+                              [0, 3.15e7, 3.15e10])
+    inventory.amounts[row]               # array of amounts over the times
+    solver.activities(inventory)[row]    # decays per second
+
+Times are in seconds. Stable nuclides and nuclides of unknown half-life
+do not decay. Equal decay constants of a nuclide and one of its ancestors
+are moved apart by a relative DEGENERATE_SHIFT, the usual way to keep the
+closed form.
+
+The sum of the terms cancels where the amount is small against the
+coefficients (early times, long chains): it is only known to about
+
+    n eps sum_i |C_ji|,
+
+n the number of terms and eps the float precision (CANCELLATION). Amounts
+within this bound are set to 0, and at t = 0 the initial amounts are
+given exactly.
+'''
+import math
+import sys
+from array import array
+from collections import namedtuple
+
+# Result of BatemanSolver.evolve: amounts is a dict row -> array('d') of
+# the amount at each time
+Inventory = namedtuple('Inventory', 'times amounts')
+
+# Relative change of equal decay constants in a chain
+DEGENERATE_SHIFT = 1e-9
+# Relative rounding error of each term of a sum, see the module
+CANCELLATION = sys.float_info.epsilon
+
+
+class BatemanSolver(object):
+    """Decay of nuclide mixtures of a NuclideLibrary"""
+
+    def __init__(self, library):
+        self.library = library
+        self.graph = library.decay_graph()
+        self.constants = array('d', [math.log(2) / seconds
+                                     if 0 < seconds < math.inf else 0.0
+                                     for seconds in
+                                     library.half_lives().seconds])
+        self._chains = {}
+
+    def _row(self, nuclide):
+        """Row of nuclide given as row, NuclideRecord or id ('238U')"""
+        if isinstance(nuclide, int):
+            return nuclide
+        if isinstance(nuclide, str):
+            record = self.library.getNuclideById(nuclide)
+            if record is None:
+                raise KeyError("Unknown nuclide {}".format(nuclide))
+            return record.row
+        return nuclide.row
+
+    def decomposition(self, nuclide):
+        """Returns (rows, constants, coefficients) of the chain of nuclide:
+        the chain rows, their (shifted) decay constants and for each row
+        a list of (chain index, C) of the nonzero terms"""
+        root = self._row(nuclide)
+        decomposition = self._chains.get(root)
+        if decomposition is not None:
+            return decomposition
+
+        graph = self.graph
+        rows = graph.chain(root)
+        position = {row: i for i, row in enumerate(rows)}
+        constants = [self.constants[row] for row in rows]
+        coefficients = [{0: 1.0}]
+        for j in range(1, len(rows)):
+            # 来自各父核的衰变
+            feed = {}
+            for parent, weight, _ in graph.parentsOf(rows[j]):
+                p = position.get(parent)
+                if p is None or p >= j or weight == 0.0:
+                    continue
+                rate = weight * constants[p]
+                for i, C in coefficients[p].items():
+                    feed[i] = feed.get(i, 0.0) + rate * C
+            terms = {}
+            for i, value in feed.items():
+                if constants[j] == constants[i]:
+                    constants[j] *= 1.0 + DEGENERATE_SHIFT
+            for i, value in feed.items():
+                if value != 0.0:
+                    terms[i] = value / (constants[j] - constants[i])
+            if terms:
+                terms[j] = -sum(terms.values())
+            coefficients.append(terms)
+
+        decomposition = (rows, constants,
+                         [sorted(terms.items()) for terms in coefficients])
+        self._chains[root] = decomposition
+        return decomposition
+
+    def evolve(self, initial, times):
+        """Returns Inventory of mixture initial (dict of nuclide, given as
+        row, NuclideRecord or id, to amount) at times (seconds). Amounts
+        within the cancellation bound (see the module) are 0."""
+        times = array('d', times)
+        # 合并所有初始核素的系数: row -> {衰变常数: 系数}
+        terms = {}
+        bounds = {}                 # row -> [项数, sum |C|]
+        start = {}                  # row -> 初始数量
+        for nuclide, amount in initial.items():
+            rows, constants, coefficients = self.decomposition(nuclide)
+            start[rows[0]] = start.get(rows[0], 0.0) + amount
+            for row, chainTerms in zip(rows, coefficients):
+                if not chainTerms:
+                    continue
+                merged = terms.setdefault(row, {})
+                bound = bounds.setdefault(row, [0, 0.0])
+                for i, C in chainTerms:
+                    merged[constants[i]] = (merged.get(constants[i], 0.0) +
+                                            amount * C)
+                    bound[0] += 1
+                    bound[1] += abs(amount * C)
+
+        # 每个衰变常数对所有时间点只计算一次指数
+        exponentials = {}
+        amounts = {}
+        for row, merged in terms.items():
+            values = array('d', [0.0]) * len(times)
+            for constant, C in merged.items():
+                e = exponentials.get(constant)
+                if e is None:
+                    e = exponentials[constant] = array(
+                            'd', [math.exp(-constant * t) for t in times])
+                values = array('d', [v + C * x for v, x in zip(values, e)])
+            # 抵消误差以内的数量为 0, t = 0 时为初始数量
+            count, magnitude = bounds[row]
+            bound = count * CANCELLATION * magnitude
+            for k, t in enumerate(times):
+                if t == 0:
+                    values[k] = start.get(row, 0.0)
+                elif abs(values[k]) <= bound:
+                    values[k] = 0.0
+            amounts[row] = values
+        return Inventory(times, amounts)
+
+    def activities(self, inventory):
+        """Returns dict row -> array('d') of activities (amount times decay
+        constant, Bq if the amounts are atoms) of inventory"""
+        return {row: array('d', [self.constants[row] * value
+                                 for value in values])
+                for row, values in inventory.amounts.items()}
+
+    def total(self, inventory):
+        """Returns array('d') of the total amount at each time"""
+        total = array('d', [0.0]) * len(inventory.times)
+        for values in inventory.amounts.values():
+            total = array('d', [t + v for t, v in zip(total, values)])
+        return total
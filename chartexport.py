@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018-01 Jimin Ma. All rights reserved.
+
+'''
+Headless export of the nuclide chart and the element table
+
+    python3 chartexport.py nuclides chart.png --width 20000
+    python3 chartexport.py elements table-{color}.pdf --color phase --color category
+
+PNG files are rendered in tiles of at most TILE_WIDTH x TILE_HEIGHT pixels
+and written band by band, so memory does not grow with the image height.
+SVG and PDF files are vector drawings of the whole chart. The databases
+are read once and the layout (cell size, fonts) is made once for all the
+color schemes of a run.
+'''
+import argparse
+import os
+import struct
+import sys
+import zlib
+
+# Qt needs no display for rendering into images and files
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QRectF, QRect, QSize, QSizeF, QMarginsF
+from PyQt5.QtGui import (QGuiApplication, QPainter, QImage, QColor, QFont,
+                         QPdfWriter, QPageSize)
+from PyQt5.QtSvg import QSvgGenerator
+
+import element
+import elementchart
+import Nuclide
+import nuclidechart
+from nuclidechart import NMAX, ZMAX, NZ_MARGIN
+
+TILE_WIDTH, TILE_HEIGHT = 2048, 256
+
+
+class NuclideChart(object):
+    """Layout of the nuclide chart for export, width x height pixels"""
+
+    # Names of the color schemes and heat maps
+    colors = nuclidechart.COLOR_MODES
+
+    def __init__(self, library, width, height=None):
+        self.library = library
+        self.cell_width = width / (NMAX + NZ_MARGIN)
+        # Square cells unless the height is given
+        self.cell_height = (self.cell_width if height is None
+                            else height / (ZMAX + NZ_MARGIN))
+        self.width, self.height = (int(round(size)) for size in
+                                   nuclidechart.chart_size(self.cell_width,
+                                                           self.cell_height))
+        self.font = QFont()
+        self.font.setPixelSize(max(1, int(self.cell_height * 1.2)))
+        self.title_font = QFont("Courier")
+        self.title_font.setPixelSize(max(1, int(self.cell_height * 3)))
+        self.snapshot = None
+
+    def setColor(self, name):
+        self.snapshot = nuclidechart.ChartSnapshot(
+                self.library, nuclidechart.chart_colors(name))
+
+    def paint(self, painter, clip):
+        nuclidechart.paint_chart(painter, self.snapshot, self.cell_width,
+                                 self.cell_height, clip, self.library,
+                                 self.font, self.title_font)
+
+
+class ElementChart(object):
+    """Layout of the element table for export, width x height pixels"""
+
+    # Names of the color schemes
+    colors = sorted(elementchart.COLOR_BY)
+
+    def __init__(self, elements, width, height=None):
+        self.elements = elements
+        self.cell_width = width / elementchart.COLUMNS
+        self.cell_height = (self.cell_width if height is None
+                            else height / elementchart.ROWS)
+        self.width, self.height = (int(round(size)) for size in
+                                   elementchart.table_size(self.cell_width,
+                                                           self.cell_height))
+        self.fonts = elementchart.cell_fonts(self.cell_height)
+        self.color = 'phase'
+
+    def setColor(self, name):
+        self.color = name
+
+    def paint(self, painter, clip):
+        elementchart.paint_table(painter, self.elements, self.cell_width,
+                                 self.cell_height, clip, self.color,
+                                 self.fonts)
+
+
+class PngWriter(object):
+    """Writes an RGBA PNG file row by row, the rows are compressed as
+    they come in"""
+
+    def __init__(self, path, width, height):
+        self.fh = open(path, 'wb')
+        self.compressor = zlib.compressobj(6)
+        self.fh.write(b'\x89PNG\r\n\x1a\n')
+        self.chunk(b'IHDR', struct.pack('>IIBBBBB', width, height,
+                                        8, 6, 0, 0, 0))
+
+    def chunk(self, kind, data):
+        self.fh.write(struct.pack('>I', len(data)))
+        self.fh.write(kind)
+        self.fh.write(data)
+        self.fh.write(struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    def write_rows(self, rows):
+        """Writes rows (bytes of width RGBA pixels each)"""
+        data = self.compressor.compress(
+                b''.join(b'\x00' + row for row in rows))
+        if data:
+            self.chunk(b'IDAT', data)
+
+    def close(self):
+        self.chunk(b'IDAT', self.compressor.flush())
+        self.chunk(b'IEND', b'')
+        self.fh.close()
+
+
+def render_tile(chart, rect, background):
+    """Returns RGBA QImage of chart part rect (QRect)"""
+    image = QImage(rect.width(), rect.height(), QImage.Format_RGBA8888)
+    image.fill(background)
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.Antialiasing)
+    painter.setRenderHint(QPainter.TextAntialiasing)
+    painter.translate(-rect.left(), -rect.top())
+    clip = QRectF(rect)
+    painter.setClipRect(clip)
+    chart.paint(painter, clip)
+    painter.end()
+    return image
+
+
+def export_png(chart, path, background):
+    """Renders chart tile by tile into PNG file path"""
+    writer = PngWriter(path, chart.width, chart.height)
+    try:
+        for top in range(0, chart.height, TILE_HEIGHT):
+            height = min(TILE_HEIGHT, chart.height - top)
+            # 一行分块拼接成整行像素
+            tiles = []
+            for left in range(0, chart.width, TILE_WIDTH):
+                width = min(TILE_WIDTH, chart.width - left)
+                image = render_tile(chart, QRect(left, top, width, height),
+                                    background)
+                bits = image.constBits()
+                bits.setsize(image.byteCount())
+                tiles.append((bytes(bits), image.bytesPerLine(), width * 4))
+            writer.write_rows(
+                    b''.join(data[row * line:row * line + size]
+                             for data, line, size in tiles)
+                    for row in range(height))
+    finally:
+        writer.close()
+
+
+def export_vector(chart, path, background):
+    """Draws chart into SVG or PDF file path (by extension)"""
+    if path.lower().endswith('.svg'):
+        device = QSvgGenerator()
+        device.setFileName(path)
+        device.setSize(QSize(chart.width, chart.height))
+        device.setViewBox(QRect(0, 0, chart.width, chart.height))
+    else:
+        device = QPdfWriter(path)
+        device.setResolution(72)
+        device.setPageSize(QPageSize(QSizeF(chart.width, chart.height),
+                                     QPageSize.Point))
+        device.setPageMargins(QMarginsF(0, 0, 0, 0))
+    painter = QPainter(device)
+    painter.setRenderHint(QPainter.Antialiasing)
+    painter.setRenderHint(QPainter.TextAntialiasing)
+    clip = QRectF(0, 0, chart.width, chart.height)
+    if background.alpha():
+        painter.fillRect(clip, background)
+    chart.paint(painter, clip)
+    painter.end()
+
+
+def output_path(pattern, color, colors):
+    """Output file of color, '{color}' in pattern is replaced by it. The
+    name is added before the extension if several colors are exported."""
+    if '{color}' in pattern:
+        return pattern.replace('{color}', color)
+    if len(colors) > 1:
+        root, ext = os.path.splitext(pattern)
+        return "{}-{}{}".format(root, color, ext)
+    return pattern
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            description="Export the nuclide chart or the element table "
+                        "as PNG, SVG or PDF file.")
+    parser.add_argument('chart', choices=['nuclides', 'elements'])
+    parser.add_argument('output', help="output file (.png, .svg or .pdf), "
+                        "'{color}' is replaced by the color scheme")
+    parser.add_argument('--width', type=int, default=4000,
+                        help="width in pixels (default 4000)")
+    parser.add_argument('--height', type=int,
+                        help="height in pixels (default: square cells)")
+    parser.add_argument('--color', action='append',
+                        help="color scheme, may be repeated")
+    parser.add_argument('--datafile', help="database file to read")
+    parser.add_argument('--baseline', help="earlier nuclide database, "
+                        "for the 'changed' colors")
+    parser.add_argument('--background', default='white',
+                        help="background color or 'transparent'")
+    args = parser.parse_args(argv)
+
+    ext = os.path.splitext(args.output)[1].lower()
+    if ext not in ('.png', '.svg', '.pdf'):
+        parser.error("unknown output format: {}".format(args.output))
+    background = QColor(args.background)
+    if not background.isValid():
+        parser.error("unknown color: {}".format(args.background))
+
+    app = QGuiApplication(sys.argv[:1])
+    if args.chart == 'nuclides':
+        library = Nuclide.NuclideLibrary(args.datafile)
+        if args.baseline:
+            library.baseline = Nuclide.NuclideLibrary(args.baseline,
+                                                      cache=False)
+        chart = NuclideChart(library, args.width, args.height)
+    else:
+        chart = ElementChart(element.ElementLibrary(args.datafile),
+                             args.width, args.height)
+    colors = args.color or chart.colors[:1]
+    for color in colors:
+        if color not in chart.colors:
+            parser.error("unknown color scheme {} (one of {})".format(
+                    color, ", ".join(chart.colors)))
+
+    for color in colors:
+        chart.setColor(color)
+        path = output_path(args.output, color, colors)
+        if ext == '.png':
+            export_png(chart, path, background)
+        else:
+            export_vector(chart, path, background)
+        print("{0}: {1} x {2}".format(path, chart.width, chart.height))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
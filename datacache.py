@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018-01 Jimin Ma. All rights reserved.
+
+'''
+Compiled cache of the databases
+
+The parsed content of a source file (nubase12.xml, PeriodicTableJSON.json)
+is stored next to it as <source>.cache. The file holds a small header
+(format version, mtime, size and sha1 of the source) followed by the
+payload, both pickled. It is read in one go and used as long as the
+source has not changed, otherwise the caller rebuilds it from the source.
+'''
+import hashlib
+import io
+import os
+import pickle
+
+CACHE_SUFFIX = '.cache'
+
+
+def cache_path(source):
+    """Returns path of the cache file of source"""
+    return source + CACHE_SUFFIX
+
+
+def source_hash(source):
+    """Returns sha1 hex digest of the source file"""
+    sha = hashlib.sha1()
+    with open(source, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def stamp(source):
+    """Returns mtime, size and sha1 of source as dict, None if it can not
+    be read. Take it before the source is parsed and give it to write(),
+    so that a change during the parse is not stored as the old state."""
+    try:
+        stat = os.stat(source)
+        return {'mtime': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'sha1': source_hash(source)}
+    except EnvironmentError:
+        return None
+
+
+def load(source, version):
+    """Returns payload cached for source, or None if there is no cache,
+    it was written in other format version or the source was changed.
+
+    The mtime and size are checked first, the (slower) hash only when
+    they differ, so touching the source does not throw the cache away.
+    If the hash still matches the header gets the new mtime and size,
+    the hash is computed once and not on every start.
+    """
+    try:
+        stat = os.stat(source)
+        with open(cache_path(source), 'rb') as fh:
+            data = fh.read()
+    except EnvironmentError:
+        return None
+
+    try:
+        stream = io.BytesIO(data)
+        header = pickle.load(stream)
+        if header['version'] != version:
+            return None
+        touched = (header['mtime'] != stat.st_mtime_ns or
+                   header['size'] != stat.st_size)
+        if touched and header['sha1'] != source_hash(source):
+            return None
+        start = stream.tell()
+        payload = pickle.load(stream)
+        if touched:
+            # 内容未变 (touch, checkout): 更新文件头
+            header['mtime'] = stat.st_mtime_ns
+            header['size'] = stat.st_size
+            _replace(cache_path(source),
+                     pickle.dumps(header, pickle.HIGHEST_PROTOCOL),
+                     data[start:])
+        return payload
+    except (EnvironmentError, pickle.UnpicklingError, EOFError,
+            LookupError, TypeError, ValueError, AttributeError) as err:
+        print("{0}: cache error: {1}".format(cache_path(source), err))
+        return None
+
+
+def _replace(path, *chunks):
+    """Replaces file path atomically by the bytes chunks, a failure
+    (e.g. read-only directory) only means there is no cache"""
+    temp = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        with open(temp, 'wb') as fh:
+            for chunk in chunks:
+                fh.write(chunk)
+        os.replace(temp, path)
+    except EnvironmentError as err:
+        print("{0}: cache error: {1}".format(path, err))
+        try:
+            os.remove(temp)
+        except EnvironmentError:
+            pass
+
+
+def write(source, version, payload, state=None):
+    """Writes payload as cache of source. state is the stamp() of source
+    taken before it was parsed, now if it is not given. The file is
+    replaced atomically, a failure only means there is no cache."""
+    if state is None:
+        state = stamp(source)
+        if state is None:
+            print("{0}: cache error: can not read {1}"
+                  .format(cache_path(source), source))
+            return
+    header = dict(state, version=version)
+    try:
+        data = pickle.dumps(payload, pickle.HIGHEST_PROTOCOL)
+    except pickle.PicklingError as err:
+        print("{0}: cache error: {1}".format(cache_path(source), err))
+        return
+    _replace(cache_path(source),
+             pickle.dumps(header, pickle.HIGHEST_PROTOCOL), data)
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018-01 Jimin Ma. All rights reserved.
+
+'''
+Decay graph of a NuclideLibrary
+
+Every decay mode of a nuclide is mapped to its daughter (N, Z) and the
+library is turned into a graph of its rows: the daughters of row i are
+targets[offsets[i]:offsets[i + 1]], with the branching ratio (fraction)
+in weights and the mode in modes, and the same arrays are kept the other
+way round for the parents. The graph is built once per library (see
+NuclideLibrary.decay_graph) and the chain queries are remembered:
+
+    graph = library.decay_graph()
+    u238 = library.getNuclideById('238U')
+    graph.chain(u238)          # rows of the uranium series, parents first
+    graph.terminals(u238)      # [row of 206Pb]
+
+Modes without a daughter in the library (spontaneous fission, unknown
+'?' decays, daughters outside the table) end the chain. Compound modes
+like 'b-n' are part of the parent mode in the tables ('b-' = 100 includes
+'b-n' = 2), the parent branch is given the rest.
+'''
+import re
+from array import array
+from collections import deque
+
+from nuclidequery import normalize_mode
+
+# Change (dN, dZ) of the nuclide by decay mode
+MODE_SHIFTS = {'b-': (-1, 1), '2b-': (-2, 2),
+               'b+': (1, -1), 'ec': (1, -1), 'e+': (1, -1), 'ec+b+': (1, -1),
+               '2b+': (2, -2), '2ec': (2, -2),
+               'a': (-2, -2), 'p': (0, -1), '2p': (0, -2),
+               'n': (-1, 0), '2n': (-2, 0), '3n': (-3, 0),
+               'd': (-1, -1), '3h': (-2, -1), '3he': (-1, -2),
+               'b-n': (-2, 1), 'b-2n': (-3, 1), 'b-3n': (-4, 1),
+               'b-a': (-3, -1), 'b-d': (-2, 0), 'b-t': (-3, 0),
+               'b+p': (1, -2), 'b+2p': (1, -3), 'b+a': (-1, -3)}
+# Modes without a daughter nuclide
+FISSION_MODES = frozenset(['sf', 'b-sf', 'b+sf'])
+# Compound modes and the mode they are part of
+PARENT_MODES = {'b-n': 'b-', 'b-2n': 'b-', 'b-3n': 'b-', 'b-a': 'b-',
+                'b-d': 'b-', 'b-t': 'b-', 'b-sf': 'b-',
+                'b+p': 'b+', 'b+2p': 'b+', 'b+a': 'b+', 'b+sf': 'b+'}
+# Atomic number of the emitted clusters (e.g. '14c', '24ne')
+CLUSTER_Z = {'c': 6, 'n': 7, 'o': 8, 'f': 9, 'ne': 10, 'na': 11, 'mg': 12,
+             'al': 13, 'si': 14}
+_CLUSTER_RE = re.compile(r'(\d+)([a-z]+)$')
+
+
+def mode_shift(mode):
+    """Returns (dN, dZ) of normalized decay mode or None if the mode has
+    no daughter (fission, 'it', 'is', unknown)"""
+    shift = MODE_SHIFTS.get(mode)
+    if shift is None:
+        match = _CLUSTER_RE.match(mode)
+        if match is not None and match.group(2) in CLUSTER_Z:
+            Z = CLUSTER_Z[match.group(2)]
+            shift = (Z - int(match.group(1)), -Z)
+    return shift
+
+
+def ratio_of(text):
+    """Returns branching ratio (percent) of text, extrapolated ('#') and
+    approximate values included, nan if unknown"""
+    try:
+        return float(text.strip().rstrip('#').lstrip('~<>='))
+    except ValueError:
+        return float('nan')
+
+
+def branches(modes):
+    """Returns list of (mode, fraction) of list of (normalized mode,
+    ratio in percent, nan if unknown). Compound modes are taken out of
+    their parent mode. What the known ratios leave is given to the first
+    mode of unknown ratio (a single mode is the whole decay), the other
+    unknown ratios are 0. The fractions add up to 1 at most."""
+    ratios = {}
+    unknown = []
+    for mode, ratio in modes:
+        if mode in ('is', 'it'):
+            # 天然丰度与同质异能跃迁不改变基态核素
+            continue
+        if ratio != ratio:
+            unknown.append(mode)
+            ratio = 0.0
+        ratios[mode] = ratios.get(mode, 0.0) + ratio
+    if len(ratios) == 1:
+        return [(mode, 1.0) for mode in ratios]
+    for mode, parent in PARENT_MODES.items():
+        if mode in ratios:
+            # b+ 缺失时复合模式包含在 ec 中
+            if parent == 'b+' and parent not in ratios and 'ec' in ratios:
+                parent = 'ec'
+            if parent in ratios:
+                ratios[parent] = max(0.0, ratios[parent] - ratios[mode])
+    total = sum(ratios.values())
+    if unknown and total < 100.0:
+        # 未知分支比: 余下部分归于第一个非复合模式
+        first = [mode for mode in unknown if mode not in PARENT_MODES]
+        ratios[(first or unknown)[0]] += 100.0 - total
+        total = 100.0
+    scale = 1.0 / total if total > 100.0 else 0.01
+    return [(mode, ratio * scale) for mode, ratio in ratios.items()]
+
+
+class DecayGraph(object):
+    """Decay graph over the rows of a NuclideLibrary (ground states).
+    Nuclides may be given as rows or NuclideRecord views, the queries
+    return rows (use library.nuclides[row] for the nuclide)."""
+
+    def __init__(self, library):
+        table = library.nuclides
+        self.size = len(table)
+        rows = {(A - Z, Z): row
+                for row, (Z, A) in enumerate(zip(table.Z, table.A))}
+        self.offsets = array('I', [0])
+        self.targets = array('i')
+        self.weights = array('d')
+        self.modes = []             # 每条边的衰变模式
+        self.fission = array('d')   # 每个核素裂变的分支比
+
+        get = table.strings.get
+        for row in range(self.size):
+            start = table.dm_start[row]
+            modes = [(normalize_mode(get(table.dm_mode[i])),
+                      ratio_of(get(table.dm_value[i])))
+                     for i in range(start, start + table.dm_count[row])]
+            fission = 0.0
+            for mode, weight in branches(modes):
+                if mode in FISSION_MODES:
+                    fission += weight
+                    continue
+                shift = mode_shift(mode)
+                if shift is None:
+                    continue
+                Z = table.Z[row]
+                daughter = rows.get((table.A[row] - Z + shift[0],
+                                     Z + shift[1]))
+                if daughter is not None and daughter != row:
+                    self.targets.append(daughter)
+                    self.weights.append(weight)
+                    self.modes.append(mode)
+            self.fission.append(fission)
+            self.offsets.append(len(self.targets))
+
+        # Parents of each row, same layout
+        counts = [0] * (self.size + 1)
+        for target in self.targets:
+            counts[target + 1] += 1
+        for row in range(self.size):
+            counts[row + 1] += counts[row]
+        self.parentOffsets = array('I', counts)
+        self.parents = array('i', [0]) * len(self.targets)
+        self.parentEdges = array('I', [0]) * len(self.targets)
+        fill = counts[:-1]
+        for row in range(self.size):
+            for edge in range(self.offsets[row], self.offsets[row + 1]):
+                target = self.targets[edge]
+                self.parents[fill[target]] = row
+                self.parentEdges[fill[target]] = edge
+                fill[target] += 1
+
+        self._chains = {}
+        self._ancestors = {}
+        self._terminals = {}
+
+    @staticmethod
+    def _row(nuclide):
+        return nuclide if isinstance(nuclide, int) else nuclide.row
+
+    def daughters(self, nuclide):
+        """Returns list of (row, fraction, mode) of the daughters"""
+        row = self._row(nuclide)
+        return [(self.targets[edge], self.weights[edge], self.modes[edge])
+                for edge in range(self.offsets[row], self.offsets[row + 1])]
+
+    def parentsOf(self, nuclide):
+        """Returns list of (row, fraction, mode) of the parents"""
+        row = self._row(nuclide)
+        result = []
+        for i in range(self.parentOffsets[row], self.parentOffsets[row + 1]):
+            edge = self.parentEdges[i]
+            result.append((self.parents[i], self.weights[edge],
+                           self.modes[edge]))
+        return result
+
+    def isTerminal(self, nuclide):
+        """True if the nuclide has no daughter in the graph"""
+        row = self._row(nuclide)
+        return self.offsets[row] == self.offsets[row + 1]
+
+    def _reach(self, row, offsets, targets):
+        """Rows reachable from row (row first) in breadth first order"""
+        seen = {row}
+        order = [row]
+        queue = deque([row])
+        while queue:
+            current = queue.popleft()
+            for i in range(offsets[current], offsets[current + 1]):
+                target = targets[i]
+                if target not in seen:
+                    seen.add(target)
+                    order.append(target)
+                    queue.append(target)
+        return order
+
+    def chain(self, nuclide):
+        """Returns tuple of rows of the decay chain of nuclide with all
+        branches, ordered so that every parent comes before its
+        daughters (the nuclide is first)"""
+        row = self._row(nuclide)
+        chain = self._chains.get(row)
+        if chain is None:
+            members = self._reach(row, self.offsets, self.targets)
+            inside = set(members)
+            # 拓扑排序: 父核在子核之前
+            pending = {member: 0 for member in members}
+            for member in members:
+                for i in range(self.offsets[member],
+                               self.offsets[member + 1]):
+                    pending[self.targets[i]] += 1
+            pending[row] = 0
+            ready = deque([row])
+            order = []
+            while ready:
+                current = ready.popleft()
+                order.append(current)
+                for i in range(self.offsets[current],
+                               self.offsets[current + 1]):
+                    target = self.targets[i]
+                    pending[target] -= 1
+                    if pending[target] == 0:
+                        ready.append(target)
+            if len(order) < len(inside):
+                # 数据中有循环时按广度优先顺序
+                order = members
+            chain = self._chains[row] = tuple(order)
+        return chain
+
+    def ancestors(self, nuclide):
+        """Returns tuple of rows of all nuclides decaying (through any
+        branch) into nuclide, nearest first"""
+        row = self._row(nuclide)
+        ancestors = self._ancestors.get(row)
+        if ancestors is None:
+            ancestors = self._ancestors[row] = tuple(
+                    self._reach(row, self.parentOffsets, self.parents)[1:])
+        return ancestors
+
+    def terminals(self, nuclide):
+        """Returns tuple of rows where the chain of nuclide ends (stable
+        nuclides, or nuclides whose daughters are not known)"""
+        row = self._row(nuclide)
+        terminals = self._terminals.get(row)
+        if terminals is None:
+            terminals = self._terminals[row] = tuple(
+                    member for member in self.chain(row)
+                    if self.isTerminal(member))
+        return terminals
+
+    def edges(self, nuclide):
+        """Returns list of (parent, daughter, fraction) of the chain of
+        nuclide, parents in chain order"""
+        return [(parent, daughter, weight)
+                for parent in self.chain(nuclide)
+                for daughter, weight, _ in self.daughters(parent)]
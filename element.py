@@ -5,9 +5,11 @@ Basic element class
 '''
 import os
 import json
-import Nuclide
+import datacache
 
-from PyQt5.QtCore import QFile, QIODevice
+# Elements table in JSON format shipped with this module
+DEFAULT_DATAFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'PeriodicTableJSON.json')
 
 class Element(object):
 
@@ -61,6 +63,8 @@ class Element(object):
                 self.number = data[key]
             elif key == "phase":
                 self.phase = data[key]
+            elif key == "category":
+                self.category = data[key]
             elif key == "xpos":
                 self.xpos = data[key]
             elif key == "ypos":
@@ -84,23 +88,50 @@ class ElementLibrary(object):
     """A ElementLibrary holds a set of Element objects.
 
     The elements are held in an order based on Z.
-    The library should be made through this class's load() method.
+    The datafile (JSON, default DEFAULT_DATAFILE) is loaded on the first
+    access to the elements.
     """
 
-    def __init__(self, parent=None):
-        self.elements = []
+    # Version of the compiled cache of the JSON file
+    CACHE_VERSION = 1
+
+    def __init__(self, datafile=None, parent=None):
+        self.datafile = DEFAULT_DATAFILE if datafile is None else datafile
+        self._loaded = False
+        self._elements = []
+        # Lookup tables, filled by addElement()
+        self._by_z = {}
+        self._by_symbol = {}
+        self._by_name = {}
+        self._by_pos = {}
+
+    def _load(self):
+        """Loads datafile on first call"""
+        if self._loaded:
+            return
+        self._loaded = True
 
-        fh = open('PeriodicTableJSON.json', 'r')
-        data = json.load(fh)
+        list = datacache.load(self.datafile, self.CACHE_VERSION)
+        if list is None:
+            state = datacache.stamp(self.datafile)
+            with open(self.datafile, 'r') as fh:
+                data = json.load(fh)
+            list = data["elements"]
+            datacache.write(self.datafile, self.CACHE_VERSION, list, state)
 
         # Parse the JSON file
-        list = data["elements"]
         # 遍历元素列表
         for item in list:
             # 处理每一个元素字典
             element = Element(item["number"])
             element.readInfoFromDict(item)
-            self.elements.append(element)
+            self.addElement(element)
+
+    @property
+    def elements(self):
+        """List of elements, the datafile is loaded on first use"""
+        self._load()
+        return self._elements
 
     # 特殊方法：循环迭代时用到
     def __iter__(self):
@@ -110,25 +141,41 @@ class ElementLibrary(object):
     def __getitem__(self, k):
         return self.elements[k]
 
+    def addElement(self, element):
+        """Adds element to the library and to the lookup tables"""
+        self._load()
+        self._elements.append(element)
+        self._by_z[element.Z] = element
+        self._by_symbol[element.symbol] = element
+        self._by_name[element.name.lower()] = element
+        self._by_pos[(element.xpos, element.ypos)] = element
+
     # 按照网格位置返回元素
     def getElement(self, xpos, ypos):
-        for i in range(len(self.elements)):
-            element = self.elements[i]
-            if element.xpos == xpos and element.ypos == ypos:
-                return element
+        self._load()
+        return self._by_pos.get((xpos, ypos))
 
     def getElementByZ(self, Z):
-        for i in range(len(self.elements)):
-            element = self.elements[i]
-            if element.Z == Z:
-                return element
+        self._load()
+        return self._by_z.get(Z)
+
+    def getElementBySymbol(self, symbol):
+        self._load()
+        return self._by_symbol.get(symbol)
+
+    def getElementByName(self, name):
+        """Element name is case insensitive"""
+        self._load()
+        return self._by_name.get(name.lower())
 
     # --- 从核素库中获得同位素信息 ---
-    def loadElementIsotopes(self, nuclides=Nuclide.NuclideLibrary):
+    def loadElementIsotopes(self, nuclides=None):
+        """Attaches isotopes to the elements in one pass over nuclides
+        (NuclideLibrary or any iterable of Nuclide objects)"""
         if nuclides is None:
             return
-        for i, nuclide in enumerate(nuclides):
-            element = self.getElementByZ(nuclide.Z)
+        self._load()
+        for nuclide in nuclides:
+            element = self._by_z.get(nuclide.Z)
             if element is not None:
                 element.isotopes.append(nuclide)
-
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018-01 Jimin Ma. All rights reserved.
+
+'''
+Rendering of the periodic table of elements
+
+The table is a grid of COLUMNS x ROWS cells, element cell (x, y) is given
+by Element.pos(). Each cell has a colored box with the symbol and a darker
+strip with Z below it.
+'''
+from PyQt5.QtCore import Qt, QRectF
+from PyQt5.QtGui import QColor, QFont
+
+COLUMNS, ROWS = 18, 11
+
+
+def phase_color(element):
+    """Cell color of element by phase at room temperature"""
+    phase = getattr(element, 'phase', None)
+    if phase == "Solid":
+        return QColor(Qt.blue).lighter(180)
+    elif phase == "Gas":
+        return QColor(Qt.cyan).lighter(180)
+    elif phase == "Liquid":
+        return QColor(Qt.magenta).lighter(180)
+    return QColor(Qt.lightGray)
+
+
+CATEGORY_COLORS = {'alkali metal': '#ff9d9d',
+                   'alkaline earth metal': '#ffdead',
+                   'transition metal': '#ffc0c0',
+                   'post-transition metal': '#cccccc',
+                   'metalloid': '#cccc99',
+                   'polyatomic nonmetal': '#a0ffa0',
+                   'diatomic nonmetal': '#a0ffa0',
+                   'noble gas': '#c0ffff',
+                   'lanthanide': '#ffbfff',
+                   'actinide': '#ff99cc'}
+
+
+def category_color(element):
+    """Cell color of element by category (predicted categories are grey)"""
+    return QColor(CATEGORY_COLORS.get(getattr(element, 'category', ''),
+                                      '#e8e8e8'))
+
+
+# Ways to color the element cells
+COLOR_BY = {'phase': phase_color,
+            'category': category_color}
+
+
+def cell_fonts(cell_height=None):
+    """Returns fonts (symbol, Z) of the cells. The default is the fixed
+    size of the GridWidget, with cell_height (pixels) they are scaled."""
+    symbolFont = QFont("Courier New", 15)
+    symbolFont.setWeight(QFont.Bold)
+    zFont = QFont("Courier New", 10)
+    zFont.setWeight(QFont.Bold)
+    if cell_height is not None:
+        symbolFont.setPixelSize(max(1, int(cell_height * 0.2)))
+        zFont.setPixelSize(max(1, int(cell_height * 0.13)))
+    return symbolFont, zFont
+
+
+def paint_cell(painter, element, xOffset, yOffset, color, fonts):
+    """Paints cell of element with color, fonts are (symbol, Z) fonts"""
+    x, y = element.pos()
+    rect = (QRectF(x * xOffset, y * yOffset,
+                   xOffset, yOffset * 0.7).adjusted(0.5, 0.5, -0.5, -0.5))
+    painter.setBrush(color)
+    painter.setPen(Qt.NoPen)
+    painter.drawRect(rect)
+    # 写文本
+    painter.setFont(fonts[0])
+    painter.setPen(Qt.black)
+    painter.drawText(rect, Qt.AlignCenter, "{}".format(element.symbol))
+    # 写元素的Z值
+    painter.setBrush(color.darker(150))
+    painter.setPen(Qt.NoPen)
+    rect = (QRectF(x * xOffset, (y+0.7) * yOffset,
+                   xOffset, 0.3 * yOffset).adjusted(0.5, 0.5, -0.5, -0.5))
+    painter.drawRect(rect)
+    painter.setPen(Qt.black)
+    painter.setFont(fonts[1])
+    painter.drawText(rect, Qt.AlignCenter, "{}".format(element.Z))
+
+
+def paint_table(painter, elements, cell_width, cell_height, clip,
+                color_by='phase', fonts=None):
+    """Paints the element cells intersecting clip (QRectF in pixels)"""
+    color_of = COLOR_BY[color_by]
+    if fonts is None:
+        fonts = cell_fonts(cell_height)
+    for element in elements:
+        x, y = element.pos()
+        if clip.intersects(QRectF(x * cell_width, y * cell_height,
+                                  cell_width, cell_height)):
+            paint_cell(painter, element, cell_width, cell_height,
+                       color_of(element), fonts)
+
+
+def table_size(cell_width, cell_height):
+    """Returns size (width, height) of the table in pixels"""
+    return COLUMNS * cell_width, ROWS * cell_height
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018-01 Jimin Ma. All rights reserved.
+
+'''
+Binding, separation and decay energies of a NuclideLibrary
+
+NuclideEnergies computes from the mass excesses of the library, once for
+all nuclides, the binding energy B = Z*Delta(1H) + N*Delta(n) - Delta,
+B/A, the separation energies
+
+    S_n  = Delta(N-1, Z) + Delta(n) - Delta(N, Z)
+    S_p  = Delta(N, Z-1) + Delta(1H) - Delta(N, Z)
+    S_2n = Delta(N-2, Z) + 2 Delta(n) - Delta(N, Z)
+    S_2p = Delta(N, Z-2) + 2 Delta(1H) - Delta(N, Z)
+
+and the Q-value of every decay mode entry of the table,
+
+    Q = Delta(parent) - Delta(daughter) - Delta(emitted) - 2 m_e c^2 * positrons
+
+All energies are in keV and stored as EnergyColumns (value, uncertainty,
+unknown, extrapolated) aligned with the library rows, the Q-values with
+the decay mode entries of the table (see NuclideTable.dm_start). The
+uncertainties are added in quadrature (correlations are left out). A value
+is extrapolated if one of its masses is; use the extrapolated mask to
+keep the measured values only.
+
+    energies = library.energies()
+    energies.separation_n.value[nuclide.row]
+    energies.of(nuclide)                  # dict of the energies of nuclide
+    energies.q_value(nuclide, 'a')        # (value, uncertainty)
+'''
+import math
+from array import array
+from collections import namedtuple
+
+import decaychain
+import Nuclide
+from nuclidequery import normalize_mode
+
+# Energy column aligned with the library rows (or decay mode entries),
+# value and uncertainty in keV (nan if unknown), masks array('B') of 0/1
+EnergyColumns = namedtuple('EnergyColumns',
+                           'value uncertainty unknown extrapolated')
+
+# Electron mass (keV), 2 m_e c^2 are taken by each positron emission
+ELECTRON_MASS = 510.9989461
+
+# Beta part of the decay modes: (mode prefix, positrons, (dN, dZ)); the
+# rest of the mode is the emitted particle
+_BETA_PREFIXES = (('2b-', 0, (-2, 2)), ('2b+', 2, (2, -2)),
+                  ('2ec', 0, (2, -2)), ('ec+b+', 0, (1, -1)),
+                  ('b-', 0, (-1, 1)), ('b+', 1, (1, -1)),
+                  ('e+', 1, (1, -1)), ('ec', 0, (1, -1)))
+
+# Names of the row columns, see of()
+COLUMNS = ('binding', 'binding_per_nucleon', 'separation_n', 'separation_p',
+           'separation_2n', 'separation_2p')
+
+
+def split_mode(mode):
+    """Returns (shift (dN, dZ), positrons, (N, Z) of the emitted particle)
+    of normalized decay mode, or None if the mode has no daughter"""
+    shift = decaychain.mode_shift(mode)
+    if shift is None:
+        return None
+    positrons, (dN, dZ) = 0, (0, 0)
+    for prefix, count, beta in _BETA_PREFIXES:
+        if mode.startswith(prefix):
+            positrons, (dN, dZ) = count, beta
+            break
+    # 发射粒子 = 总变化 - beta 变化
+    return shift, positrons, (dN - shift[0], dZ - shift[1])
+
+
+class NuclideEnergies(object):
+    """Energies of all nuclides of a NuclideLibrary, see the module"""
+
+    def __init__(self, library):
+        table = library.nuclides
+        masses = library.mass_excesses()
+        self.size = len(table)
+        self.rows = {(A - Z, Z): row
+                     for row, (Z, A) in enumerate(zip(table.Z, table.A))}
+        self._masses = masses
+        neutron = (Nuclide.NEUTRON_MASS_EXCESS, 0.0, False)
+        hydrogen = (Nuclide.HYDROGEN_MASS_EXCESS, 0.0, False)
+
+        self.binding = self._combine(self.size, lambda row: [
+                (table.Z[row], hydrogen),
+                (table.A[row] - table.Z[row], neutron),
+                (-1, self._mass(row))])
+        self.binding_per_nucleon = EnergyColumns(
+                array('d', [value / max(A, 1) for value, A in
+                            zip(self.binding.value, table.A)]),
+                array('d', [error / max(A, 1) for error, A in
+                            zip(self.binding.uncertainty, table.A)]),
+                self.binding.unknown, self.binding.extrapolated)
+        self.separation_n = self._separation(table, 1, 0, neutron)
+        self.separation_p = self._separation(table, 0, 1, hydrogen)
+        self.separation_2n = self._separation(table, 2, 0, neutron)
+        self.separation_2p = self._separation(table, 0, 2, hydrogen)
+        self.q_values = self._q_values(table, neutron, hydrogen)
+
+    def _mass(self, row):
+        """(value, uncertainty, extrapolated) of mass excess of row, None
+        if there is no such nuclide"""
+        if row is None:
+            return None
+        masses = self._masses
+        return (masses.value[row], masses.uncertainty[row],
+                masses.extrapolated[row])
+
+    def _massAt(self, N, Z):
+        return self._mass(self.rows.get((N, Z)))
+
+    @staticmethod
+    def _combine(size, terms_of):
+        """Column of size rows, row is the sum of factor * mass of
+        terms_of(row), a list of (factor, (value, uncertainty,
+        extrapolated) or None)"""
+        nan = float('nan')
+        value = array('d', [nan]) * size
+        uncertainty = array('d', [nan]) * size
+        unknown = array('B', [1]) * size
+        extrapolated = array('B', [0]) * size
+        for row in range(size):
+            terms = terms_of(row)
+            if any(term is None for _, term in terms):
+                continue
+            total = sum(factor * term[0] for factor, term in terms)
+            if total != total:
+                continue
+            value[row] = total
+            uncertainty[row] = math.sqrt(sum((factor * term[1]) ** 2
+                                             for factor, term in terms))
+            unknown[row] = 0
+            extrapolated[row] = any(term[2] for _, term in terms)
+        return EnergyColumns(value, uncertainty, unknown, extrapolated)
+
+    def _separation(self, table, n, z, particle):
+        """Separation energy of n neutrons or z protons"""
+        count = n + z
+        def terms(row):
+            Z = table.Z[row]
+            N = table.A[row] - Z
+            return [(1, self._massAt(N - n, Z - z)),
+                    (count, particle),
+                    (-1, self._mass(row))]
+        return self._combine(self.size, terms)
+
+    def _q_values(self, table, neutron, hydrogen):
+        """Q-values of the decay mode entries of table"""
+        get = table.strings.get
+        size = len(table.dm_mode)
+        # 每个衰变模式条目所属的核素
+        parents = array('i', [-1]) * size
+        for row in range(self.size):
+            start = table.dm_start[row]
+            for i in range(start, start + table.dm_count[row]):
+                parents[i] = row
+        modes = [split_mode(normalize_mode(get(mode)))
+                 for mode in table.dm_mode]
+
+        def terms(i):
+            row = parents[i]
+            if row < 0 or modes[i] is None:
+                return [(1, None)]
+            shift, positrons, (eN, eZ) = modes[i]
+            Z = table.Z[row]
+            N = table.A[row] - Z
+            result = [(1, self._mass(row)),
+                      (-1, self._massAt(N + shift[0], Z + shift[1])),
+                      (-2 * positrons, (ELECTRON_MASS, 0.0, False))]
+            if (eN, eZ) == (0, 0):
+                pass
+            elif eZ == 0:
+                result.append((-eN, neutron))
+            elif eN == 0:
+                result.append((-eZ, hydrogen))
+            else:
+                result.append((-1, self._massAt(eN, eZ)))
+            return result
+
+        return self._combine(size, terms)
+
+    def of(self, nuclide):
+        """Returns dict of the energies (value, uncertainty) of nuclide
+        (row or NuclideRecord) by name of COLUMNS, None if unknown"""
+        row = nuclide if isinstance(nuclide, int) else nuclide.row
+        result = {}
+        for name in COLUMNS:
+            column = getattr(self, name)
+            result[name] = (None if column.unknown[row] else
+                            (column.value[row], column.uncertainty[row]))
+        return result
+
+    def q_value(self, nuclide, mode):
+        """Returns (value, uncertainty) of Q of decay mode of nuclide
+        (NuclideRecord), None if unknown or if it has no such mode"""
+        table = nuclide._table
+        start = table.dm_start[nuclide.row]
+        mode = normalize_mode(mode)
+        for i in range(start, start + table.dm_count[nuclide.row]):
+            if normalize_mode(table.strings.get(table.dm_mode[i])) == mode:
+                if self.q_values.unknown[i]:
+                    return None
+                return (self.q_values.value[i], self.q_values.uncertainty[i])
+        return None
+
+    def grid(self, name, n_size, z_size, measured=False):
+        """Returns array('d') of column name on a n_size x z_size grid,
+        cell z * n_size + n, nan where unknown (or extrapolated if
+        measured is True), for plotting"""
+        column = getattr(self, name)
+        grid = array('d', [float('nan')]) * (n_size * z_size)
+        for (N, Z), row in self.rows.items():
+            if 0 <= N < n_size and 0 <= Z < z_size and \
+                    not (measured and column.extrapolated[row]):
+                grid[Z * n_size + N] = column.value[row]
+        return grid
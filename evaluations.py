@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018-01 Jimin Ma. All rights reserved.
+
+'''
+Several evaluations of the nuclides side by side
+
+EvaluationStore holds the NuclideLibrary of several evaluations (e.g.
+Nubase2012, 2016 and 2020) by name. The states of all of them are put on
+one key space, the sorted union of their (N, Z, isomer) keys (isomer 0
+is the ground state, isomers are matched by their order). The key space
+is shared by all evaluations: keys, N, Z and isomer, and per evaluation
+the table row and isomer entry of every key (-1 where the evaluation has
+no such state). The compared quantities are gathered once per evaluation
+onto the key space, so a diff is one pass over aligned columns:
+
+    store = EvaluationStore([('2012', Nuclide.NuclideLibrary()),
+                             ('2020', Nuclide.NuclideLibrary('nubase_4.mas20'))])
+    diff = store.diff('2012', '2020')
+    diff.added, diff.removed             # key indices, store.keys[i]
+    diff.changed['half_life']            # key indices
+    diff.significance['mass'][i]         # |change| / combined uncertainty
+
+The quantities (QUANTITIES) are the mass excess (keV, ground state plus
+excitation energy for isomers), the half-life (s) and the decay modes
+(modes and branching ratios). A state changed if a value differs or
+became known or unknown. The significance is |new - old| divided by the
+uncertainties added in quadrature, inf without uncertainty (zero or not
+given), nan where a value is unknown; the decay modes have none.
+'''
+import math
+from array import array
+from collections import namedtuple
+
+import decaychain
+import Nuclide
+from nuclidequery import normalize_mode
+
+# Compared quantities of the states, aligned with the store keys: value
+# and uncertainty array('d') (nan if unknown), decay_modes is a list of
+# tuples of (mode, branching ratio or None)
+EvaluationColumns = namedtuple('EvaluationColumns',
+                               'mass mass_uncertainty half_life '
+                               'half_life_uncertainty decay_modes')
+# Quantity name -> (value column, uncertainty column or None)
+QUANTITIES = {'mass': ('mass', 'mass_uncertainty'),
+              'half_life': ('half_life', 'half_life_uncertainty'),
+              'decay_modes': ('decay_modes', None)}
+
+# Result of EvaluationStore.diff; added, removed and changed (dict by
+# quantity) are array('I') of key indices, significance a dict by
+# quantity of array('d') over all keys (nan where not in both)
+EvaluationDiff = namedtuple('EvaluationDiff',
+                            'old new added removed changed significance')
+
+# Change of a nuclide, see EvaluationStore.changes
+UNCHANGED, WITHIN_UNCERTAINTY, CHANGED, NEW = 0, 1, 2, 3
+
+
+def _number(text):
+    """Returns text as float, nan if it is not a number"""
+    try:
+        return float(text)
+    except (ValueError, TypeError):
+        return float('nan')
+
+
+def _signature(table, start, count):
+    """Returns decay modes of entries start.. of table as sorted tuple
+    of (normalized mode, ratio rounded to 6 digits or None)"""
+    get = table.strings.get
+    modes = []
+    for i in range(start, start + count):
+        ratio = decaychain.ratio_of(get(table.dm_value[i]))
+        modes.append((normalize_mode(get(table.dm_mode[i])),
+                      None if ratio != ratio else float('%.6g' % ratio)))
+    return tuple(sorted(modes, key=lambda mode: (mode[0], mode[1] or 0.0)))
+
+
+class EvaluationStore(object):
+    """Evaluations (NuclideLibrary) by name on a common key space"""
+
+    def __init__(self, evaluations=()):
+        self.libraries = {}
+        self.names = []
+        self.keys = []              # (N, Z, isomer), 按 Z, N, isomer 排序
+        self.index = {}             # key -> key index
+        self.N = array('H')
+        self.Z = array('H')
+        self.isomer = array('B')
+        self.rows = {}              # name -> array('i') 每个 key 的表格行
+        self.entries = {}           # name -> array('i') 每个 key 的同质异能态
+        self._columns = {}
+        for name, library in evaluations:
+            self.add(name, library)
+
+    def __getitem__(self, name):
+        return self.libraries[name]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, name, library):
+        """Adds (or replaces) evaluation name, the key space is built
+        again"""
+        if name not in self.libraries:
+            self.names.append(name)
+        self.libraries[name] = library
+        self._align()
+
+    @staticmethod
+    def _states(table):
+        """Returns dict (N, Z, isomer) -> (row, isomer entry or -1) of
+        the states of table"""
+        states = {}
+        for row in range(len(table)):
+            Z = table.Z[row]
+            N = table.A[row] - Z
+            states[(N, Z, 0)] = (row, -1)
+            start = table.iso_start[row]
+            for k in range(table.iso_count[row]):
+                states[(N, Z, k + 1)] = (row, start + k)
+        return states
+
+    def _align(self):
+        """Builds the key space and the rows of the evaluations"""
+        states = {}
+        for name, library in self.libraries.items():
+            table = library.nuclides
+            table.load_all()
+            states[name] = self._states(table)
+        keys = set()
+        for found in states.values():
+            keys.update(found)
+        self.keys = sorted(keys, key=lambda key: (key[1], key[0], key[2]))
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.N = array('H', [key[0] for key in self.keys])
+        self.Z = array('H', [key[1] for key in self.keys])
+        self.isomer = array('B', [key[2] for key in self.keys])
+        for name, found in states.items():
+            rows = array('i', [-1]) * len(self.keys)
+            entries = array('i', [-1]) * len(self.keys)
+            for key, (row, entry) in found.items():
+                i = self.index[key]
+                rows[i] = row
+                entries[i] = entry
+            self.rows[name] = rows
+            self.entries[name] = entries
+        self._columns.clear()
+
+    def key_index(self, N, Z, isomer=0):
+        """Returns key index of state (N, Z, isomer) or None"""
+        return self.index.get((N, Z, isomer))
+
+    def record(self, name, i):
+        """Returns NuclideRecord of key i in evaluation name (the ground
+        state for isomers), None if it has no such state"""
+        row = self.rows[name][i]
+        return None if row < 0 else self.libraries[name].nuclides[row]
+
+    def columns(self, name):
+        """Returns EvaluationColumns of evaluation name"""
+        columns = self._columns.get(name)
+        if columns is None:
+            columns = self._columns[name] = self._build_columns(name)
+        return columns
+
+    def _build_columns(self, name):
+        library = self.libraries[name]
+        table = library.nuclides
+        get = table.strings.get
+        masses = library.mass_excesses()
+        half_lives = library.half_lives()
+        nan, inf = float('nan'), float('inf')
+        size = len(self.keys)
+        mass = array('d', [nan]) * size
+        mass_error = array('d', [nan]) * size
+        seconds = array('d', [nan]) * size
+        seconds_error = array('d', [nan]) * size
+        decay_modes = [None] * size
+
+        for i, (row, entry) in enumerate(zip(self.rows[name],
+                                             self.entries[name])):
+            if row < 0:
+                continue
+            if entry < 0:
+                mass[i] = masses.value[row]
+                mass_error[i] = masses.uncertainty[row]
+                seconds[i] = half_lives.seconds[row]
+                seconds_error[i] = half_lives.uncertainty[row]
+                decay_modes[i] = _signature(table, table.dm_start[row],
+                                            table.dm_count[row])
+                continue
+            # 同质异能态: 基态质量 + 激发能
+            mass[i] = masses.value[row] + table.iso_energy_num[entry]
+            mass_error[i] = math.hypot(masses.uncertainty[row],
+                                       _number(get(table.iso_unc[entry])))
+            value = get(table.iso_hl_value[entry])
+            if value == 'stable':
+                seconds[i] = inf
+            else:
+                factor = Nuclide.Nuclide.time_unit_factor(
+                        get(table.iso_hl_unit[entry]))
+                if factor is not None:
+                    seconds[i] = _number(value) * factor
+                    seconds_error[i] = factor * _number(
+                            get(table.iso_hl_unc[entry]))
+            decay_modes[i] = _signature(table, table.iso_dm_start[entry],
+                                        table.iso_dm_count[entry])
+        return EvaluationColumns(mass, mass_error, seconds, seconds_error,
+                                 decay_modes)
+
+    @staticmethod
+    def _compare(old, old_error, new, new_error, keys):
+        """Returns (changed key indices, significance) of the number
+        columns on keys"""
+        significance = array('d', [float('nan')]) * len(old)
+        changed = array('I')
+        for i in keys:
+            a, b = old[i], new[i]
+            if a == b:
+                significance[i] = 0.0
+                continue
+            if a != a and b != b:
+                continue
+            changed.append(i)
+            if a != a or b != b:
+                continue
+            error = math.hypot(old_error[i], new_error[i])
+            # 无不确定度 (0 或未知) 时为 inf
+            significance[i] = (abs(b - a) / error if error == error and
+                               error > 0 else float('inf'))
+        return changed, significance
+
+    def diff(self, old, new):
+        """Returns EvaluationDiff of evaluation new against old"""
+        pairs = list(zip(self.rows[old], self.rows[new]))
+        both = [i for i, (a, b) in enumerate(pairs) if a >= 0 and b >= 0]
+        added = array('I', [i for i, (a, b) in enumerate(pairs)
+                            if a < 0 <= b])
+        removed = array('I', [i for i, (a, b) in enumerate(pairs)
+                              if b < 0 <= a])
+        before, after = self.columns(old), self.columns(new)
+        changed, significance = {}, {}
+        for quantity, (value, error) in QUANTITIES.items():
+            if error is None:
+                a, b = getattr(before, value), getattr(after, value)
+                changed[quantity] = array('I', [i for i in both
+                                                if a[i] != b[i]])
+                continue
+            changed[quantity], significance[quantity] = self._compare(
+                    getattr(before, value), getattr(before, error),
+                    getattr(after, value), getattr(after, error), both)
+        return EvaluationDiff(old, new, added, removed, changed,
+                              significance)
+
+    def changes(self, old, new):
+        """Returns array('d') of the change of each nuclide (ground state,
+        by row of the table of new) against old: UNCHANGED,
+        WITHIN_UNCERTAINTY (all significances <= 1), CHANGED (more, or
+        the decay modes changed) or NEW"""
+        diff = self.diff(old, new)
+        levels = array('B', [UNCHANGED]) * len(self.keys)
+        for i in diff.added:
+            levels[i] = NEW
+        for quantity, changed in diff.changed.items():
+            significance = diff.significance.get(quantity)
+            for i in changed:
+                level = (WITHIN_UNCERTAINTY if significance is not None and
+                         significance[i] <= 1 else CHANGED)
+                levels[i] = max(levels[i], level)
+        values = array('d', [UNCHANGED]) * len(self.libraries[new].nuclides)
+        for i, row in enumerate(self.rows[new]):
+            if row >= 0 and self.isomer[i] == 0:
+                values[row] = levels[i]
+        return values
@@ -3,11 +3,13 @@
 
 import math
 
-from PyQt5.QtCore import (Qt, QSize, QRectF)
-from PyQt5.QtGui import (QPainter, QPen, QColor, QFont, QPalette)
+from PyQt5.QtCore import (Qt, QSize, QRectF, QPointF)
+from PyQt5.QtGui import (QPainter, QPen, QPalette, QPixmap)
 from PyQt5.QtWidgets import (QWidget, QSizePolicy, QApplication)
 
 import element
+import elementchart
+from elementchart import COLUMNS, ROWS, COLOR_BY
 import singlewidget
 
 BLANK, NOBLANK = range(2)
@@ -23,12 +25,15 @@ class GridWidget(QWidget):
         super(GridWidget, self).__init__(parent)
         self.setSizePolicy(QSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding))
         self.elements = elements    # 元素数据库
-        self.grid = [[BLANK] * 11 for i in range(18)]
+        self.grid = [[BLANK] * ROWS for i in range(COLUMNS)]
         for element in self.elements:
             x, y = element.pos()
             self.grid[x][y] = NOBLANK
 
         self.selected = [0, 0]
+        self.colorBy = 'phase'
+        self.cells = None   # 元素网格的缓存图像 {(x, y): QPixmap}
+        self.dlg = None     # 元素对话框, 重复使用
         self.setMinimumSize(self.minimumSizeHint())
 
     def sizeHint(self):
@@ -38,62 +43,97 @@ class GridWidget(QWidget):
     def minimumSizeHint(self):
         return QSize(900, 500)
 
+    def setColorBy(self, colorBy):
+        """Colors the cells by 'phase' or 'category' (see COLOR_BY)"""
+        if colorBy not in COLOR_BY:
+            raise ValueError("unknown color: {}".format(colorBy))
+        self.colorBy = colorBy
+        self.cells = None
+        self.update()
+
+    def resizeEvent(self, event):
+        # 尺寸变化后重新生成元素网格图像
+        self.cells = None
+
+    def renderCells(self):
+        """Renders every element cell (symbol and Z strip) into its own
+        pixmap, the pixmaps are reused until resize or color change"""
+        xOffset = self.width() / COLUMNS
+        yOffset = self.height() / ROWS
+        ratio = self.devicePixelRatioF()
+        colorOf = COLOR_BY[self.colorBy]
+        fonts = elementchart.cell_fonts()
+
+        cells = {}
+        for element in self.elements:
+            x, y = element.pos()
+            # 网格位置取整, 以免相邻的图像之间出现缝隙
+            aligned = QRectF(x * xOffset, y * yOffset,
+                             xOffset, yOffset).toAlignedRect()
+            pixmap = QPixmap(aligned.size() * ratio)
+            pixmap.setDevicePixelRatio(ratio)
+            pixmap.fill(Qt.transparent)
+            painter = QPainter(pixmap)
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setRenderHint(QPainter.TextAntialiasing)
+            painter.translate(-QPointF(aligned.topLeft()))
+            elementchart.paint_cell(painter, element, xOffset, yOffset,
+                                    colorOf(element), fonts)
+            painter.end()
+            cells[(x, y)] = (aligned, pixmap)
+        return cells
+
+    def cellRect(self, x, y):
+        """Returns the rectangle of element cell x, y with room for the
+        pen of the selection"""
+        xOffset = self.width() / COLUMNS
+        yOffset = self.height() / ROWS
+        return (QRectF(x * xOffset, y * yOffset, xOffset, yOffset)
+                .toAlignedRect().adjusted(-2, -2, 2, 2))
+
     def mousePressEvent(self, event):
         # 鼠标按下事件
-        xOffset = self.width() / 18
-        yOffset = self.height() / 11
+        xOffset = self.width() / COLUMNS
+        yOffset = self.height() / ROWS
         x = math.floor(event.x() / xOffset) + 1
         y = math.floor(event.y() / yOffset)
         if self.grid[x-1][y]:
-            self.dlg = singlewidget.SingleWidget(self.elements.getElement(x, y))
-            self.dlg.show()
-        self.update()
+            self.selectElement(self.elements.getElement(x, y))
+
+    def selectElement(self, element):
+        """Highlights the cell of element and opens its dialog"""
+        if self.dlg is None:
+            self.dlg = singlewidget.SingleWidget()
+        self.dlg.setElement(element)
+        self.dlg.show()
+        self.dlg.raise_()
+        # 只重绘原来和新选中的元素
+        old = self.selected
+        self.selected = list(element.pos())
+        self.update(self.cellRect(*old))
+        self.update(self.cellRect(*self.selected))
 
     def paintEvent(self, event=None):
+        if self.cells is None:
+            self.cells = self.renderCells()
+
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
-        painter.setRenderHint(QPainter.TextAntialiasing)
-        xOffset = self.width() / 18
-        yOffset = self.height() / 11
-
-        for element in self.elements:
-            x, y = element.pos()
-            rect = (QRectF(x * xOffset, y * yOffset,
-                           xOffset, yOffset * 0.7).adjusted(0.5, 0.5, -0.5, -0.5))
-            segColor = None
-            if element.phase == "Solid":
-                segColor = QColor(Qt.blue).lighter(180)
-            elif element.phase == "Gas":
-                segColor = QColor(Qt.cyan).lighter(180)
-            elif element.phase == "Liquid":
-                segColor = QColor(Qt.magenta).lighter(180)
-            if segColor is not None:
-                painter.setBrush(segColor)
-
-            if [x, y] == self.selected:
-                painter.setPen(QPen(Qt.blue, 3))
-            else:
-                painter.setPen(Qt.NoPen)
-            painter.drawRect(rect)
-            # 写文本
-            font = QFont("Courier New", 15)
-            font.setWeight(QFont.Bold)
-            painter.setFont(font)
-            painter.setPen(Qt.black)
-            painter.drawText(rect, Qt.AlignCenter,
-                             "{}".format(element.symbol))
-            # 写元素的Z值
-            segColor = segColor.darker(150)
-            painter.setBrush(segColor)
-            painter.setPen(Qt.NoPen)
-            rect = (QRectF(x * xOffset, (y+0.7) * yOffset,
-                           xOffset, 0.3 * yOffset).adjusted(0.5, 0.5, -0.5, -0.5))
-            painter.drawRect(rect)
-            painter.setPen(Qt.black)
-            font = QFont("Courier New", 10)
-            font.setWeight(QFont.Bold)
-            painter.setFont(font)
-            painter.drawText(rect, Qt.AlignCenter, "{}".format(element.Z))
+        xOffset = self.width() / COLUMNS
+        yOffset = self.height() / ROWS
+        clip = None if event is None else event.rect()
+
+        for rect, pixmap in self.cells.values():
+            # 只绘制需要更新的区域内的元素
+            if clip is None or clip.intersects(rect):
+                painter.drawPixmap(rect.topLeft(), pixmap)
+
+        x, y = self.selected
+        if self.grid[x][y]:
+            painter.setPen(QPen(Qt.blue, 3))
+            painter.setBrush(Qt.NoBrush)
+            painter.drawRect(QRectF(x * xOffset, y * yOffset,
+                                    xOffset, yOffset * 0.7).adjusted(0.5, 0.5, -0.5, -0.5))
 
 
 if __name__ == "__main__":
@@ -2,263 +2,420 @@
 # Copyright (c) 2018-01 Jimin Ma. All rights reserved.
 
 import math
+from collections import OrderedDict
 
-from PyQt5.QtCore import (Qt, QSize, QRectF, QPointF, QTimer, QLineF)
-from PyQt5.QtGui import (QPainter, QPen, QColor, QFont, QPalette, QPolygonF,
-                         QFontMetricsF)
-from PyQt5.QtWidgets import (QWidget, QSizePolicy, QDialog, QApplication)
+from PyQt5.QtCore import (Qt, QSize, QRectF, QPointF, QLineF, QObject,
+                          QRunnable, QThread, QThreadPool, pyqtSignal)
+from PyQt5.QtGui import (QPainter, QPen, QColor, QFont, QPalette, QPolygonF)
+from PyQt5.QtWidgets import (QWidget, QSizePolicy, QApplication)
 
 import Nuclide
 import singlewidgetNuclide
+from nuclidechart import NMAX, ZMAX, NZ_MARGIN, COLORS, LOD_LABEL
+import nuclidechart
+
+# Info box of the nuclide under the mouse
+INFO_RECT = QRectF(50, 50, 150, 150)
+# Largest zoom (1 fits the whole chart into the widget), zoom step of a
+# wheel notch
+MAX_ZOOM = 40.0
+ZOOM_STEP = 1.25
+# Size of the chart tiles (pixels) and most tiles kept
+TILE_SIZE = 256
+TILE_CACHE = 128
+
+'''
+核素数据后台加载线程
+'''
+
+class NuclideLoader(QThread):
+    """Loads a NuclideLibrary in a worker thread. The batches made by
+    NuclideLibrary.iter_table_batches are handed over to the GUI thread
+    through the (queued) batchLoaded signal, connect it to
+    MeshWidget.addNuclides."""
+
+    batchLoaded = pyqtSignal(object)
+
+    def __init__(self, nuclides, parent=None):
+        super(NuclideLoader, self).__init__(parent)
+        self.nuclides = nuclides
+        self.nuclides.begin_load()
+
+    def run(self):
+        for batch in self.nuclides.iter_table_batches():
+            self.batchLoaded.emit(batch)
+
+
+'''
+图表分块后台绘制
+'''
+
+class TileSignals(QObject):
+    """QRunnable is no QObject, the tiles are sent back through this"""
+
+    tileReady = pyqtSignal(int, object, object)
+
+
+class TileJob(QRunnable):
+    """Renders a chart tile from a ChartSnapshot in the thread pool"""
+
+    def __init__(self, signals, generation, key, snapshot, cell_width,
+                 cell_height, rect, ratio, font):
+        super(TileJob, self).__init__()
+        self.signals = signals
+        self.generation = generation
+        self.key = key
+        self.snapshot = snapshot
+        self.size = (cell_width, cell_height)
+        self.rect = rect
+        self.ratio = ratio
+        self.font = font
+
+    def run(self):
+        image = nuclidechart.render_tile(self.snapshot, self.size[0],
+                                         self.size[1], self.rect, self.ratio,
+                                         font=self.font)
+        self.signals.tileReady.emit(self.generation, self.key, image)
 
-BLANK, NOBLANK = range(2)
-NMAX, ZMAX = 180, 120
-NZ_MARGIN = 8
-MAGIC_NUMBERS_N = [2, 8, 20, 28, 50, 82, 126]
-MAGIC_NUMBERS_Z = [2, 8, 20, 28, 50, 82, 114]
-MAGIC_NUMBERS_LINE_N = [[0, 15], [0, 30], [4, 50], [6, 60], [15, 70], [30, 90],
-                        [60, 118]]
-MAGIC_NUMBERS_LINE_Z = [[0, 15], [0, 30], [6, 60], [8, 60], [25, 95], [75, 150],
-                        [120, 180]]
-# Definition of colors used for decay modes
-COLORS = { 'is': '#000000',
-           'b-': '#62aeff',
-           '2b-': '#62aeff',
-           'b+': '#ff7e75',
-           'ec': '#ff7e75',
-           '2ec': '#ff7e75',
-           'a' : '#fffe49',
-           'sf': '#5cbc57',
-           'p' : '#ffa425',
-           '2p': '#ffa425',
-           'n' : '#9fd7ff',
-           '2n': '#9fd7ff',
-           'it': '#ffffff',
-           'cluster': '#a564cc',
-           '?': '#cccccc' }
 
 '''
 元素周期表中心控件子类
 '''
 
 class MeshWidget(QWidget):
+    """Nuclide chart, zoomed with the mouse wheel and moved by dragging.
+
+    Only the visible part of the chart is painted. While the cells are too
+    small for text (zoomed out) the chart is drawn in tiles rendered by the
+    thread pool and cached, zoomed in the visible cells are painted with
+    labels directly.
+    """
 
     def __init__(self, nuclides, parent=None):
         super(MeshWidget, self).__init__(parent)
         self.setSizePolicy(QSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding))
         self.nuclides = nuclides    # 元素数据库
-        self.grid = [[BLANK] * ZMAX for i in range(NMAX)]
-        self.nuc = [[None] * ZMAX for i in range(NMAX)]
-        for i, nuclide in enumerate(self.nuclides):
-            n = nuclide.N
-            z = nuclide.Z
-            self.grid[n][z] = i+1  # NOBLANK
-            self.nuc[n][z] = nuclide
+        self.loading = False
 
         self.selected = [0, 0]
+        self.colorMode = 'decay'
+        self.colors = nuclidechart.NuclideColors(COLORS)
+        self.snapshot = None        # 绘图用的数据快照
+        self.zoom = 1.0             # 缩放倍数
+        self.pan = QPointF(0, 0)    # 窗口左上角在图表中的位置 (像素)
+        self.dragStart = None       # 拖动起点
+        self.dragPan = QPointF(0, 0)
+        self.dragging = False
+        self.tiles = OrderedDict()  # 已绘制的图表分块
+        self.pending = set()        # 正在绘制的分块
+        self.generation = 0         # 分块的版本号
+        self.tileSignals = TileSignals()
+        self.tileSignals.tileReady.connect(self.tileReady)
         self.setMinimumSize(self.minimumSizeHint())
         self.mouseX = 0
         self.mouseY = 0
         self.setMouseTracking(True)
-        self.dlg = QDialog()
+        self.dlg = None     # 核素对话框, 重复使用
+        # 信息框的字体只创建一次
+        self.infoFont = QFont("Arial", 50)
+        self.infoFont.setWeight(QFont.Bold)
+        self.infoNumberFont = QFont("Courier New", 15)
+        self.infoNumberFont.setWeight(QFont.Bold)
 
     def sizeHint(self):
         # 设置默认大小
         return QSize(1800, 1100)
 
+    def setLoading(self, loading):
+        """Shows load state on the chart while nuclides are being added"""
+        self.loading = loading
+        self.update()
+
+    def addNuclides(self, table):
+        """Adds batch of nuclides (NuclideTable) to the library and
+        draws them, called from NuclideLoader.batchLoaded"""
+        self.nuclides.extend(table)
+        self.invalidateChart()
+
+    def setColorScheme(self, colors):
+        """Colors nuclides by primary decay mode with colors, a dictionary
+        of decay mode to color name like COLORS"""
+        self.colorMode = None
+        self.colors = nuclidechart.NuclideColors(colors)
+        self.invalidateChart()
+
+    def setColorMode(self, name):
+        """Colors nuclides by name, one of nuclidechart.COLOR_MODES: a
+        decay mode scheme or a heat map of a property"""
+        if name not in nuclidechart.COLOR_MODES:
+            raise ValueError("Unknown color mode {}".format(name))
+        if name == self.colorMode:
+            return
+        self.colorMode = name
+        self.colors = nuclidechart.chart_colors(name)
+        self.invalidateChart()
+
+    def setBaseline(self, library):
+        """Compares the nuclides with library, an earlier evaluation (or
+        None), for the 'changed' color mode"""
+        self.nuclides.baseline = library
+        if self.colorMode in nuclidechart.HEAT_MAPS:
+            self.invalidateChart()
+
     def minimumSizeHint(self):
         return QSize(900, 500)
 
-    def paintEvent(self, event):
-        font = QFont(self.font())
-        font.setPointSize(font.pointSize() - 1)
-        fm = QFontMetricsF(font)
+    def resizeEvent(self, event):
+        # 尺寸变化后保持图表的相对位置
+        old = event.oldSize()
+        if old.width() > 0 and old.height() > 0:
+            self.pan = QPointF(self.pan.x() * self.width() / old.width(),
+                               self.pan.y() * self.height() / old.height())
+        self.clampPan()
+        self.invalidateTiles()
+
+    def invalidateChart(self):
+        """Chart has to be rendered again (e.g. new data or colors)"""
+        self.snapshot = None
+        self.invalidateTiles()
+
+    def invalidateTiles(self):
+        """Throws the tiles away, tiles still rendering are ignored"""
+        self.tiles.clear()
+        self.pending.clear()
+        self.generation += 1
+        self.update()
 
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.Antialiasing)
-        painter.setRenderHint(QPainter.TextAntialiasing)
-        xOffset = self.width() / (NMAX + NZ_MARGIN)
-        yOffset = self.height() / (ZMAX + NZ_MARGIN)
+    def cellSize(self):
+        """Returns width and height of a chart cell in pixels"""
+        return (self.width() / (NMAX + NZ_MARGIN) * self.zoom,
+                self.height() / (ZMAX + NZ_MARGIN) * self.zoom)
+
+    def clampPan(self):
+        width, height = nuclidechart.chart_size(*self.cellSize())
+        self.pan = QPointF(min(max(self.pan.x(), 0), width - self.width()),
+                           min(max(self.pan.y(), 0), height - self.height()))
+
+    def setZoom(self, zoom, center=None):
+        """Zooms to zoom (1 shows the whole chart) keeping chart point at
+        center (widget coordinates, default middle of the widget) fixed"""
+        zoom = min(max(zoom, 1.0), MAX_ZOOM)
+        if zoom == self.zoom:
+            return
+        if center is None:
+            center = QPointF(self.width() / 2, self.height() / 2)
+        factor = zoom / self.zoom
+        self.zoom = zoom
+        self.pan = (self.pan + center) * factor - center
+        self.clampPan()
+        self.invalidateTiles()
+
+    def wheelEvent(self, event):
+        steps = event.angleDelta().y() / 120.0
+        if steps:
+            self.setZoom(self.zoom * ZOOM_STEP ** steps, QPointF(event.pos()))
 
+    def paintEvent(self, event):
         # 若存在对话框，则不实时绘图
-        if self.dlg.isVisible():
+        if self.dlg is not None and self.dlg.isVisible():
             self.setMouseTracking(False)
         else:
             self.setMouseTracking(True)
 
-        for nuclide in self.nuclides:
-            n, z = nuclide.N, nuclide.Z
-            x, y = n + NZ_MARGIN, ZMAX - nuclide.Z - 1
-            rect = (QRectF(x * xOffset, y * yOffset,
-                           xOffset, yOffset).adjusted(0.5, 0.5, -0.5, -0.5))
-            segColor = QColor(0, 0, 0)
-            if self.grid[n][z] : #== NOBLANK:
-                segColor.setNamedColor(self.getNuclideColor(nuclide))
-            if segColor is not None:
-                painter.setBrush(segColor)
-
-            if [x, y] == self.selected:
-                painter.setPen(QPen(Qt.blue, 3))
-            else:
-                # painter.setPen(self.palette().color(QPalette.Background))
-                painter.setPen(Qt.NoPen)
-            painter.drawRect(rect)
+        if self.snapshot is None:
+            self.snapshot = nuclidechart.ChartSnapshot(self.nuclides,
+                                                       self.colors)
 
-        # Draw magic lines
-        painter.setPen(QPen(Qt.blue, 0.4))
-        for nmagic in range(len(MAGIC_NUMBERS_N)):
-            x1 = (MAGIC_NUMBERS_N[nmagic] + NZ_MARGIN) * xOffset
-            y1 = (ZMAX - MAGIC_NUMBERS_LINE_N[nmagic][0] - 1) * yOffset
-            x2 = (MAGIC_NUMBERS_N[nmagic] + 1 + NZ_MARGIN) * xOffset
-            y2 = (ZMAX - MAGIC_NUMBERS_LINE_N[nmagic][1]) * yOffset
-            painter.drawLine(QPointF(x1, y1), QPointF(x1, y2))
-            painter.drawLine(QPointF(x2, y1), QPointF(x2, y2))
-        for zmagic in range(len(MAGIC_NUMBERS_Z)):
-            x1 = (MAGIC_NUMBERS_LINE_Z[zmagic][0] + NZ_MARGIN) * xOffset
-            y1 = (ZMAX - MAGIC_NUMBERS_Z[zmagic] - 1 ) * yOffset
-            x2 = (MAGIC_NUMBERS_LINE_Z[zmagic][1] + NZ_MARGIN) * xOffset
-            y2 = (ZMAX - MAGIC_NUMBERS_Z[zmagic]) * yOffset
-            painter.drawLine(QPointF(x1, y1), QPointF(x2, y1))
-            painter.drawLine(QPointF(x1, y2), QPointF(x2, y2))
-
-        # Draw coordinate system
-        for i in range(NMAX):
-            painter.setPen(Qt.black)
-            iM = i + NZ_MARGIN
-            if i % 10 :
-                if not (i % 5):
-                    painter.drawLine((iM + 0.5) * xOffset, (ZMAX + NZ_MARGIN - 3.5) * yOffset,
-                                     (iM + 0.5) * xOffset, (ZMAX + NZ_MARGIN - 6.5) * yOffset)
-                else:
-                    painter.drawLine((iM + 0.5) * xOffset, (ZMAX + NZ_MARGIN - 3.5) * yOffset,
-                                     (iM + 0.5) * xOffset, (ZMAX + NZ_MARGIN - 5.0) * yOffset)
-            else:
-                painter.drawLine((iM + 0.5) * xOffset, (ZMAX + NZ_MARGIN - 3.5) * yOffset,
-                                 (iM + 0.5) * xOffset, (ZMAX + NZ_MARGIN - 7.5) * yOffset)
-                rect = QRectF(fm.boundingRect("999"))
-                rect.moveCenter(QPointF((iM + 0.5) * xOffset, (ZMAX + NZ_MARGIN - 1.5) * yOffset))
-                painter.drawText(rect, Qt.AlignCenter, "{}".format(i))
-
-        for i in range(ZMAX):
-            painter.setPen(Qt.black)
-            if i % 10 :
-                if not (i % 5):
-                    painter.drawLine(3.5 * xOffset, (ZMAX - i - 0.5) * yOffset,
-                                     6.5 * xOffset, (ZMAX - i - 0.5) * yOffset)
-                else:
-                    painter.drawLine(3.5 * xOffset, (ZMAX - i - 0.5) * yOffset,
-                                     5.0 * xOffset, (ZMAX - i - 0.5) * yOffset)
-            else:
-                painter.drawLine(3.5 * xOffset, (ZMAX - i - 0.5) * yOffset,
-                                 7.5 * xOffset, (ZMAX - i - 0.5) * yOffset)
-                rect = QRectF(fm.boundingRect("999"))
-                rect.moveCenter(QPointF(1.5 * xOffset, (ZMAX - i - 0.5) * yOffset))
-                painter.drawText(rect, Qt.AlignCenter, "{}".format(i))
-
-        # Draw coordinate title and arrow
-        font = QFont("Courier", 20)
-        font.setPointSize(font.pointSize() + 1)
-        fm = QFontMetricsF(font)
-        painter.setFont(font)
-        rect = QRectF(fm.boundingRect("9"))
-        rect.moveCenter(QPointF((NMAX * 0.5 + 10) * xOffset, (ZMAX + NZ_MARGIN - 10.0) * yOffset))
-        painter.drawText(rect, Qt.AlignCenter, "N")
-        rect = QRectF(fm.boundingRect("9"))
-        rect.moveCenter(QPointF(10. * xOffset, (ZMAX * 0.5) * yOffset))
-        painter.drawText(rect, Qt.AlignCenter, "Z")
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setRenderHint(QPainter.TextAntialiasing)
+        xOffset, yOffset = self.cellSize()
+        # 需要更新的区域 (图表像素)
+        clip = QRectF(event.rect()).translated(self.pan)
+
+        if min(xOffset, yOffset) >= LOD_LABEL:
+            # 放大时直接绘制可见的核素 (含文字)
+            painter.save()
+            painter.translate(-self.pan)
+            painter.setClipRect(clip)
+            nuclidechart.paint_chart(painter, self.snapshot, xOffset, yOffset,
+                                     clip, self.nuclides, self.font())
+            painter.restore()
+        else:
+            self.paintTiles(painter, clip, xOffset, yOffset)
 
+        x, y = self.selected
+        if self.hasNuclide(x, y):
+            painter.setPen(QPen(Qt.blue, 3))
+            painter.setBrush(Qt.NoBrush)
+            painter.drawRect(self.cellRectF(x, y).adjusted(0.5, 0.5, -0.5, -0.5))
 
         # Draw Zoom out Nuclide
-        # x = event.pos().x() / xOffset
-        # y = event.pos().y() / yOffset
         x, y = self.mouseX, self.mouseY
         n, z = x - NZ_MARGIN, ZMAX - y - 1
-        print("{} {} ==> {} {}".format(x, y, n, z))
-        if n >= 0 and self.grid[n][z] : # == NOBLANK:
+        nuclide = self.nuclides.getNuclide(n, z)
+        if nuclide is not None:
             painter.setPen(QPen(Qt.blue, 2))
-            rect = (QRectF(x * xOffset, y * yOffset,
-                           xOffset, yOffset).adjusted(0.5, 0.5, -0.5, -0.5))
+            painter.setBrush(Qt.NoBrush)
+            rect = self.cellRectF(x, y).adjusted(0.5, 0.5, -0.5, -0.5)
             painter.drawRect(rect)
             # 绘制元素名称
-            rect = QRectF(50, 50, 150, 150)
+            rect = QRectF(INFO_RECT)
             painter.setPen(Qt.NoPen)
             painter.setBrush(QColor(Qt.blue).lighter(170))
             painter.drawRect(rect)
             # Text for Z, name, symbol
-            font = QFont("Arial", 50)
-            font.setWeight(QFont.Bold)
-            painter.setFont(font)
+            painter.setFont(self.infoFont)
             painter.setPen(Qt.black)
-            painter.drawText(rect, Qt.AlignCenter, "{}".format(self.nuclides.getNuclide(n, z).element))
-            font = QFont("Courier New", 15)
-            font.setWeight(QFont.Bold)
-            painter.setFont(font)
+            painter.drawText(rect, Qt.AlignCenter, "{}".format(nuclide.element))
+            painter.setFont(self.infoNumberFont)
             painter.setPen(Qt.black)
             painter.drawText(rect, Qt.AlignLeft | Qt.AlignBottom, "{}".format(z))
             painter.drawText(rect, Qt.AlignLeft | Qt.AlignTop, "{}".format(
-                self.nuclides.getNuclide(n, z).A))
+                nuclide.A))
 
-        QTimer.singleShot(5000, self.update)
+        if self.loading:
+            font = QFont(self.font())
+            font.setPointSize(font.pointSize() + 4)
+            painter.setFont(font)
+            painter.setPen(Qt.black)
+            painter.drawText(self.rect(), Qt.AlignCenter,
+                             "Loading nuclides... {}".format(len(self.nuclides)))
+
+    def paintTiles(self, painter, clip, xOffset, yOffset):
+        """Draws the cached tiles inside clip (chart pixels), missing
+        tiles are queued in the thread pool and drawn when ready"""
+        ratio = self.devicePixelRatioF()
+        pool = QThreadPool.globalInstance()
+        for ty in range(int(clip.top() // TILE_SIZE),
+                        int(clip.bottom() // TILE_SIZE) + 1):
+            for tx in range(int(clip.left() // TILE_SIZE),
+                            int(clip.right() // TILE_SIZE) + 1):
+                key = (tx, ty)
+                image = self.tiles.get(key)
+                if image is not None:
+                    self.tiles.move_to_end(key)
+                    painter.drawImage(QPointF(tx * TILE_SIZE - self.pan.x(),
+                                              ty * TILE_SIZE - self.pan.y()),
+                                      image)
+                elif key not in self.pending:
+                    self.pending.add(key)
+                    rect = QRectF(tx * TILE_SIZE, ty * TILE_SIZE,
+                                  TILE_SIZE, TILE_SIZE)
+                    pool.start(TileJob(self.tileSignals, self.generation, key,
+                                       self.snapshot, xOffset, yOffset, rect,
+                                       ratio, QFont(self.font())))
+
+    def tileReady(self, generation, key, image):
+        """Stores tile rendered by TileJob and draws it"""
+        if generation != self.generation:
+            return
+        self.pending.discard(key)
+        self.tiles[key] = image
+        while len(self.tiles) > TILE_CACHE:
+            self.tiles.popitem(last=False)
+        tx, ty = key
+        self.update(QRectF(tx * TILE_SIZE - self.pan.x(),
+                           ty * TILE_SIZE - self.pan.y(),
+                           TILE_SIZE, TILE_SIZE).toAlignedRect())
+
+    def cellAt(self, pos):
+        """Returns grid cell [x, y] at widget position pos"""
+        xOffset, yOffset = self.cellSize()
+        return [math.floor((pos.x() + self.pan.x()) / xOffset),
+                math.floor((pos.y() + self.pan.y()) / yOffset)]
+
+    def cellRectF(self, x, y):
+        """Returns the widget rectangle of grid cell x, y"""
+        xOffset, yOffset = self.cellSize()
+        return QRectF(x * xOffset - self.pan.x(), y * yOffset - self.pan.y(),
+                      xOffset, yOffset)
+
+    def cellRect(self, x, y):
+        """Returns the (widget) rectangle of grid cell x, y with room for
+        the pen of the highlight"""
+        return self.cellRectF(x, y).toAlignedRect().adjusted(-2, -2, 2, 2)
+
+    def hasNuclide(self, x, y):
+        return self.nuclides.getNuclide(x - NZ_MARGIN, ZMAX - y - 1) is not None
+
+    def updateCells(self, old, new):
+        """Repaints only grid cells old and new (and the info box of the
+        hovered nuclide if one of them holds a nuclide)"""
+        self.update(self.cellRect(*old))
+        self.update(self.cellRect(*new))
+        if self.hasNuclide(*old) or self.hasNuclide(*new):
+            self.update(INFO_RECT.toAlignedRect())
 
     # 定义鼠标移动事件
     def mouseMoveEvent(self, event):
-        xOffset = self.width() / (NMAX + NZ_MARGIN)
-        yOffset = self.height() / (ZMAX + NZ_MARGIN)
-        x = math.floor(event.pos().x() / xOffset)
-        y = math.floor(event.pos().y() / yOffset)
+        if self.dragStart is not None and event.buttons() & Qt.LeftButton:
+            # 按住左键拖动图表
+            delta = QPointF(event.pos()) - self.dragStart
+            if (self.dragging or delta.manhattanLength() >=
+                    QApplication.startDragDistance()):
+                self.dragging = True
+                self.pan = self.dragPan - delta
+                self.clampPan()
+                self.update()
+                return
+        x, y = self.cellAt(event.pos())
+        # 在同一网格内移动时不重新绘图
+        if [x, y] == [self.mouseX, self.mouseY]:
+            return
+        old = (self.mouseX, self.mouseY)
         self.mouseX = x
         self.mouseY = y
-        self.update()
+        self.updateCells(old, (x, y))
 
     # 鼠标按下事件
     def mousePressEvent(self, event):
-        x, y = self.mouseX, self.mouseY
+        if event.button() == Qt.LeftButton:
+            self.dragStart = QPointF(event.pos())
+            self.dragPan = QPointF(self.pan)
+            self.dragging = False
+
+    # 鼠标释放事件, 未拖动时打开核素对话框
+    def mouseReleaseEvent(self, event):
+        dragging = self.dragging
+        self.dragStart = None
+        self.dragging = False
+        if event.button() != Qt.LeftButton or dragging:
+            return
+        x, y = self.cellAt(event.pos())
         n, z = x - NZ_MARGIN, ZMAX - y - 1
-        if self.grid[n][z]:
-            self.dlg = singlewidgetNuclide.SingleWidgetNuclide(self.nuclides.getNuclide(n, z))
-            self.dlg.show()
-            self.setMouseTracking(False)
-        self.update()
+        nuclide = self.nuclides.getNuclide(n, z)
+        if nuclide is not None:
+            self.selectNuclide(nuclide)
+
+    def selectNuclide(self, nuclide, isomer=0):
+        """Highlights the cell of nuclide, moves it into view if it is
+        outside of the widget and opens its dialog (of its isomer isomer
+        if it is not 0). Raises ValueError if nuclide has no such isomer."""
+        if not 0 <= isomer <= len(nuclide.isomers):
+            raise ValueError("{} has no isomer {}".format(nuclide, isomer))
+        x, y = nuclide.A - nuclide.Z + NZ_MARGIN, ZMAX - nuclide.Z - 1
+        rect = self.cellRectF(x, y)
+        if not QRectF(self.rect()).contains(rect):
+            # 将核素移到窗口中央
+            self.pan += rect.center() - QPointF(self.width() / 2,
+                                                self.height() / 2)
+            self.clampPan()
+            self.update()
+        old = self.selected
+        self.selected = [x, y]
+        if self.dlg is None:
+            self.dlg = singlewidgetNuclide.SingleWidgetNuclide(
+                    energies=self.nuclides.energies)
+        self.dlg.setNuclide(nuclide, isomer)
+        self.dlg.show()
+        self.dlg.raise_()
+        self.setMouseTracking(False)
+        self.updateCells(old, (x, y))
 
     def event(self, event):
         return QWidget.event(self, event)
 
-    # 按照核素主要衰变模式，确定颜色
-    def getNuclideColor(self, nuclide):
-        """ Get the primary decay mode for nuclide as color"""
-
-        # List of accepted basic decay modes, primary color is chosen on
-        # that basis. A '?' mode is for placeholders.
-        basic_decay_modes = ['is', 'a', 'b-', 'b+',
-                               'ec', 'p', '2p', 'sf',
-                               'n', '2n', '2ec', '2b-']
-        # This reg ex. matches cluster emission marked by isotopic name
-        # it matches names starting by at excatly two digits and
-        # ending with letter(s). Remember that all decay modes are lower cased!
-        # Cluster decays are only secondary or tertiary
-        cluster_re = r'[0-9]{2}([a-z]+)$'
-
-        primary_color = None
-        # First decay mode should be largest and should match one
-        # of basic decay modes
-        if nuclide.decay_modes[0]['mode'] in basic_decay_modes:
-            primary_color = COLORS[nuclide.decay_modes[0]['mode']]
-        elif nuclide.decay_modes[0]['mode'] == '?':
-            primary_color = COLORS['?']
-        else:
-            # Order of basic and secondary decay modes is not kept well in NWC data
-            # eg. sometimes B+p is given before B+
-            # We will swap two element so any basic mode comes first
-            if len(nuclide.decay_modes) > 1:
-                i = 0
-                for i in range(1, len(nuclide.decay_modes)):
-                    if nuclide.decay_modes[i]['mode'] in basic_decay_modes:
-                        nuclide.decay_modes[0], nuclide.decay_modes[i] = nuclide.decay_modes[i], nuclide.decay_modes[0]
-                        primary_color = COLORS[nuclide.decay_modes[0]['mode']]
-                        break
-
-        return primary_color
-
 
 if __name__ == "__main__":
     import sys
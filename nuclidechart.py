@@ -0,0 +1,583 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018-01 Jimin Ma. All rights reserved.
+
+'''
+Rendering of the nuclide chart
+
+The chart is a grid of (NMAX + NZ_MARGIN) x (ZMAX + NZ_MARGIN) cells, the
+margin on the left and at the bottom holds the axes. Cell (x, y) of the
+grid is nuclide N = x - NZ_MARGIN, Z = ZMAX - y - 1. paint_chart draws the
+part of the chart inside a clip rectangle, given in chart pixels (cell x, y
+starts at x * cell_width, y * cell_height), so the cost of a frame depends
+on the visible cells only.
+
+Painting reads a ChartSnapshot, an immutable copy of the cell colors, so
+tiles can be rendered in worker threads while the library is growing.
+
+Besides the primary decay mode (NuclideColors) the nuclides can be colored
+by a property (HeatMap, see HEAT_MAPS). The property is computed for the
+whole library at once and the snapshot holds it as NMAX x ZMAX image, one
+pixel per nuclide, which is drawn scaled to the cells.
+'''
+import math
+import re
+from array import array
+from functools import lru_cache
+
+from PyQt5.QtCore import Qt, QRectF, QPointF
+from PyQt5.QtGui import (QPainter, QPen, QColor, QFont, QFontMetricsF,
+                         QBrush, QImage)
+
+import evaluations
+
+
+NMAX, ZMAX = 180, 120
+NZ_MARGIN = 8
+MAGIC_NUMBERS_N = [2, 8, 20, 28, 50, 82, 126]
+MAGIC_NUMBERS_Z = [2, 8, 20, 28, 50, 82, 114]
+MAGIC_NUMBERS_LINE_N = [[0, 15], [0, 30], [4, 50], [6, 60], [15, 70], [30, 90],
+                        [60, 118]]
+MAGIC_NUMBERS_LINE_Z = [[0, 15], [0, 30], [6, 60], [8, 60], [25, 95], [75, 150],
+                        [120, 180]]
+# Definition of colors used for decay modes
+COLORS = { 'is': '#000000',
+           'b-': '#62aeff',
+           '2b-': '#62aeff',
+           'b+': '#ff7e75',
+           'ec': '#ff7e75',
+           '2ec': '#ff7e75',
+           'a' : '#fffe49',
+           'sf': '#5cbc57',
+           'p' : '#ffa425',
+           '2p': '#ffa425',
+           'n' : '#9fd7ff',
+           '2n': '#9fd7ff',
+           'it': '#ffffff',
+           'cluster': '#a564cc',
+           '?': '#cccccc' }
+# Color schemes by name (decay mode -> color name)
+COLOR_SCHEMES = {'decay': COLORS}
+# List of accepted basic decay modes, primary color is chosen on
+# that basis. A '?' mode is for placeholders.
+BASIC_DECAY_MODES = frozenset(['is', 'a', 'b-', 'b+',
+                               'ec', 'p', '2p', 'sf',
+                               'n', '2n', '2ec', '2b-'])
+# Smallest cell size (pixels) showing the label (A and symbol), the
+# half-life and the primary decay mode of the nuclide
+LOD_LABEL = 20
+LOD_HALF_LIFE = 44
+LOD_DECAY_MODE = 64
+# Color id of cells without nuclide
+EMPTY = 255
+
+
+def primary_decay_mode(modes):
+    """Returns the primary decay mode of list of (lower cased) decay
+    modes, or None if there is no basic decay mode.
+
+    First decay mode should be largest and should match one of basic
+    decay modes. Order of basic and secondary decay modes is not kept
+    well in NWC data, eg. sometimes B+p is given before B+, so the first
+    basic mode of the list is taken then."""
+    if not modes:
+        return None
+    if modes[0] == '?':
+        return '?'
+    for mode in modes:
+        if mode in BASIC_DECAY_MODES:
+            return mode
+    return None
+
+
+class NuclideColors(object):
+    """Colors of the nuclides of a NuclideTable by primary decay mode.
+
+    The colors are kept per row of the table as index into a small list
+    of QColor, update() computes only the rows added since the last call.
+    """
+
+    def __init__(self, scheme=None):
+        self.scheme = COLORS if scheme is None else scheme
+        self.reset()
+
+    def reset(self):
+        """Forgets the computed colors"""
+        self.table = []             # 颜色列表 (QColor)
+        self.ids = {}               # 颜色名称 -> 颜色序号
+        self.index = array('B')     # 每个核素 (表格行) 的颜色序号
+        self.source = None          # 颜色所属的 NuclideTable
+
+    def update(self, table):
+        """Computes the colors of the rows of table not known yet"""
+        if table is not self.source or len(self.index) > len(table):
+            self.reset()
+            self.source = table
+        for row in range(len(self.index), len(table)):
+            modes = [mode['mode'] for mode in table.decay_modes(row)]
+            name = self.scheme.get(primary_decay_mode(modes))
+            if name not in self.ids:
+                color = QColor(0, 0, 0)
+                if name is not None:
+                    color.setNamedColor(name)
+                self.ids[name] = len(self.table)
+                self.table.append(color)
+            self.index.append(self.ids[name])
+
+
+'''
+Heat maps: nuclides colored by a property
+'''
+
+# Colormaps, (position, color name) stops between 0 and 1
+COLORMAPS = {
+    'viridis': [(0.0, '#440154'), (0.25, '#3b528b'), (0.5, '#21918c'),
+                (0.75, '#5ec962'), (1.0, '#fde725')],
+    'coolwarm': [(0.0, '#3b4cc0'), (0.5, '#dddddd'), (1.0, '#b40426')],
+    'binary': [(0.0, '#5cbc57'), (1.0, '#ff7e75')],
+    # unchanged, within uncertainties, changed, new (see evaluations)
+    'changes': [(0.0, '#dddddd'), (1 / 3, '#9fd7ff'), (2 / 3, '#ff7e75'),
+                (1.0, '#5cbc57')],
+}
+# Cells with unknown value, and stable nuclides (infinite half-life)
+UNKNOWN_COLOR = '#cccccc'
+STABLE_COLOR = '#000000'
+
+_SPIN = re.compile(r'(\d+)(?:/(\d+))?')
+
+
+@lru_cache(maxsize=None)
+def colormap_lut(name, size=256):
+    """Returns list of size ARGB values (int) running through colormap"""
+    stops = [(position, QColor(color)) for position, color in COLORMAPS[name]]
+    lut = []
+    for i in range(size):
+        t = i / (size - 1)
+        for (p0, c0), (p1, c1) in zip(stops, stops[1:]):
+            if t <= p1:
+                break
+        f = (t - p0) / (p1 - p0) if p1 > p0 else 0.0
+        lut.append(QColor(int(round(c0.red() + f * (c1.red() - c0.red()))),
+                          int(round(c0.green() + f * (c1.green() - c0.green()))),
+                          int(round(c0.blue() + f * (c1.blue() - c0.blue()))))
+                   .rgba())
+    return lut
+
+
+def log_half_lives(library):
+    """log10 of half-life (s), inf for stable nuclides"""
+    return array('d', [math.log10(s) if 0 < s < math.inf else s
+                       for s in library.half_lives().seconds])
+
+
+def mass_excesses(library):
+    """Mass excess in MeV"""
+    return array('d', [v / 1000 for v in library.mass_excesses().value])
+
+
+def binding_energies(library):
+    """Binding energy per nucleon in MeV"""
+    return array('d', [v / 1000 for v in
+                       library.energies().binding_per_nucleon.value])
+
+
+def spin_parity(spin):
+    """Returns 4J + (1 if parity is -) of the first value of spin text,
+    e.g. '3/2-' -> 7, nan if there is no value"""
+    match = _SPIN.search(spin)
+    if match is None:
+        return math.nan
+    twice = int(match.group(1)) * (1 if match.group(2) else 2)
+    parity = spin[match.end():].lstrip(')#')[:1]
+    return 2 * twice + (parity == '-')
+
+
+def spin_parities(library):
+    """Ground state spin and parity, see spin_parity()"""
+    table = library.nuclides
+    table.load_all()
+    # 相同的自旋字符串只解析一次
+    values = {}
+    for spin in set(table.spin_value):
+        values[spin] = spin_parity(table.strings.get(spin))
+    return array('d', [values[spin] if flags & table.HAS_SPIN else math.nan
+                       for spin, flags in zip(table.spin_value, table.flags)])
+
+
+def isomer_counts(library):
+    """Number of isomers"""
+    table = library.nuclides
+    table.load_all()
+    return array('d', table.iso_count)
+
+
+def extrapolated(library):
+    """1 if mass, half-life or spin is extrapolated ('#'), otherwise 0"""
+    values = array('d', [0.0]) * len(library.nuclides)
+    bits = library.index().extrapolated_bits()
+    for row in range(len(values)):
+        if bits >> row & 1:
+            values[row] = 1.0
+    return values
+
+
+class _Changes(object):
+    """changes(library): change against library.baseline, an earlier
+    evaluation (see evaluations.EvaluationStore.changes), nan without
+    baseline.
+
+    The EvaluationStore of the last (baseline, library) pair and its
+    values are kept: switching the color mode costs nothing here, the
+    store is built again when the baseline changes and aligned again
+    when nuclides were added to the library."""
+
+    def __init__(self):
+        self.store = None
+        self.values = None
+        self.source = None          # 数值所属的 NuclideTable
+        self.size = 0
+
+    def __call__(self, library):
+        baseline = library.baseline
+        if baseline is None:
+            return array('d', [math.nan]) * len(library.nuclides)
+        store = self.store
+        table = library.nuclides
+        if (store is None or store['baseline'] is not baseline or
+                store['library'] is not library):
+            store = self.store = evaluations.EvaluationStore(
+                    [('baseline', baseline), ('library', library)])
+        elif table is not self.source or len(table) != self.size:
+            store.add('library', library)
+        else:
+            return self.values
+        self.values = store.changes('baseline', 'library')
+        self.source = table
+        self.size = len(table)
+        return self.values
+
+
+changes = _Changes()
+
+
+# Heat maps by name: (values of the library rows, colormap, range of the
+# colormap or None for the range of the values)
+HEAT_MAPS = {'half-life': (log_half_lives, 'viridis', None),
+             'mass-excess': (mass_excesses, 'coolwarm', None),
+             'binding-energy': (binding_energies, 'viridis', None),
+             'spin-parity': (spin_parities, 'viridis', None),
+             'isomers': (isomer_counts, 'viridis', None),
+             'extrapolated': (extrapolated, 'binary', None),
+             'changed': (changes, 'changes',
+                         (evaluations.UNCHANGED, evaluations.NEW))}
+# All ways to color the chart, decay mode schemes first
+COLOR_MODES = list(COLOR_SCHEMES) + list(HEAT_MAPS)
+
+
+class HeatMap(object):
+    """Colors of the nuclides by a property, name is one of HEAT_MAPS.
+
+    The values are kept for the library until it (or its baseline)
+    changes; image() maps them through the colormap, over the range of
+    the heat map or else of the values."""
+
+    def __init__(self, name):
+        self.name = name
+        self.compute, self.colormap, self.range = HEAT_MAPS[name]
+        self.values = None          # 每个核素 (表格行) 的数值
+        self.source = None          # 数值所属的 NuclideTable
+        self.size = 0               # 计算时表格的行数
+        self.baseline = None        # 计算时比较的评价
+
+    def update(self, library):
+        """Computes the values if the library changed"""
+        table = library.nuclides
+        if (table is not self.source or len(table) != self.size or
+                library.baseline is not self.baseline):
+            self.values = self.compute(library)
+            self.source = table
+            self.size = len(table)
+            self.baseline = library.baseline
+
+    def image(self, library, rows):
+        """Returns NMAX x ZMAX QImage, pixel (N, ZMAX - Z - 1) is the color
+        of nuclide (N, Z); rows is the table row of each cell (z * NMAX + n)
+        or -1"""
+        self.update(library)
+        values = self.values
+        if self.range is not None:
+            low, high = self.range
+        else:
+            finite = [v for v in values if v == v and abs(v) != math.inf]
+            low, high = (min(finite), max(finite)) if finite else (0.0, 1.0)
+        lut = colormap_lut(self.colormap)
+        scale = (len(lut) - 1) / (high - low) if high > low else 0.0
+        unknown = QColor(UNKNOWN_COLOR).rgba()
+        stable = QColor(STABLE_COLOR).rgba()
+
+        pixels = array('I', [0]) * (NMAX * ZMAX)
+        for z in range(ZMAX):
+            line = (ZMAX - z - 1) * NMAX
+            for n in range(NMAX):
+                row = rows[z * NMAX + n]
+                if row < 0:
+                    continue
+                value = values[row]
+                if value != value:
+                    pixels[line + n] = unknown
+                elif value == math.inf:
+                    pixels[line + n] = stable
+                else:
+                    i = int((value - low) * scale + 0.5)
+                    pixels[line + n] = lut[min(max(i, 0), len(lut) - 1)]
+        # QImage uses the buffer, copy() makes it own the pixels
+        return QImage(pixels.tobytes(), NMAX, ZMAX, NMAX * 4,
+                      QImage.Format_ARGB32).copy()
+
+
+def chart_colors(name):
+    """Returns the colors of the chart by name, one of COLOR_MODES"""
+    if name in HEAT_MAPS:
+        return HeatMap(name)
+    return NuclideColors(COLOR_SCHEMES[name])
+
+
+class ChartSnapshot(object):
+    """Color id and table row of every (N, Z) cell of the chart. A snapshot
+    is not changed after it is made, make a new one when the library or
+    the colors change.
+
+    colors is NuclideColors or HeatMap, for a heat map the cells are
+    colored by image instead of palette and cells."""
+
+    def __init__(self, library, colors):
+        table = library.nuclides
+        self.rows = array('i', [-1]) * (NMAX * ZMAX)
+        for row in range(len(table)):
+            z = table.Z[row]
+            n = table.A[row] - z
+            if 0 <= n < NMAX and 0 <= z < ZMAX:
+                self.rows[z * NMAX + n] = row
+        self.cells = bytearray([EMPTY]) * (NMAX * ZMAX)
+        if isinstance(colors, HeatMap):
+            self.palette = []
+            self.image = colors.image(library, self.rows)
+            return
+        colors.update(table)
+        self.palette = [QColor(color) for color in colors.table]
+        self.image = None
+        for cell, row in enumerate(self.rows):
+            if row >= 0:
+                self.cells[cell] = colors.index[row]
+
+    def row(self, n, z):
+        """Returns table row of cell (N, Z) or -1"""
+        if 0 <= n < NMAX and 0 <= z < ZMAX:
+            return self.rows[z * NMAX + n]
+        return -1
+
+    def color(self, n, z):
+        """Returns QColor of the nuclide in cell (N, Z)"""
+        if self.image is not None:
+            return self.image.pixelColor(n, ZMAX - z - 1)
+        return self.palette[self.cells[z * NMAX + n]]
+
+
+def chart_size(cell_width, cell_height):
+    """Returns size (width, height) of the whole chart in pixels"""
+    return ((NMAX + NZ_MARGIN) * cell_width, (ZMAX + NZ_MARGIN) * cell_height)
+
+
+def half_life_text(half_life):
+    """Short text of half-life dictionary, e.g. '704 My', '~1.4 ms'"""
+    value = half_life.get('value', '')
+    if not value or value == 'stable':
+        return value
+    relation = half_life.get('relation', '')
+    if relation == '=':
+        relation = ''
+    return "{}{} {}".format(relation, value, half_life.get('unit', '')).strip()
+
+
+def decay_mode_text(decay_modes):
+    """Short text of primary decay mode, e.g. 'b- 100%'"""
+    primary = primary_decay_mode([mode['mode'] for mode in decay_modes])
+    for mode in decay_modes:
+        if mode['mode'] == primary:
+            return "{} {}%".format(mode['mode'], mode['value'])
+    return ''
+
+
+def paint_chart(painter, snapshot, cell_width, cell_height, clip,
+                library=None, font=None, title_font=None):
+    """Paints the chart part inside clip (QRectF in chart pixels).
+
+    Cells are labelled (level of detail by cell size, see LOD_*) only if
+    library is given, it is read from the calling thread. font is used for
+    the axis numbers (the application font by default), title_font for
+    the N and Z titles (see paint_axes).
+    """
+    xOffset, yOffset = cell_width, cell_height
+    x0 = max(0, int(math.floor(clip.left() / xOffset)))
+    x1 = min(NMAX + NZ_MARGIN, int(math.ceil(clip.right() / xOffset)))
+    y0 = max(0, int(math.floor(clip.top() / yOffset)))
+    y1 = min(ZMAX + NZ_MARGIN, int(math.ceil(clip.bottom() / yOffset)))
+
+    # Heat map: the visible part of the image scaled to the cells
+    if snapshot.image is not None and x1 > NZ_MARGIN and y0 < ZMAX:
+        left, bottom = max(x0, NZ_MARGIN), min(y1, ZMAX)
+        painter.drawImage(QRectF(left * xOffset, y0 * yOffset,
+                                 (x1 - left) * xOffset, (bottom - y0) * yOffset),
+                          snapshot.image,
+                          QRectF(left - NZ_MARGIN, y0, x1 - left, bottom - y0))
+
+    # Draw nuclides of the visible cells
+    brushes = [QBrush(color) for color in snapshot.palette]
+    painter.setPen(Qt.NoPen)
+    for y in range(y0, min(y1, ZMAX)):
+        z = ZMAX - y - 1
+        base = z * NMAX - NZ_MARGIN
+        for x in range(max(x0, NZ_MARGIN), x1):
+            color = snapshot.cells[base + x]
+            if color != EMPTY:
+                painter.setBrush(brushes[color])
+                painter.drawRect(QRectF(x * xOffset, y * yOffset,
+                                        xOffset, yOffset)
+                                 .adjusted(0.5, 0.5, -0.5, -0.5))
+
+    if library is not None and min(xOffset, yOffset) >= LOD_LABEL:
+        paint_labels(painter, snapshot, library, xOffset, yOffset,
+                     (x0, x1, y0, y1))
+
+    # Draw magic lines
+    painter.setPen(QPen(Qt.blue, max(0.4, 0.05 * min(xOffset, yOffset))))
+    for nmagic in range(len(MAGIC_NUMBERS_N)):
+        x1 = (MAGIC_NUMBERS_N[nmagic] + NZ_MARGIN) * xOffset
+        y1 = (ZMAX - MAGIC_NUMBERS_LINE_N[nmagic][0] - 1) * yOffset
+        x2 = (MAGIC_NUMBERS_N[nmagic] + 1 + NZ_MARGIN) * xOffset
+        y2 = (ZMAX - MAGIC_NUMBERS_LINE_N[nmagic][1]) * yOffset
+        painter.drawLine(QPointF(x1, y1), QPointF(x1, y2))
+        painter.drawLine(QPointF(x2, y1), QPointF(x2, y2))
+    for zmagic in range(len(MAGIC_NUMBERS_Z)):
+        x1 = (MAGIC_NUMBERS_LINE_Z[zmagic][0] + NZ_MARGIN) * xOffset
+        y1 = (ZMAX - MAGIC_NUMBERS_Z[zmagic] - 1 ) * yOffset
+        x2 = (MAGIC_NUMBERS_LINE_Z[zmagic][1] + NZ_MARGIN) * xOffset
+        y2 = (ZMAX - MAGIC_NUMBERS_Z[zmagic]) * yOffset
+        painter.drawLine(QPointF(x1, y1), QPointF(x2, y1))
+        painter.drawLine(QPointF(x1, y2), QPointF(x2, y2))
+
+    paint_axes(painter, xOffset, yOffset, clip, font, title_font)
+
+
+@lru_cache(maxsize=64)
+def label_font(pixel_size):
+    """Returns the font of the cell labels of pixel_size, made once per
+    size; it is shared, do not change it"""
+    font = QFont("Arial")
+    font.setPixelSize(pixel_size)
+    return font
+
+
+def paint_labels(painter, snapshot, library, xOffset, yOffset, cells):
+    """Writes label, half-life and decay mode into the cells
+    (x0, x1, y0, y1) as far as the cell size allows"""
+    x0, x1, y0, y1 = cells
+    size = min(xOffset, yOffset)
+    lines = 1 + (size >= LOD_HALF_LIFE) + (size >= LOD_DECAY_MODE)
+    painter.setFont(label_font(max(6, int(min(yOffset / (lines + 1.5),
+                                              xOffset / 5.5)))))
+    table = library.nuclides
+    for y in range(y0, min(y1, ZMAX)):
+        z = ZMAX - y - 1
+        for x in range(max(x0, NZ_MARGIN), x1):
+            row = snapshot.row(x - NZ_MARGIN, z)
+            if row < 0:
+                continue
+            nuclide = table[row]
+            text = ["{}{}".format(nuclide.A, nuclide.element)]
+            if lines > 1:
+                text.append(half_life_text(nuclide.half_life))
+            if lines > 2:
+                text.append(decay_mode_text(nuclide.decay_modes))
+            color = snapshot.color(x - NZ_MARGIN, z)
+            painter.setPen(Qt.white if color.lightness() < 128 else Qt.black)
+            painter.drawText(QRectF(x * xOffset, y * yOffset, xOffset, yOffset),
+                             Qt.AlignCenter, "\n".join(text))
+
+
+def paint_axes(painter, xOffset, yOffset, clip, font=None, title_font=None):
+    """Draws the N and Z axes with ticks, numbers and titles. The numbers
+    are written 1 pt smaller than font, unless its size is in pixels; the
+    titles use title_font, 21 pt Courier by default."""
+    font = QFont(font if font is not None else QFont())
+    if font.pointSize() > 1:
+        font.setPointSize(font.pointSize() - 1)
+    fm = QFontMetricsF(font)
+    painter.setFont(font)
+
+    # Draw coordinate system, ticks outside of clip are left out
+    painter.setPen(Qt.black)
+    bottom = (ZMAX + NZ_MARGIN) * yOffset
+    if clip.bottom() >= bottom - 9 * yOffset:
+        first = max(0, int(clip.left() / xOffset) - NZ_MARGIN - 2)
+        last = min(NMAX, int(clip.right() / xOffset) - NZ_MARGIN + 2)
+        for i in range(first, last):
+            iM = i + NZ_MARGIN
+            if i % 10 :
+                length = 1.5 if i % 5 else 3.0
+            else:
+                length = 4.0
+                rect = QRectF(fm.boundingRect("999"))
+                rect.moveCenter(QPointF((iM + 0.5) * xOffset, (ZMAX + NZ_MARGIN - 1.5) * yOffset))
+                painter.drawText(rect, Qt.AlignCenter, "{}".format(i))
+            painter.drawLine(QPointF((iM + 0.5) * xOffset, (ZMAX + NZ_MARGIN - 3.5) * yOffset),
+                             QPointF((iM + 0.5) * xOffset, (ZMAX + NZ_MARGIN - 3.5 - length) * yOffset))
+
+    if clip.left() <= NZ_MARGIN * xOffset:
+        first = max(0, ZMAX - int(clip.bottom() / yOffset) - 2)
+        last = min(ZMAX, ZMAX - int(clip.top() / yOffset) + 2)
+        for i in range(first, last):
+            if i % 10 :
+                length = 1.5 if i % 5 else 3.0
+            else:
+                length = 4.0
+                rect = QRectF(fm.boundingRect("999"))
+                rect.moveCenter(QPointF(1.5 * xOffset, (ZMAX - i - 0.5) * yOffset))
+                painter.drawText(rect, Qt.AlignCenter, "{}".format(i))
+            painter.drawLine(QPointF(3.5 * xOffset, (ZMAX - i - 0.5) * yOffset),
+                             QPointF((3.5 + length) * xOffset, (ZMAX - i - 0.5) * yOffset))
+
+    # Draw coordinate title and arrow
+    if title_font is None:
+        font = QFont("Courier", 20)
+        font.setPointSize(font.pointSize() + 1)
+    else:
+        font = QFont(title_font)
+    fm = QFontMetricsF(font)
+    painter.setFont(font)
+    rect = QRectF(fm.boundingRect("9"))
+    rect.moveCenter(QPointF((NMAX * 0.5 + 10) * xOffset, (ZMAX + NZ_MARGIN - 10.0) * yOffset))
+    painter.drawText(rect, Qt.AlignCenter, "N")
+    rect = QRectF(fm.boundingRect("9"))
+    rect.moveCenter(QPointF(10. * xOffset, (ZMAX * 0.5) * yOffset))
+    painter.drawText(rect, Qt.AlignCenter, "Z")
+
+
+def render_tile(snapshot, cell_width, cell_height, rect, ratio=1.0,
+                library=None, font=None):
+    """Returns QImage of chart part rect (QRectF in chart pixels), with
+    device pixel ratio ratio. Safe to call from a worker thread as long
+    as library is None."""
+    image = QImage(int(math.ceil(rect.width() * ratio)),
+                   int(math.ceil(rect.height() * ratio)),
+                   QImage.Format_ARGB32_Premultiplied)
+    image.setDevicePixelRatio(ratio)
+    image.fill(Qt.transparent)
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.Antialiasing)
+    painter.setRenderHint(QPainter.TextAntialiasing)
+    painter.translate(-rect.left(), -rect.top())
+    painter.setClipRect(rect)
+    paint_chart(painter, snapshot, cell_width, cell_height, rect,
+                library, font)
+    painter.end()
+    return image
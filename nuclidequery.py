@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018-01 Jimin Ma. All rights reserved.
+
+'''
+Predicate queries over NuclideLibrary
+
+Predicates are combined with &, | and ~, e.g. beta-minus emitters with
+1 ms <= T1/2 <= 1 s and 50 <= Z <= 82:
+
+    library.query(ZRange(50, 82) & HalfLifeRange(1e-3, 1) & DecayMode('b-'))
+
+The limits of the ranges are inclusive, a limit left out (None) is no
+limit; ZRange.equals(50) is Z == 50.
+
+Predicates are answered from a NuclideIndex (sorted keys and bitsets of
+rows, built once per library) instead of a scan over the nuclides. A set
+of rows is a python int with bit i set for row i.
+'''
+from abc import ABCMeta, abstractmethod
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+def rows_to_bits(rows, size):
+    """Returns bitset (int) of rows, size is number of rows in the table"""
+    bits = bytearray((size + 7) // 8)
+    for row in rows:
+        bits[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def bits_to_rows(bits):
+    """Returns sorted list of rows set in bitset"""
+    rows = []
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    for i, byte in enumerate(data):
+        if byte:
+            for bit in range(8):
+                if byte & (1 << bit):
+                    rows.append(i * 8 + bit)
+    return rows
+
+
+def count_bits(bits):
+    """Returns number of rows in bitset"""
+    return bin(bits).count('1')
+
+
+def normalize_mode(mode):
+    """Decay modes of the tables are not consistent in case and spaces"""
+    return mode.strip().lower()
+
+
+def normalize_spin(spin):
+    """Returns spin without the marks of uncertain ('()') and
+    extrapolated ('#') values, e.g. '(3/2-)#' -> '3/2-'"""
+    return spin.replace('(', '').replace(')', '').replace('#', '').strip()
+
+
+class NuclideIndex(object):
+    """Sorted indexes and bitsets of a NuclideLibrary used by predicates.
+    The index is a snapshot, NuclideLibrary.index() gives the current one.
+    """
+
+    def __init__(self, library):
+        table = library.nuclides
+        half_lives = library.half_lives()
+        self.size = len(table)
+        self.all = (1 << self.size) - 1
+
+        # Sorted (keys, rows) of numeric properties, nan is left out
+        self._sorted = {}
+        neutrons = [A - Z for A, Z in zip(table.A, table.Z)]
+        for name, values in (('Z', table.Z), ('N', neutrons), ('A', table.A),
+                             ('half_life', half_lives.seconds)):
+            self._sorted[name] = self._sort(values)
+
+        # Bitsets of decay modes, and sorted branching ratios of each mode
+        modes = {}
+        for row in range(self.size):
+            start = table.dm_start[row]
+            for i in range(start, start + table.dm_count[row]):
+                mode = normalize_mode(table.strings.get(table.dm_mode[i]))
+                modes.setdefault(mode, []).append((row, table.dm_value_num[i]))
+        self._modes = {}
+        self._ratios = {}
+        for mode, entries in modes.items():
+            self._modes[mode] = rows_to_bits([row for row, _ in entries],
+                                             self.size)
+            self._ratios[mode] = self._sort([ratio for _, ratio in entries],
+                                            [row for row, _ in entries])
+
+        # Bitsets of (normalized) spin values
+        spins = {}
+        for row in range(self.size):
+            if table.flags[row] & table.HAS_SPIN:
+                spin = normalize_spin(table.strings.get(table.spin_value[row]))
+                spins.setdefault(spin, []).append(row)
+        self._spins = {spin: rows_to_bits(rows, self.size)
+                       for spin, rows in spins.items()}
+
+        # Bitsets of extrapolated ('#') values
+        self._extrapolated = {}
+        for name, flag in (('mass', table.MASS_EXTRAPOLATED),
+                           ('half_life', table.HALF_LIFE_EXTRAPOLATED),
+                           ('spin', table.SPIN_EXTRAPOLATED)):
+            self._extrapolated[name] = rows_to_bits(
+                    [row for row, flags in enumerate(table.flags)
+                     if flags & flag], self.size)
+
+    @staticmethod
+    def _sort(values, rows=None):
+        """Returns (keys, rows) sorted by keys, nan values are left out"""
+        if rows is None:
+            rows = range(len(values))
+        pairs = sorted((value, row) for value, row in zip(values, rows)
+                       if value == value)
+        return (array('d', [value for value, _ in pairs]),
+                array('I', [row for _, row in pairs]))
+
+    @staticmethod
+    def _range(keys, rows, low, high):
+        """Returns rows with low <= key <= high (None is no limit)"""
+        begin = 0 if low is None else bisect_left(keys, low)
+        end = len(keys) if high is None else bisect_right(keys, high)
+        return rows[begin:end]
+
+    def range_bits(self, name, low=None, high=None):
+        """Bitset of rows with low <= name <= high, name is one of
+        'Z', 'N', 'A' or 'half_life' (seconds, stable is inf)"""
+        keys, rows = self._sorted[name]
+        return rows_to_bits(self._range(keys, rows, low, high), self.size)
+
+    def mode_bits(self, mode, low=None, high=None):
+        """Bitset of rows having decay mode, with branching ratio
+        (percent) low <= ratio <= high if limits are given"""
+        mode = normalize_mode(mode)
+        if low is None and high is None:
+            return self._modes.get(mode, 0)
+        if mode not in self._ratios:
+            return 0
+        keys, rows = self._ratios[mode]
+        return rows_to_bits(self._range(keys, rows, low, high), self.size)
+
+    def spin_bits(self, spin):
+        """Bitset of rows with ground state spin (e.g. '0+')"""
+        return self._spins.get(normalize_spin(spin), 0)
+
+    def extrapolated_bits(self, name=None):
+        """Bitset of rows with extrapolated 'mass', 'half_life' or 'spin',
+        any of them if name is None"""
+        if name is None:
+            bits = 0
+            for value in self._extrapolated.values():
+                bits |= value
+            return bits
+        return self._extrapolated[name]
+
+
+class Predicate(metaclass=ABCMeta):
+    """Base class of predicates, subclasses implement bits(index)"""
+
+    @abstractmethod
+    def bits(self, index):
+        """Returns bitset of the rows of NuclideIndex index matching the
+        predicate"""
+
+    def __and__(self, other):
+        return _Combined(self, other, lambda a, b: a & b)
+
+    def __or__(self, other):
+        return _Combined(self, other, lambda a, b: a | b)
+
+    def __invert__(self):
+        return _Not(self)
+
+
+class _Combined(Predicate):
+
+    def __init__(self, left, right, operator):
+        self.left = left
+        self.right = right
+        self.operator = operator
+
+    def bits(self, index):
+        return self.operator(self.left.bits(index), self.right.bits(index))
+
+
+class _Not(Predicate):
+
+    def __init__(self, predicate):
+        self.predicate = predicate
+
+    def bits(self, index):
+        return index.all & ~self.predicate.bits(index)
+
+
+class _Range(Predicate):
+    """low <= value <= high, None is no limit"""
+
+    key = None
+
+    def __init__(self, low=None, high=None):
+        self.low = low
+        self.high = high
+
+    @classmethod
+    def equals(cls, value):
+        """Returns range of exactly value"""
+        return cls(value, value)
+
+    def bits(self, index):
+        return index.range_bits(self.key, self.low, self.high)
+
+
+class ZRange(_Range):
+    """low <= Z <= high"""
+    key = 'Z'
+
+
+class NRange(_Range):
+    """low <= N <= high"""
+    key = 'N'
+
+
+class ARange(_Range):
+    """low <= A <= high"""
+    key = 'A'
+
+
+class HalfLifeRange(_Range):
+    """low <= half-life <= high in seconds. Stable nuclides have infinite
+    half-life, unknown half-lives never match."""
+    key = 'half_life'
+
+
+class DecayMode(Predicate):
+    """Nuclide has decay mode (e.g. 'b-', 'a', 'sf'), optionally with
+    branching ratio in percent low <= ratio <= high"""
+
+    def __init__(self, mode, low=None, high=None):
+        self.mode = mode
+        self.low = low
+        self.high = high
+
+    def bits(self, index):
+        return index.mode_bits(self.mode, self.low, self.high)
+
+
+class Spin(Predicate):
+    """Ground state spin and parity is one of values (e.g. '0+')"""
+
+    def __init__(self, *values):
+        self.values = values
+
+    def bits(self, index):
+        bits = 0
+        for value in self.values:
+            bits |= index.spin_bits(value)
+        return bits
+
+
+class Extrapolated(Predicate):
+    """Value is extrapolated ('#' in Nubase): 'mass', 'half_life', 'spin'
+    or any of them (None)"""
+
+    def __init__(self, name=None):
+        self.name = name
+
+    def bits(self, index):
+        return index.extrapolated_bits(self.name)
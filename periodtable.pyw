@@ -11,6 +11,8 @@ import element
 import gridwidget
 import meshwidget
 import Nuclide
+import nuclidechart
+import searchindex
 
 __version__ = "0.1.0"
 
@@ -30,18 +32,58 @@ class MainForm(QDialog):
         msgbutton.setText("About...")
         msgbutton.clicked.connect(self.showAbout)
 
-        self.elements = element.ElementLibrary("PeriodicTableJSON.json")
+        self.elements = element.ElementLibrary()
         self.nuclides = Nuclide.NuclideLibrary()
-        self.elements.loadElementIsotopes(self.nuclides)
 
         self.mainWidget = QStackedWidget()
-        self.mainWidget.addWidget(gridwidget.GridWidget(self.elements))
-        self.mainWidget.addWidget(meshwidget.MeshWidget(self.nuclides))
+        self.gridWidget = gridwidget.GridWidget(self.elements)
+        self.mainWidget.addWidget(self.gridWidget)
+        self.meshWidget = meshwidget.MeshWidget(self.nuclides)
+        self.mainWidget.addWidget(self.meshWidget)
+
+        # 核素数据在后台线程中加载，元素周期表先显示
+        self.loader = meshwidget.NuclideLoader(self.nuclides, self)
+        self.loader.batchLoaded.connect(self.meshWidget.addNuclides)
+        self.loader.finished.connect(self.nuclidesLoaded)
+        self.meshWidget.setLoading(True)
+        self.loader.start()
+
+        # 核素图的着色方式 (衰变模式或性质的热图)
+        self.colorCombo = QComboBox()
+        self.colorCombo.addItems(nuclidechart.COLOR_MODES)
+        self.colorCombo.currentTextChanged.connect(
+                self.meshWidget.setColorMode)
+        self.colorCombo.setVisible(False)
+        # 与另一版本的评价比较 ('changed' 着色)
+        self.compareButton = QPushButton("Compare...")
+        self.compareButton.setToolTip("Color the nuclides changed since "
+                                      "another evaluation")
+        self.compareButton.clicked.connect(self.compare)
+        self.compareButton.setVisible(False)
+        self.baseline = None            # 正在加载的比较版本
+        self.baselineLoader = None
+
+        # 元素与核素的搜索框, 每次输入时更新候选列表
+        self.searchIndex = searchindex.SearchIndex(self.elements)
+        self.searchResults = {}
+        self.searchModel = QStringListModel(self)
+        completer = QCompleter(self.searchModel, self)
+        completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        completer.activated[str].connect(self.showResult)
+        self.searchEdit = QLineEdit()
+        self.searchEdit.setPlaceholderText("Search, e.g. Fe or U-235")
+        self.searchEdit.setClearButtonEnabled(True)
+        self.searchEdit.setCompleter(completer)
+        self.searchEdit.textEdited.connect(self.search)
+        self.searchEdit.returnPressed.connect(self.showFirstResult)
 
         buttonLayout = QHBoxLayout()
         buttonLayout.addWidget(self.ebutton)
         buttonLayout.addWidget(self.nbutton)
+        buttonLayout.addWidget(self.colorCombo)
+        buttonLayout.addWidget(self.compareButton)
         buttonLayout.addStretch()
+        buttonLayout.addWidget(self.searchEdit)
         buttonLayout.addWidget(msgbutton)
         widget = QWidget()
         widget.setAutoFillBackground(True)
@@ -55,6 +97,82 @@ class MainForm(QDialog):
         layout.addWidget(self.mainWidget)
         self.setLayout(layout)
 
+    def done(self, result):
+        # 等待后台加载线程结束
+        self.loader.wait()
+        if self.baselineLoader is not None:
+            self.baselineLoader.wait()
+        # 以及正在绘制的图表分块
+        QThreadPool.globalInstance().waitForDone()
+        super(MainForm, self).done(result)
+
+    def nuclidesLoaded(self):
+        self.elements.loadElementIsotopes(self.nuclides)
+        self.meshWidget.setLoading(False)
+        self.searchIndex = searchindex.SearchIndex(self.elements,
+                                                   self.nuclides)
+
+    def search(self, text):
+        """Lists the elements and nuclides matching text"""
+        results = self.searchIndex.search(text)
+        self.searchResults = {result.text: result for result in results}
+        self.searchModel.setStringList([result.text for result in results])
+
+    def showFirstResult(self):
+        self.search(self.searchEdit.text())
+        results = self.searchModel.stringList()
+        if results:
+            self.showResult(results[0])
+
+    def showResult(self, text):
+        """Selects search result text in the table or the chart"""
+        result = self.searchResults.get(text)
+        if result is None:
+            return
+        if result.A is None:
+            self.ebutton.setChecked(True)
+            self.gridWidget.selectElement(
+                    self.elements.getElementByZ(result.Z))
+        else:
+            nuclide = self.nuclides.getNuclideByZA(result.Z, result.A)
+            if nuclide is not None:
+                self.nbutton.setChecked(True)
+                self.meshWidget.selectNuclide(nuclide, result.isomer)
+
+    def compare(self):
+        """Asks for another evaluation (xml or ASCII table) and colors the
+        nuclides changed since then"""
+        path, _ = QFileDialog.getOpenFileName(
+                self, "Compare with evaluation", "",
+                "Nuclide tables (*.xml *.txt *.asc *.mas20);;All files (*)")
+        if not path:
+            return
+        # 在后台线程中加载, 用户选择的文件不写编译缓存
+        self.baseline = Nuclide.NuclideLibrary(path, cache=False)
+        self.baselineLoader = meshwidget.NuclideLoader(self.baseline, self)
+        self.baselineLoader.batchLoaded.connect(self.addBaselineNuclides)
+        self.baselineLoader.finished.connect(self.baselineLoaded)
+        self.compareButton.setEnabled(False)
+        self.compareButton.setText("Loading...")
+        self.baselineLoader.start()
+
+    def addBaselineNuclides(self, table):
+        """Adds batch of nuclides of the evaluation being loaded"""
+        self.baseline.extend(table)
+        self.compareButton.setText("Loading {}...".format(len(self.baseline)))
+
+    def baselineLoaded(self):
+        self.compareButton.setEnabled(True)
+        self.compareButton.setText("Compare...")
+        baseline, self.baseline = self.baseline, None
+        self.baselineLoader = None
+        if len(baseline) == 0:
+            QMessageBox.warning(self, "Compare", "No nuclides found in {}"
+                                .format(baseline.datafile))
+            return
+        self.meshWidget.setBaseline(baseline)
+        self.colorCombo.setCurrentText('changed')
+
     def buttonstate(self, b):
         if b.text() == "Elements":
             if b.isChecked() == True:
@@ -62,6 +180,8 @@ class MainForm(QDialog):
         if b.text() == "Nuclides":
             if b.isChecked() == True:
                 self.mainWidget.setCurrentIndex(1)
+            self.colorCombo.setVisible(b.isChecked())
+            self.compareButton.setVisible(b.isChecked())
 
     def showAbout(self):
         msg = QMessageBox()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018-01 Jimin Ma. All rights reserved.
+
+'''
+Q-values and thresholds of nuclear reactions
+
+A reaction target(projectile,ejectiles)product is given as text, e.g.
+'238U(n,g)', '9Be(a,n)12C', '58Ni(p,2n)', '208Pb(48Ca,2n)', '1H(31P,n)',
+'208Pb(18O,15N)' or '27Al(α,n)30P', or as Reaction of (Z, A) pairs. The product follows from
+the conservation of Z and A and may be left out. Without target the text
+is a channel, '(p,n)', to be applied to many targets (see sweep).
+
+Light particles are n, p, d, t, 3he, a (alpha, α) and g (gamma, γ) in
+lower case, with a count in front ('2n') and written together ('np') or
+apart ('n,p'), heavier ones as nuclide ids ('48Ca', '15N'). The product
+is a ground state, isomers ('210mBi') are not supported.
+
+The masses are the mass excess column of the library looked up by
+(Z, A), the parsed texts are cached, so a batch is a single pass over
+the reactions:
+
+    calculator = ReactionCalculator(library)
+    values = calculator.evaluate(['238U(n,g)', '9Be(a,n)12C'])
+    values.q[0], values.threshold[1]     # keV
+    values = calculator.sweep(targets, ['(p,n)', '(a,2n)'])
+    values.q[t * 2 + c]                  # target t, channel c
+
+Q is the sum of the mass excesses before minus the sum after the
+reaction. The threshold is the kinetic energy of the projectile hitting
+the target at rest needed for Q < 0 (relativistic, photons included),
+
+    E_th = -Q (M_before + M_after) / (2 M_target),
+
+M the atomic masses, 0 for Q >= 0. The uncertainties are added in
+quadrature, a value is extrapolated if one of its masses is.
+'''
+import math
+import re
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+
+import Nuclide
+
+# Parsed reaction, nuclei as (Z, A); target and product are None for a
+# channel, (0, 0) stands for a photon or for no product
+Reaction = namedtuple('Reaction', 'target projectile ejectiles product')
+
+# Result of ReactionCalculator.evaluate and sweep: arrays in keV (nan if
+# unknown) and masks array('B') of 0/1, aligned with the reactions
+ReactionValues = namedtuple('ReactionValues',
+                            'q uncertainty threshold threshold_uncertainty '
+                            'unknown extrapolated')
+
+# Light particles by name (Z, A)
+PARTICLES = {'n': (0, 1), 'p': (1, 1), 'd': (1, 2), 't': (1, 3),
+             '3he': (2, 3), 'he3': (2, 3), 'a': (2, 4), 'α': (2, 4),
+             'alpha': (2, 4), 'g': (0, 0), 'γ': (0, 0), 'gamma': (0, 0)}
+PHOTON = (0, 0)
+
+_REACTION_RE = re.compile(r'([^(),]*)\(([^()]+)\)([^(),]*)$')
+# '3he' is checked before the count, '3he' is not 3 'he'
+_PARTICLE_RE = re.compile(r'(3he|he3)|(\d*)(alpha|gamma|[npdtagαγ])')
+
+
+def _nucleus_of(text):
+    """Returns (Z, A) of nuclide id text (ground state), ValueError if
+    it is not one"""
+    nuclide = Nuclide.parse_nuclide_id(text)
+    if nuclide is None or nuclide.isomer:
+        raise ValueError("Unknown nucleus {}".format(text))
+    return nuclide.Z, nuclide.A
+
+
+def _particles_of(text):
+    """Returns list of (Z, A) of particle list text ('2n', 'np', '48Ca').
+    Upper case letters make it a nuclide id, '15N' is not 15 neutrons."""
+    if text != text.lower():
+        return [_nucleus_of(text)]
+    position, particles = 0, []
+    for match in _PARTICLE_RE.finditer(text):
+        if match.start() != position:
+            break
+        if match.group(1):
+            particles.append(PARTICLES['3he'])
+        else:
+            count = int(match.group(2)) if match.group(2) else 1
+            particles.extend([PARTICLES[match.group(3)]] * count)
+        position = match.end()
+    if position == len(text):
+        return particles
+    # 重离子 (48Ca)
+    return [_nucleus_of(text)]
+
+
+@lru_cache(maxsize=4096)
+def parse_reaction(text):
+    """Returns Reaction of reaction or channel text, see the module.
+    Raises ValueError if the text is not a reaction or if the given
+    product does not conserve Z and A."""
+    # 大小写有意义: 'n' 为中子, '15N' 为核素
+    match = _REACTION_RE.match(text.replace(' ', ''))
+    if match is None:
+        raise ValueError("Not a reaction: {}".format(text))
+    target, inside, product = match.groups()
+    items = inside.split(',')
+    if len(items) < 2 or not all(items):
+        raise ValueError("Reaction {} needs projectile and ejectiles"
+                         .format(text))
+    projectile = _particles_of(items[0])
+    if len(projectile) != 1:
+        raise ValueError("Reaction {} needs a single projectile".format(text))
+    ejectiles = []
+    for item in items[1:]:
+        ejectiles.extend(_particles_of(item))
+    if not target:
+        if product:
+            raise ValueError("Channel {} has no target".format(text))
+        return Reaction(None, projectile[0], tuple(ejectiles), None)
+    if product:
+        # 产物按核素 (30P) 优先, 其次按粒子 (a)
+        nuclide = Nuclide.parse_nuclide_id(product)
+        if nuclide is not None and nuclide.isomer:
+            raise ValueError("Reaction {} has an isomer as product, only "
+                             "ground states are supported".format(text))
+        product = [nuclide[:2]] if nuclide else _particles_of(product)
+        if len(product) != 1:
+            raise ValueError("Reaction {} needs a single product".format(text))
+        product = product[0]
+    return reaction_of(_nucleus_of(target), projectile[0], ejectiles,
+                       product or None)
+
+
+def reaction_of(target, projectile, ejectiles, product=None):
+    """Returns Reaction of (Z, A) of target and projectile and list of
+    (Z, A) of the ejectiles, the product is computed (and checked if
+    given). Raises ValueError if Z and A are not conserved."""
+    Z = target[0] + projectile[0] - sum(Z for Z, _ in ejectiles)
+    A = target[1] + projectile[1] - sum(A for _, A in ejectiles)
+    if Z < 0 or A < Z:
+        raise ValueError("No product of {} + {} -> {}"
+                         .format(target, projectile, ejectiles))
+    if product is not None and tuple(product) != (Z, A):
+        raise ValueError("Product {} of {} + {} -> {} does not conserve "
+                         "Z and A".format(product, target, projectile,
+                                          ejectiles))
+    return Reaction(tuple(target), tuple(projectile), tuple(ejectiles),
+                    (Z, A))
+
+
+class ReactionCalculator(object):
+    """Q-values and thresholds of reactions with the masses of a
+    NuclideLibrary"""
+
+    def __init__(self, library):
+        self.library = library
+        table = library.nuclides
+        self.masses = library.mass_excesses()
+        self.rows = {(Z, A): row
+                     for row, (Z, A) in enumerate(zip(table.Z, table.A))}
+        self._channels = {}
+
+    def mass(self, nucleus):
+        """Returns (mass excess, uncertainty, extrapolated, atomic mass) in
+        keV of nucleus (Z, A), None if unknown"""
+        if nucleus == PHOTON:
+            return (0.0, 0.0, False, 0.0)
+        row = self.rows.get(nucleus)
+        if row is None or self.masses.unknown[row]:
+            return None
+        value = self.masses.value[row]
+        return (value, self.masses.uncertainty[row],
+                self.masses.extrapolated[row],
+                nucleus[1] * Nuclide.U_TO_KEV + value)
+
+    def nucleus(self, nuclide):
+        """Returns (Z, A) of nuclide given as (Z, A), row, NuclideRecord
+        or id ('238U')"""
+        if isinstance(nuclide, tuple):
+            return nuclide
+        if isinstance(nuclide, str):
+            return _nucleus_of(nuclide)
+        if not isinstance(nuclide, int):
+            nuclide = nuclide.row
+        table = self.library.nuclides
+        return table.Z[nuclide], table.A[nuclide]
+
+    def _channel(self, projectile, ejectiles):
+        """Returns (Q part, variance, mass sum, extrapolated) of the
+        particles of a channel, None if a mass is unknown"""
+        key = (projectile, ejectiles)
+        if key in self._channels:
+            return self._channels[key]
+        terms = [(1, projectile)] + [(-1, ejectile) for ejectile in ejectiles]
+        q, variance, total, extrapolated = 0.0, 0.0, 0.0, False
+        for sign, nucleus in terms:
+            mass = self.mass(nucleus)
+            if mass is None:
+                q = None
+                break
+            q += sign * mass[0]
+            variance += mass[1] ** 2
+            total += mass[3]
+            extrapolated = extrapolated or mass[2]
+        channel = None if q is None else (q, variance, total, bool(extrapolated))
+        self._channels[key] = channel
+        return channel
+
+    def _reaction(self, reaction):
+        """Returns Reaction of text, Reaction or (target, projectile,
+        ejectiles) tuple"""
+        if isinstance(reaction, str):
+            reaction = parse_reaction(reaction)
+        elif not isinstance(reaction, Reaction):
+            reaction = reaction_of(*reaction)
+        if reaction.target is None:
+            raise ValueError("Reaction {} has no target".format(reaction))
+        return reaction
+
+    @staticmethod
+    def _values(size):
+        nan = float('nan')
+        return ReactionValues(array('d', [nan]) * size,
+                              array('d', [nan]) * size,
+                              array('d', [nan]) * size,
+                              array('d', [nan]) * size,
+                              array('B', [1]) * size,
+                              array('B', [0]) * size)
+
+    def _fill(self, values, i, target, product, channel):
+        """Stores Q and threshold of target + channel -> product at i"""
+        if channel is None:
+            return
+        before = self.mass(target)
+        after = self.mass(product)
+        if before is None or after is None:
+            return
+        q = before[0] + channel[0] - after[0]
+        error = math.sqrt(before[1] ** 2 + after[1] ** 2 + channel[1])
+        values.q[i] = q
+        values.uncertainty[i] = error
+        if q >= 0:
+            values.threshold[i] = values.threshold_uncertainty[i] = 0.0
+        elif before[3] > 0:
+            factor = (before[3] + channel[2] + after[3]) / (2 * before[3])
+            values.threshold[i] = -q * factor
+            values.threshold_uncertainty[i] = error * factor
+        values.unknown[i] = 0
+        values.extrapolated[i] = before[2] or after[2] or channel[3]
+
+    def evaluate(self, reactions):
+        """Returns ReactionValues of list of reactions, each given as text,
+        Reaction or (target, projectile, ejectiles) of (Z, A). Raises
+        ValueError for texts which are not reactions, unknown masses give
+        unknown values."""
+        reactions = [self._reaction(reaction) for reaction in reactions]
+        values = self._values(len(reactions))
+        for i, reaction in enumerate(reactions):
+            self._fill(values, i, reaction.target, reaction.product,
+                       self._channel(reaction.projectile, reaction.ejectiles))
+        return values
+
+    def sweep(self, targets, channels):
+        """Returns ReactionValues of every target (see nucleus()) with
+        every channel (text '(p,n)' or (projectile, ejectiles) of (Z, A)),
+        value of target t and channel c at t * len(channels) + c"""
+        parsed = []
+        for channel in channels:
+            if isinstance(channel, str):
+                channel = parse_reaction(channel)[1:3]
+            projectile, ejectiles = channel[0], tuple(channel[1])
+            dZ = projectile[0] - sum(Z for Z, _ in ejectiles)
+            dA = projectile[1] - sum(A for _, A in ejectiles)
+            parsed.append((dZ, dA, self._channel(projectile, ejectiles)))
+        targets = [self.nucleus(target) for target in targets]
+        values = self._values(len(targets) * len(parsed))
+        i = 0
+        for Z, A in targets:
+            for dZ, dA, channel in parsed:
+                product = (Z + dZ, A + dA)
+                if 0 <= product[0] <= product[1]:
+                    self._fill(values, i, (Z, A), product, channel)
+                i += 1
+        return values
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018-01 Jimin Ma. All rights reserved.
+
+'''
+Type-ahead search of elements and nuclides
+
+SearchIndex is built once from the libraries: the lower cased element
+names and symbols are kept sorted, so the elements starting with the typed
+text are a bisect range, and the mass numbers of each element are kept
+for the nuclides. A query does not scan the libraries.
+
+    index = SearchIndex(element.ElementLibrary(), Nuclide.NuclideLibrary())
+    index.search("U-23")     # -> U-230 ... U-239
+    index.search("iod")      # -> iodine
+'''
+import re
+from bisect import bisect_left
+from collections import namedtuple
+
+import Nuclide
+
+# Result of a search, A is None for an element, isomer 0 for ground states
+SearchResult = namedtuple('SearchResult', 'text Z A isomer')
+
+# Typed text split into mass number and element part, either may be
+# partial: '235U', '23', 'U-23', 'uran', '242mAm'
+_QUERY_RE = re.compile(r'(\d*)-?([a-z]*)-?(\d*)([a-z]\d?)?$')
+
+
+class SearchIndex(object):
+    """Prefix index of element names and symbols and of the nuclides of
+    a library. nuclides may be None (not loaded yet), elements are then
+    found only."""
+
+    def __init__(self, elements, nuclides=None, limit=20):
+        self.limit = limit
+        self.symbols = {}           # Z -> 元素符号
+        self.names = {}             # Z -> 元素名称
+        keys = []
+        for element in elements:
+            self.symbols[element.Z] = element.symbol
+            self.names[element.Z] = element.name
+            keys.append((element.symbol.lower(), element.Z))
+            keys.append((element.name.lower(), element.Z))
+        keys.sort()
+        self.keys = [key for key, _ in keys]
+        self.zs = [Z for _, Z in keys]
+
+        # Mass numbers of the nuclides of each element, ascending, and
+        # number of isomers of each nuclide
+        self.masses = {}
+        self.isomers = {}
+        if nuclides is not None:
+            table = nuclides.nuclides
+            for Z, A, count in zip(table.Z, table.A, table.iso_count):
+                self.masses.setdefault(Z, []).append(A)
+                self.isomers[(Z, A)] = count
+            for masses in self.masses.values():
+                masses.sort()
+
+    def elementsStartingWith(self, prefix):
+        """Returns atomic numbers of elements whose name or symbol starts
+        with prefix (lower case), the exact symbol or name first"""
+        first = bisect_left(self.keys, prefix)
+        found = []
+        for i in range(first, len(self.keys)):
+            if not self.keys[i].startswith(prefix):
+                break
+            Z = self.zs[i]
+            if Z not in found:
+                if self.keys[i] == prefix:
+                    found.insert(0, Z)
+                else:
+                    found.append(Z)
+        return found
+
+    def elementResult(self, Z):
+        return SearchResult("{} - {} ({})".format(self.symbols[Z],
+                                                 self.names[Z], Z),
+                            Z, None, 0)
+
+    def nuclideResult(self, Z, A, isomer=0):
+        mark = "" if isomer == 0 else "m" if isomer == 1 else "m{}".format(isomer)
+        symbol = self.symbols.get(Z, Nuclide.Nuclide._element[Z])
+        return SearchResult("{}{}{} - {}-{}{}".format(
+                                A, mark, symbol, self.names.get(Z, symbol),
+                                A, mark),
+                            Z, A, isomer)
+
+    def search(self, text):
+        """Returns list of SearchResult of text typed so far: a complete
+        nuclide id (see Nuclide.parse_nuclide_id), the start of an element
+        name or symbol with or without (the start of) a mass number, or
+        an atomic number"""
+        results = []
+        parsed = Nuclide.parse_nuclide_id(text)
+        if parsed is not None and \
+                parsed.isomer <= self.isomers.get(parsed[:2], -1):
+            results.append(self.nuclideResult(*parsed))
+
+        query = text.replace(' ', '').lower()
+        match = _QUERY_RE.match(query)
+        if match is None or not query:
+            return results
+        before, letters, after, _ = match.groups()
+        if before and after:
+            return results
+        digits = before or after
+        if not letters:
+            # 只有数字: 原子序数
+            Z = int(digits)
+            if Z in self.symbols:
+                results.append(self.elementResult(Z))
+            return results[:self.limit]
+
+        for Z in self.elementsStartingWith(letters):
+            if not digits:
+                results.append(self.elementResult(Z))
+            for A in self.masses.get(Z, ()) if digits else ():
+                if str(A).startswith(digits) and \
+                        (parsed is None or (Z, A) != parsed[:2]):
+                    results.append(self.nuclideResult(Z, A))
+            if len(results) >= self.limit:
+                break
+        return results[:self.limit]
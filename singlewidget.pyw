@@ -2,23 +2,148 @@
 # Copyright (c) 2018-01 Jimin Ma. All rights reserved.
 
 
-from PyQt5.QtCore import (Qt, QSize, QRectF)
+from PyQt5.QtCore import (Qt, QSize, QRectF, QAbstractTableModel, QModelIndex)
 from PyQt5.QtGui import (QPainter, QColor, QFont)
-from PyQt5.QtWidgets import (QWidget, QSizePolicy, QDialog, QTableWidget,
-                             QTableWidgetItem, QTabWidget, QHBoxLayout,
-                             QGridLayout, QHeaderView,
-                             QApplication)
+from PyQt5.QtWidgets import (QWidget, QSizePolicy, QDialog, QTableView,
+                             QTabWidget, QHBoxLayout, QGridLayout,
+                             QHeaderView, QApplication)
 GREEK_DICT = {'a':'\u03B1', 'b':'\u03B2', "EC":'\u03B5'}
 
 import element
 
+
+def greek(mode):
+    """Decay mode with greek letters, e.g. 'b-' -> 'β-'"""
+    for key in GREEK_DICT:
+        mode = mode.replace(key, GREEK_DICT[key])
+    return mode
+
+
+'''
+表格数据模型
+'''
+
+class PropertyModel(QAbstractTableModel):
+    """Two column (name, value) table of one object (element, nuclide).
+
+    rows is a list of (name, format) where format(subject) returns the
+    value text. Values are formatted when a view asks for them and kept
+    until setSubject() points the model at another object.
+    """
+
+    def __init__(self, rows, parent=None):
+        super(PropertyModel, self).__init__(parent)
+        self.rows = rows
+        self.subject = None
+        self.texts = {}
+
+    def setSubject(self, subject):
+        self.beginResetModel()
+        self.subject = subject
+        self.texts = {}
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.subject is None:
+            return 0
+        return len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 2
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        name, format = self.rows[index.row()]
+        if index.column() == 0:
+            return name
+        if index.row() not in self.texts:
+            try:
+                self.texts[index.row()] = format(self.subject)
+            except (AttributeError, LookupError, ValueError):
+                self.texts[index.row()] = ""
+        return self.texts[index.row()]
+
+
+class ItemTableModel(QAbstractTableModel):
+    """Table with one row per item of a list (isotopes, decay modes).
+
+    format(item) returns the texts of the columns of a row, it is called
+    for the rows a view shows only, the texts are kept until setItems().
+    """
+
+    def __init__(self, headers, format, parent=None):
+        super(ItemTableModel, self).__init__(parent)
+        self.headers = headers
+        self.format = format
+        self.items = []
+        self.texts = {}
+
+    def setItems(self, items):
+        self.beginResetModel()
+        self.items = list(items)
+        self.texts = {}
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.items)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        row = index.row()
+        if row not in self.texts:
+            self.texts[row] = self.format(self.items[row])
+        return self.texts[row][index.column()]
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return None
+
+
+def tableView(model, stretch=1):
+    """Returns read only QTableView of model without row header, column
+    stretch takes the free width"""
+    view = QTableView()
+    view.setModel(model)
+    view.verticalHeader().setVisible(False)
+    view.setAlternatingRowColors(True)
+    view.setEditTriggers(QTableView.NoEditTriggers)
+    view.setFocusPolicy(Qt.NoFocus)
+    header = view.horizontalHeader()   # 设置列宽
+    header.setSectionResizeMode(stretch, QHeaderView.Stretch)
+    return view
+
+
+def isotopeRow(isotope):
+    """Texts of the columns of the isotope table"""
+    try:
+        weight = "{:.4f}".format(float(isotope.mass_defect["value"])/931494.
+                                 + isotope.A)
+    except (ValueError, KeyError):
+        weight = "~{}".format(isotope.A)
+    if isotope.half_life.get("value") == "stable":
+        return ("{}-{}".format(isotope.element, isotope.A), weight,
+                "{}".format(isotope.decay_modes[0]["value"]), "", "")
+    modes = ["{}({})".format(greek(v["mode"]), v["value"])
+             for v in isotope.decay_modes]
+    return ("{}-{}".format(isotope.element, isotope.A), weight, "",
+            "{} {}".format(isotope.half_life.get("value", ""),
+                           isotope.half_life.get("unit", "")),
+            ",".join(modes))
+
+
 '''上端块'''
 class BlockWidget(QWidget):
 
-    XMARGIN = 400.0
-    YMARGIN = 100.0
+    XMARGIN = 400
+    YMARGIN = 100
 
-    def __init__(self, element, parent=None):
+    def __init__(self, element=None, parent=None):
         super(BlockWidget, self).__init__(parent)
 
         self.element = element
@@ -26,9 +151,27 @@ class BlockWidget(QWidget):
         self.setFixedSize(QSize(BlockWidget.XMARGIN, BlockWidget.YMARGIN))
 
         # 设置主要参数列表
-        self.table = QTableWidget(self)
-        self.updateTable()
+        self.model = PropertyModel([
+            ("Density", lambda e: "{} g/cm^3".format(e.density)),
+            ("Melt Point ", lambda e: "{} K".format(e.melt)),
+            ("Moler Heat ", lambda e: "{} mol*K".format(e.molarHeat))], self)
+        self.table = QTableView(self)
+        self.table.setModel(self.model)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(
+                QHeaderView.ResizeToContents)
+        self.table.setShowGrid(False)
+        self.table.setFocusPolicy(Qt.NoFocus)
+        self.table.setEditTriggers(QTableView.NoEditTriggers)    # 不可编辑
+        self.table.setSelectionMode(QTableView.NoSelection)      # 不可选中
+        self.setElement(element)
 
+    def setElement(self, element):
+        """Shows element"""
+        self.element = element
+        self.model.setSubject(element)
+        self.update()
 
     def sizeHint(self):
         return self.minimumSizeHint()
@@ -43,6 +186,8 @@ class BlockWidget(QWidget):
         self.table.move(x, y)   # 将常用表格定位在右端
 
     def paintEvent(self, event=None):
+        if self.element is None:
+            return
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
         painter.setRenderHint(QPainter.TextAntialiasing)
@@ -68,153 +213,89 @@ class BlockWidget(QWidget):
         painter.drawText(rect, Qt.AlignBottom | Qt.AlignCenter,
                          "{:.2f}".format(self.element.atomicMass))
 
-    def updateTable(self):
-        self.table.clear()
-        self.table.setRowCount(4)
-        self.table.setColumnCount(2)
-        self.table.verticalHeader().setVisible(False)
-        self.table.horizontalHeader().setVisible(False)
-
-        self.table.horizontalHeader().setDefaultSectionSize(15)
-        self.table.setShowGrid(False)
-        self.table.setFocusPolicy(Qt.NoFocus)
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)    # 不可编辑
-        self.table.setSelectionMode(QTableWidget.NoSelection)      # 不可选中
-
-        # 给出各行数据
-        item = QTableWidgetItem("Density")
-        self.table.setItem(0, 0, item)
-        item = QTableWidgetItem("{} g/cm^3".format(self.element.density))
-        self.table.setItem(0, 1, item)
-        item = QTableWidgetItem("Melt Point ")
-        self.table.setItem(1, 0, item)
-        item = QTableWidgetItem("{} K".format(self.element.melt))
-        self.table.setItem(1, 1, item)
-        item = QTableWidgetItem("Moler Heat ")
-        self.table.setItem(2, 0, item)
-        item = QTableWidgetItem("{} mol*K".format(self.element.molarHeat))
-        self.table.setItem(2, 1, item)
-
-        # 调整表格宽度
-        self.table.resizeColumnsToContents()
-
 
 '''
 单个元素控件子类
 '''
 
 class SingleWidget(QDialog):
+    """Dialog of an element. The dialog is meant to be reused, setElement()
+    points it at another element; the tables are filled when their tab is
+    shown."""
 
-    def __init__(self, element, parent=None):
+    def __init__(self, element=None, parent=None):
         super(SingleWidget, self).__init__(parent)
 
-        self.element = element
+        self.element = None
         self.setSizePolicy(QSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed))
 
         # 上端控件
-        topWidget = BlockWidget(self.element)
+        self.topWidget = BlockWidget()
 
         # 下端标签页控件
         # --- Page 1: 基本信息 ---
-        self.propertyTable = QTableWidget()
-        self.propertyTable.clear()
-        self.propertyTable.setRowCount(4)
-        self.propertyTable.setColumnCount(2)
-        self.propertyTable.verticalHeader().setVisible(False)
+        self.propertyModel = PropertyModel([
+            ("phase", lambda e: "{}".format(e.phase)),
+            ("shells", lambda e: "{}".format(e.shells)),
+            ("Named By", lambda e: "{}".format(e.namedBy)),
+            ("Summary", lambda e: "{}".format(e.summary))], self)
+        self.propertyTable = tableView(self.propertyModel)
         self.propertyTable.horizontalHeader().setVisible(False)
-        self.propertyTable.setAlternatingRowColors(True)
-        self.propertyTable.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.propertyTable.setFocusPolicy(Qt.NoFocus)
-        header = self.propertyTable.horizontalHeader()  # 设置列宽
-        header.setSectionResizeMode(0, QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(1, QHeaderView.Stretch)
-
-        # 给出各行数据
-        item = QTableWidgetItem("phase")
-        self.propertyTable.setItem(0, 0, item)
-        item = QTableWidgetItem("{}".format(self.element.phase))
-        self.propertyTable.setItem(0, 1, item)
-        item = QTableWidgetItem("shells")
-        self.propertyTable.setItem(1, 0, item)
-        item = QTableWidgetItem("{}".format(self.element.shells))
-        self.propertyTable.setItem(1, 1, item)
-        item = QTableWidgetItem("Named By")
-        self.propertyTable.setItem(2, 0, item)
-        item = QTableWidgetItem("{}".format(self.element.namedBy))
-        self.propertyTable.setItem(2, 1, item)
-        item = QTableWidgetItem("Summary")
-        self.propertyTable.setItem(3, 0, item)
-        item = QTableWidgetItem("{}".format(self.element.summary))
-        self.propertyTable.setItem(3, 1, item)
+        self.propertyTable.horizontalHeader().setSectionResizeMode(
+                0, QHeaderView.ResizeToContents)
 
         # --- Page 2: 核素信息 ---
-        self.isotopeTable = QTableWidget()
-        self.isotopeTable.clear()
-        self.isotopeTable.setRowCount(len(self.element.isotopes))
-        self.isotopeTable.setColumnCount(5)
-        self.isotopeTable.verticalHeader().setVisible(False)
-        self.isotopeTable.setHorizontalHeaderLabels(["Isotope", "Weight", "Abund,%",
-                                                     "Half-life", "Decay"])
-        self.isotopeTable.setAlternatingRowColors(True)
-        self.isotopeTable.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.isotopeTable.setFocusPolicy(Qt.NoFocus)
-
-        for i, isotope in enumerate(self.element.isotopes):
-            item = QTableWidgetItem("{}-{}".format(isotope.element, isotope.A))
-            self.isotopeTable.setItem(i, 0, item)
-            try:
-                item = QTableWidgetItem("{:.4f}".format(float(isotope.mass_defect["value"])/931494.
-                                                    + isotope.A))
-            except ValueError:
-                item = QTableWidgetItem("~{}".format(isotope.A))
-            finally:
-                self.isotopeTable.setItem(i, 1, item)
-            if isotope.half_life["value"] == "stable":
-                item = QTableWidgetItem("{}".format(isotope.decay_modes[0]["value"]))
-                self.isotopeTable.setItem(i, 2, item)
-            else:
-                item = QTableWidgetItem("{} {}".format(isotope.half_life["value"],
-                                                       isotope.half_life["unit"]))
-                self.isotopeTable.setItem(i, 3, item)
-                str = []
-                for j, v in enumerate(isotope.decay_modes):
-                    v2 = v["mode"]
-                    for key in GREEK_DICT:
-                        v2 = v2.replace(key, GREEK_DICT[key])
-                    str.append("{}({})".format(v2, v["value"]))
-                item = QTableWidgetItem("{}".format(",".join(str)))
-                self.isotopeTable.setItem(i, 4, item)
-
-        self.isotopeTable.resizeColumnsToContents()
-
+        self.isotopeModel = ItemTableModel(
+                ["Isotope", "Weight", "Abund,%", "Half-life", "Decay"],
+                isotopeRow, self)
+        self.isotopeTable = tableView(self.isotopeModel, stretch=4)
 
         # 使用列表给出数据，使用Tab标签式给出不同分类
-        tabWidget = QTabWidget()
+        self.tabWidget = QTabWidget()
         propertyWidget = QWidget()
         propertyLayout = QHBoxLayout()
         propertyLayout.addWidget(self.propertyTable)
         propertyWidget.setLayout(propertyLayout)
-        tabWidget.addTab(propertyWidget, "Property")
+        self.tabWidget.addTab(propertyWidget, "Property")
         isotopeWidget = QWidget()
         isotopeLayout = QHBoxLayout()
         isotopeLayout.addWidget(self.isotopeTable)
         isotopeWidget.setLayout(isotopeLayout)
-        tabWidget.addTab(isotopeWidget, "Isotope")
+        self.tabWidget.addTab(isotopeWidget, "Isotope")
+        # 每页的数据在显示时才填入
+        self.pages = [lambda e: self.propertyModel.setSubject(e),
+                      lambda e: self.isotopeModel.setItems(e.isotopes)]
+        self.filled = set()
+        self.tabWidget.currentChanged.connect(self.fillPage)
 
         grid = QGridLayout()
-        grid.addWidget(topWidget, 0, 0)
-        grid.addWidget(tabWidget, 1, 0)
+        grid.addWidget(self.topWidget, 0, 0)
+        grid.addWidget(self.tabWidget, 1, 0)
         self.setLayout(grid)
 
+        if element is not None:
+            self.setElement(element)
+
+    def setElement(self, element):
+        """Shows element, only the current tab is filled now"""
+        self.element = element
+        self.topWidget.setElement(element)
+        self.filled = set()
+        self.fillPage(self.tabWidget.currentIndex())
         self.setWindowTitle(self.element.name)
 
+    def fillPage(self, index):
+        if self.element is not None and index not in self.filled:
+            self.filled.add(index)
+            self.pages[index](self.element)
+
 
 if __name__ == "__main__":
     import sys
 
     app = QApplication(sys.argv)
-    elements = element.ElementLibrary("PeriodicTableJSON.json")
+    elements = element.ElementLibrary()
     form = SingleWidget(elements[75])
     form.setWindowTitle("GridTest")
     form.show()
-    app.exec_()
\ No newline at end of file
+    app.exec_()
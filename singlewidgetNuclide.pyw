@@ -1,32 +1,121 @@
 #!/usr/bin/env python3
 # Copyright (c) 2018-01 Jimin Ma. All rights reserved.
 
+import math
 
 from PyQt5.QtCore import (Qt, QSize, QRectF)
 from PyQt5.QtGui import (QPainter, QColor, QFont)
-from PyQt5.QtWidgets import (QWidget, QSizePolicy, QDialog, QTableWidget,
-                             QTableWidgetItem, QTabWidget, QHBoxLayout,
-                             QGridLayout, QHeaderView,
+from PyQt5.QtWidgets import (QWidget, QSizePolicy, QDialog, QTabWidget,
+                             QHBoxLayout, QGridLayout, QHeaderView,
                              QApplication)
 
 import Nuclide
+from singlewidget import PropertyModel, ItemTableModel, tableView, greek
 
-GREEK_DICT = {'a':'\u03B1', 'b':'\u03B2', "EC":'\u03B5'}
 KEV_TO_MASS = 931494.
 
 
+def atomicMass(nuclide, digits=5):
+    """Atomic mass text of nuclide in u"""
+    try:
+        return "{0:.{1}f} u".format(float(nuclide.mass_defect["value"])/KEV_TO_MASS
+                                    + nuclide.A, digits)
+    except (ValueError, KeyError):
+        return "~{} u".format(nuclide.A)
+
+
+def isomerMark(isomer):
+    """Mark of isomer number after the mass number: '', 'm', 'm2', ..."""
+    return "" if isomer == 0 else "m" if isomer == 1 else "m{}".format(isomer)
+
+
+class IsomerState(object):
+    """Isomer isomer (1, 2, ...) of nuclide with the attributes shown by
+    the dialog; the mass excess is that of the ground state plus the
+    excitation energy"""
+
+    def __init__(self, nuclide, isomer):
+        if not 1 <= isomer <= len(nuclide.isomers):
+            raise ValueError("{} has no isomer {}".format(nuclide, isomer))
+        state = nuclide.isomers[isomer - 1]
+        self.nuclide = nuclide
+        self.isomer = isomer
+        self.Z, self.A, self.row = nuclide.Z, nuclide.A, nuclide.row
+        self.element = nuclide.element
+        self.state = state
+        self.half_life = state['half_life']
+        self.decay_modes = state['decay_modes']
+        self.gs_spin = {'value': ""}
+        self.comment = state.get('comment')
+        ground = nuclide.mass_defect
+        try:
+            value = float(ground['value']) + float(state['energy'])
+            error = math.hypot(float(ground['uncertainity']),
+                               float(state['uncertainity']))
+            self.mass_defect = {'value': str(round(value, 4)),
+                                'uncertainity': str(round(error, 4))}
+        except (ValueError, KeyError):
+            self.mass_defect = {'value': '?', 'uncertainity': '?'}
+
+
+def excitationText(nuclide):
+    """Excitation energy text of an isomer, empty for ground states"""
+    if not getattr(nuclide, 'isomer', 0):
+        return ""
+    return "{} +/- {} keV".format(nuclide.state['energy'],
+                                  nuclide.state['uncertainity'])
+
+
+def energyText(energies, name):
+    """Returns text function of energy name (see energies.COLUMNS) of a
+    nuclide, in MeV; '#' marks extrapolated values. energies() returns
+    the NuclideEnergies of the library at the time of the call. The
+    values are of ground states, isomers are left empty."""
+    def text(nuclide):
+        if getattr(nuclide, 'isomer', 0):
+            return ""
+        # 每次查询, 库在加载期间仍会增加核素
+        column = getattr(energies(), name)
+        row = nuclide.row
+        if column.unknown[row]:
+            return ""
+        return "{:.4f} +/- {:.4f} MeV{}".format(
+                column.value[row] / 1000, column.uncertainty[row] / 1000,
+                "#" if column.extrapolated[row] else "")
+    return text
+
+
+def decayModeRow(mode):
+    """Text of the decay mode table row"""
+    return ("{:5s} {} {}+/-{} %".format(greek(mode["mode"]), mode["relation"],
+                                        mode["value"], mode["uncertainity"]),)
+
+
 '''上端块'''
 class BlockWidgetNuclide(QWidget):
 
-    XMARGIN = 400.0
-    YMARGIN = 100.0
+    XMARGIN = 400
+    YMARGIN = 100
 
-    def __init__(self, nuclide, parent=None):
+    def __init__(self, nuclide=None, parent=None):
         super(BlockWidgetNuclide, self).__init__(parent)
 
-        self.nuclide = nuclide
+        self.nuclide = None
+        self.massText = ""
+        self.massNumber = ""
         # 固定大小
         self.setFixedSize(QSize(BlockWidgetNuclide.XMARGIN, BlockWidgetNuclide.YMARGIN))
+        if nuclide is not None:
+            self.setNuclide(nuclide)
+
+    def setNuclide(self, nuclide):
+        """Shows nuclide"""
+        self.nuclide = nuclide
+        # 质量文字只在更换核素时计算
+        self.massText = atomicMass(nuclide, 2)[:-2]
+        self.massNumber = "{}{}".format(
+                nuclide.A, isomerMark(getattr(nuclide, 'isomer', 0)))
+        self.update()
 
     def sizeHint(self):
         return self.minimumSizeHint()
@@ -35,6 +124,8 @@ class BlockWidgetNuclide(QWidget):
         return QSize(BlockWidgetNuclide.XMARGIN, BlockWidgetNuclide.YMARGIN)
 
     def paintEvent(self, event=None):
+        if self.nuclide is None:
+            return
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
         painter.setRenderHint(QPainter.TextAntialiasing)
@@ -56,116 +147,98 @@ class BlockWidgetNuclide(QWidget):
         font.setWeight(QFont.Bold)
         painter.setFont(font)
         painter.setPen(Qt.black)
-        painter.drawText(rect, Qt.AlignLeft, "{}".format(self.nuclide.A))
-        painter.drawText(rect, Qt.AlignBottom | Qt.AlignCenter, "{0:.2f}".format(
-            float(self.nuclide.mass_defect["value"])/KEV_TO_MASS + self.nuclide.A))
+        painter.drawText(rect, Qt.AlignLeft, self.massNumber)
+        painter.drawText(rect, Qt.AlignBottom | Qt.AlignCenter, self.massText)
 
 '''
 单个元素控件子类
 '''
 
 class SingleWidgetNuclide(QDialog):
+    """Dialog of a nuclide. The dialog is meant to be reused, setNuclide()
+    points it at another nuclide; the tables are filled when their tab is
+    shown. With energies (function returning the NuclideEnergies of the
+    library of the nuclides, e.g. library.energies) the binding and
+    separation energies are listed too."""
 
-    def __init__(self, nuclide, parent=None):
+    def __init__(self, nuclide=None, energies=None, parent=None):
         super(SingleWidgetNuclide, self).__init__(parent)
 
-        self.nuclide = nuclide
+        self.nuclide = None
         self.setSizePolicy(QSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed))
 
         # 上端控件
-        topWidget = BlockWidgetNuclide(self.nuclide)
+        self.topWidget = BlockWidgetNuclide()
 
         # 下端标签页控件
-        self.propertyTable = QTableWidget()
-        self.propertyTable.clear()
-        self.propertyTable.setRowCount(5)
-        self.propertyTable.setColumnCount(2)
-        self.propertyTable.verticalHeader().setVisible(False)
+        rows = [
+            ("Mass", atomicMass),
+            ("Mass Excess", lambda n: "{} +/- {} keV".format(
+                n.mass_defect["value"], n.mass_defect["uncertainity"])),
+            ("Excitation Energy", excitationText),
+            ("Half Life", lambda n: "{} +/- {} {}".format(
+                n.half_life["value"], n.half_life["uncertainity"],
+                n.half_life["unit"])),
+            ("Spin", lambda n: "{}".format(n.gs_spin["value"])),
+            ("Comment", lambda n: "{}".format(n.comment or " "))]
+        if energies is not None:
+            rows[4:4] = [(label, energyText(energies, name)) for label, name in
+                         (("Binding Energy/A", "binding_per_nucleon"),
+                          ("S(n)", "separation_n"), ("S(p)", "separation_p"),
+                          ("S(2n)", "separation_2n"),
+                          ("S(2p)", "separation_2p"))]
+        self.propertyModel = PropertyModel(rows, self)
+        self.propertyTable = tableView(self.propertyModel)
         self.propertyTable.horizontalHeader().setVisible(False)
-        self.propertyTable.setAlternatingRowColors(True)
-        self.propertyTable.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.propertyTable.setFocusPolicy(Qt.NoFocus)
-        header = self.propertyTable.horizontalHeader()   # 设置列宽
-        header.setSectionResizeMode(0, QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(1, QHeaderView.Stretch)
-
-        # 给出各行数据
-        item = QTableWidgetItem("Mass")
-        self.propertyTable.setItem(0, 0, item)
-        try:
-            item = QTableWidgetItem("{0:.5f} u".format(float(self.nuclide.mass_defect["value"])/KEV_TO_MASS
-                                                       + self.nuclide.A))
-        except ValueError:
-            item = QTableWidgetItem("{0:.5f}{} u".format(self.nuclide.A, self.nuclide.mass_defect["value"]))
-        finally:
-            self.propertyTable.setItem(0, 1, item)
-        item = QTableWidgetItem("Mass Excess")
-        self.propertyTable.setItem(1, 0, item)
-        item = QTableWidgetItem("{} +/- {} keV".format(self.nuclide.mass_defect["value"],
-                                                   self.nuclide.mass_defect["uncertainity"]))
-        self.propertyTable.setItem(1, 1, item)
-        item = QTableWidgetItem("Half Life")
-        self.propertyTable.setItem(2, 0, item)
-        item = QTableWidgetItem("{} +/- {} {}".format(
-            self.nuclide.half_life["value"], self.nuclide.half_life["uncertainity"],
-            self.nuclide.half_life["unit"]))
-        self.propertyTable.setItem(2, 1, item)
-        item = QTableWidgetItem("Spin")
-        self.propertyTable.setItem(3, 0, item)
-        item = QTableWidgetItem("{}".format(self.nuclide.gs_spin["value"]))
-        self.propertyTable.setItem(3, 1, item)
-        item = QTableWidgetItem("Comment")
-        self.propertyTable.setItem(4, 0, item)
-        if self.nuclide.comment:
-            item = QTableWidgetItem("{}".format(self.nuclide.comment.nodeValue))
-        else:
-            item = QTableWidgetItem(" ")
-        self.propertyTable.setItem(4, 1, item)
-
-        # TODO 衰变模式，激发核的情况
-        self.decaymodeTable = QTableWidget()
-        decaymode = self.nuclide.decay_modes
-        row = len(decaymode)
-        self.decaymodeTable = QTableWidget()
-        self.decaymodeTable.clear()
-        self.decaymodeTable.setRowCount(row)
-        self.decaymodeTable.setColumnCount(1)
-        self.decaymodeTable.verticalHeader().setVisible(False)
-        self.decaymodeTable.horizontalHeader().setVisible(False)
-        self.decaymodeTable.setAlternatingRowColors(True)
-        self.decaymodeTable.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.decaymodeTable.setFocusPolicy(Qt.NoFocus)
-        header = self.decaymodeTable.horizontalHeader()  # 设置列宽
-        header.setSectionResizeMode(0, QHeaderView.Stretch)
-        for i, v in enumerate(decaymode):
-            v2 = v["mode"]
-            for key in GREEK_DICT:
-                v2 = v2.replace(key, GREEK_DICT[key])
-            item = QTableWidgetItem("{:5s} {} {}+/-{} %".format(
-                v2, v["relation"], v["value"], v["uncertainity"]))
-            self.decaymodeTable.setItem(i, 0, item)
+        self.propertyTable.horizontalHeader().setSectionResizeMode(
+                0, QHeaderView.ResizeToContents)
 
+        self.decaymodeModel = ItemTableModel(["Decay Mode"], decayModeRow, self)
+        self.decaymodeTable = tableView(self.decaymodeModel, stretch=0)
+        self.decaymodeTable.horizontalHeader().setVisible(False)
 
         # 使用列表给出数据，使用Tab标签式给出不同分类
-        tabWidget = QTabWidget()
+        self.tabWidget = QTabWidget()
         commonWidget = QWidget()
         commonLayout = QHBoxLayout()
         commonLayout.addWidget(self.propertyTable)
         commonWidget.setLayout(commonLayout)
-        tabWidget.addTab(commonWidget, "Common")
+        self.tabWidget.addTab(commonWidget, "Common")
         decaymodeWidget = QWidget()
         decaymodeLayout = QHBoxLayout()
         decaymodeLayout.addWidget(self.decaymodeTable)
         decaymodeWidget.setLayout(decaymodeLayout)
-        tabWidget.addTab(decaymodeWidget, "Decay Mode")
+        self.tabWidget.addTab(decaymodeWidget, "Decay Mode")
+        # 每页的数据在显示时才填入
+        self.pages = [lambda n: self.propertyModel.setSubject(n),
+                      lambda n: self.decaymodeModel.setItems(n.decay_modes)]
+        self.filled = set()
+        self.tabWidget.currentChanged.connect(self.fillPage)
 
         grid = QGridLayout()
-        grid.addWidget(topWidget, 0, 0)
-        grid.addWidget(tabWidget, 1, 0)
+        grid.addWidget(self.topWidget, 0, 0)
+        grid.addWidget(self.tabWidget, 1, 0)
         self.setLayout(grid)
 
+        if nuclide is not None:
+            self.setNuclide(nuclide)
+
+    def setNuclide(self, nuclide, isomer=0):
+        """Shows nuclide, or its isomer isomer (1, 2, ...), only the
+        current tab is filled now"""
+        if isomer:
+            nuclide = IsomerState(nuclide, isomer)
+        self.nuclide = nuclide
+        self.topWidget.setNuclide(nuclide)
+        self.filled = set()
+        self.fillPage(self.tabWidget.currentIndex())
         self.setWindowTitle(self.nuclide.element)
 
+    def fillPage(self, index):
+        if self.nuclide is not None and index not in self.filled:
+            self.filled.add(index)
+            self.pages[index](self.nuclide)
+
     def closeEvent(self, event):
         self.setMouseTracking(True)
 